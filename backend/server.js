@@ -8,10 +8,12 @@ const cors = require('cors');
 require('dotenv').config();
 
 const { getCurrentWeather } = require('./services/weatherService');
-const { predictDemand } = require('./services/predictionService');
+const {
+    predictDemand, forecastHorizon, getPredictorTimings, getModelRegistry, getPoolStats
+} = require('./services/predictionService');
 const { computeIngredientUsage, computeSurplus, computeSurplusRisk } = require('./services/ingredientMapping');
 const { makeDecision, getShelterStatus } = require('./services/decisionEngine');
-const { runSimulation, simulateDay, getMetrics, resetSimulation } = require('./services/simulationService');
+const { runSimulation, runMonteCarlo, simulateDay, getMetrics, resetSimulation } = require('./services/simulationService');
 
 const app = express();
 const PORT = process.env.PORT || 5000;
@@ -33,10 +35,19 @@ app.get('/api/weather', async (req, res) => {
     }
 });
 
+// Request fields forwarded to the predictor; anything else (command, mode, ...) is dropped
+const PREDICT_FIELDS = ['hour', 'day_of_week', 'temperature', 'rainfall', 'event_flag', 'store_id', 'timings'];
+
+// store_id picks the per-store model and history rows: a short string or an integer
+const isStoreId = (value) => Number.isInteger(value) || (typeof value === 'string' && value.length > 0 && value.length <= 64);
+
 // POST /api/predict
 app.post('/api/predict', async (req, res) => {
     try {
-        const features = req.body;
+        const features = {};
+        for (const field of PREDICT_FIELDS) {
+            if (req.body[field] !== undefined) features[field] = req.body[field];
+        }
 
         // Validate required features
         const required = ['hour', 'day_of_week', 'temperature', 'rainfall', 'event_flag'];
@@ -45,6 +56,9 @@ app.post('/api/predict', async (req, res) => {
                 return res.status(400).json({ success: false, error: `Missing field: ${field}` });
             }
         }
+        if (features.store_id !== undefined && !isStoreId(features.store_id)) {
+            return res.status(400).json({ success: false, error: 'store_id must be an integer or a string of at most 64 characters' });
+        }
 
         const predictions = await predictDemand(features);
         // Add surplus calculation
@@ -70,7 +84,51 @@ app.post('/api/predict', async (req, res) => {
         });
     } catch (error) {
         console.error('Error in /api/predict:', error);
-        res.status(500).json({ success: false, error: error.message });
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
+    }
+});
+
+// POST /api/forecast
+app.post('/api/forecast', async (req, res) => {
+    try {
+        const { start_date, days = 7, temperature, rainfall, event_flag = 0 } = req.body;
+
+        if (!Number.isInteger(days) || days < 1 || days > 366) {
+            return res.status(400).json({ success: false, error: 'days must be an integer between 1 and 366' });
+        }
+
+        const forecast = await forecastHorizon({ start_date, days, temperature, rainfall, event_flag });
+        res.json({ success: true, data: forecast });
+    } catch (error) {
+        console.error('Error in /api/forecast:', error);
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
+    }
+});
+
+// GET /api/predict/timings
+app.get('/api/predict/timings', async (req, res) => {
+    try {
+        const timings = await getPredictorTimings(req.query.reset === 'true');
+        res.json({ success: true, data: timings });
+    } catch (error) {
+        console.error('Error in /api/predict/timings:', error);
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
+    }
+});
+
+// GET /api/predict/pool
+app.get('/api/predict/pool', (req, res) => {
+    res.json({ success: true, data: getPoolStats() });
+});
+
+// GET /api/models
+app.get('/api/models', async (req, res) => {
+    try {
+        const models = await getModelRegistry(req.query.reload === 'true');
+        res.json({ success: true, data: models });
+    } catch (error) {
+        console.error('Error in /api/models:', error);
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
     }
 });
 
@@ -82,7 +140,7 @@ app.post('/api/simulate-day', async (req, res) => {
         res.json({ success: true, data: result });
     } catch (error) {
         console.error('Error in /api/simulate-day:', error);
-        res.status(500).json({ success: false, error: error.message });
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
     }
 });
 
@@ -94,7 +152,27 @@ app.post('/api/simulate', async (req, res) => {
         res.json({ success: true, data: results });
     } catch (error) {
         console.error('Error in /api/simulate:', error);
-        res.status(500).json({ success: false, error: error.message });
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
+    }
+});
+
+// POST /api/simulate/monte-carlo
+app.post('/api/simulate/monte-carlo', async (req, res) => {
+    try {
+        const { days = 7, eventDays = [], scenarios = 1000, seed = null } = req.body;
+
+        if (!Number.isInteger(days) || days < 1 || days > 3650) {
+            return res.status(400).json({ success: false, error: 'days must be an integer between 1 and 3650' });
+        }
+        if (!Number.isInteger(scenarios) || scenarios < 1 || scenarios > 100000) {
+            return res.status(400).json({ success: false, error: 'scenarios must be an integer between 1 and 100000' });
+        }
+
+        const results = await runMonteCarlo(days, eventDays, scenarios, seed);
+        res.json({ success: true, data: results });
+    } catch (error) {
+        console.error('Error in /api/simulate/monte-carlo:', error);
+        res.status(error.statusCode || 500).json({ success: false, error: error.message });
     }
 });
 
@@ -132,8 +210,13 @@ app.listen(PORT, () => {
     console.log(`📡 API endpoints:`);
     console.log(`   GET  /api/weather?city=Delhi`);
     console.log(`   POST /api/predict`);
+    console.log(`   POST /api/forecast`);
+    console.log(`   GET  /api/predict/timings`);
+    console.log(`   GET  /api/predict/pool`);
+    console.log(`   GET  /api/models`);
     console.log(`   POST /api/simulate-day`);
     console.log(`   POST /api/simulate`);
+    console.log(`   POST /api/simulate/monte-carlo`);
     console.log(`   GET  /api/metrics`);
     console.log(`   POST /api/reset`);
 });
@@ -0,0 +1,12 @@
+/**
+ * Calendar Features
+ * Date fields in the encoding the demand model was trained on
+ */
+
+// Date.getDay() counts from Sunday = 0; the model's day_of_week is pandas
+// dayofweek (Monday = 0), as in training and the forecast endpoint
+function modelDayOfWeek(date) {
+    return (date.getDay() + 6) % 7;
+}
+
+module.exports = { modelDayOfWeek };
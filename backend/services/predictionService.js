@@ -1,47 +1,368 @@
 /**
  * Prediction Service
- * Spawns Python predict.py script via child_process to get demand predictions
+ * Keeps a pool of long-lived Python predict.py processes (--serve mode) and
+ * exchanges newline-delimited JSON with them, so the model is loaded once per
+ * worker instead of per request.
+ *
+ * Workers memory-map the same flat model artifact (model_artifact.py), so the
+ * tree tables sit once in the OS page cache however many workers run. The
+ * pool starts with one worker and adds more (up to PREDICT_WORKERS, default
+ * one per CPU) while requests are waiting, but only after a worker has
+ * answered once, so later workers map the artifact the first one wrote
+ * rather than each rebuilding it from the pickle.
+ *
+ * Requests wait in one FIFO queue and go to the least-loaded worker, at most
+ * WORKER_DEPTH in flight per worker. When PREDICT_QUEUE_LIMIT requests are
+ * already waiting, new ones are rejected with statusCode 503.
+ *
+ * Single predictions are micro-batched: calls arriving within
+ * PREDICT_BATCH_WINDOW_MS of the first (default 2, 0 disables) are sent as one
+ * list request, so the model runs once on the stacked feature rows, flushed
+ * early at PREDICT_BATCH_MAX rows. A call identical to one already waiting or
+ * in flight shares its result instead of adding a row.
+ *
+ * Store sales history (model/history_store.py) is shared through its file,
+ * not held per worker: a worker re-reads it when it changes, and an observe
+ * command merges its day into the file under a lock, so it can go to any
+ * worker.
  */
 
 const { spawn } = require('child_process');
+const os = require('os');
 const path = require('path');
 
-function predictDemand(features) {
-    return new Promise((resolve, reject) => {
-        const pythonPath = path.join(__dirname, '../../model/venv/bin/python3');
-        const scriptPath = path.join(__dirname, '../../model/predict.py');
+const pythonPath = path.join(__dirname, '../../model/venv/bin/python3');
+const scriptPath = path.join(__dirname, '../../model/predict.py');
 
-        const python = spawn(pythonPath, [scriptPath]);
+// PREDICT_TIMINGS=1 adds per-stage timings to every response and keeps latency histograms
+const predictorArgs = process.env.PREDICT_TIMINGS === '1' ? ['--serve', '--timings'] : ['--serve'];
 
-        let dataString = '';
-        let errorString = '';
+const POOL_SIZE = Math.max(1, parseInt(process.env.PREDICT_WORKERS, 10) || os.cpus().length);
+const QUEUE_LIMIT = Math.max(1, parseInt(process.env.PREDICT_QUEUE_LIMIT, 10) || 1000);
+// Requests written to a worker ahead of the one it is running hide the pipe round trip
+const WORKER_DEPTH = 2;
 
-        python.stdout.on('data', (data) => {
-            dataString += data.toString();
-        });
+const workers = [];
+const queue = [];
+const poolStats = { started: Date.now(), dispatched: 0, rejected: 0, exits: 0, waitMsTotal: 0, waitMsMax: 0 };
+let nextWorkerId = 1;
 
-        python.stderr.on('data', (data) => {
-            errorString += data.toString();
-        });
+const BATCH_WINDOW_MS = Math.max(0, parseFloat(process.env.PREDICT_BATCH_WINDOW_MS ?? '2') || 0);
+// 64 rows is where predict.py switches from its compiled tree engine to sklearn
+const BATCH_MAX = Math.max(1, parseInt(process.env.PREDICT_BATCH_MAX, 10) || 64);
+const BATCH_SIZE_BUCKETS = [1, 2, 4, 8, 16, 32, 64];
 
-        python.on('close', (code) => {
-            if (code !== 0) {
-                reject(new Error(`Python script exited with code ${code}: ${errorString}`));
-                return;
+let openBatch = null;
+const inFlightPredictions = new Map();
+const batchStats = {
+    batches: 0, rows: 0, deduplicated: 0, fallbacks: 0, maxSize: 0,
+    sizeHistogram: new Array(BATCH_SIZE_BUCKETS.length + 1).fill(0), delayMsTotal: 0, delayMsMax: 0
+};
+
+function startPredictor() {
+    // One thread per worker: the pool is the parallelism, OpenMP in sklearn would oversubscribe
+    const env = POOL_SIZE > 1 ? { ...process.env, OMP_NUM_THREADS: '1' } : process.env;
+    const python = spawn(pythonPath, [scriptPath, ...predictorArgs], { env });
+    const state = {
+        id: nextWorkerId++, python, pending: [], buffer: '', errorString: '',
+        ready: false, started: Date.now(), busySince: null, busyMs: 0, requests: 0, errors: 0
+    };
+
+    python.stdout.on('data', (data) => {
+        state.buffer += data.toString();
+
+        let newline;
+        while ((newline = state.buffer.indexOf('\n')) !== -1) {
+            const line = state.buffer.slice(0, newline);
+            state.buffer = state.buffer.slice(newline + 1);
+
+            // Responses come back in request order
+            const request = state.pending.shift();
+            if (!request) continue;
+            state.ready = true;
+            state.requests++;
+            if (state.pending.length === 0) {
+                state.busyMs += Date.now() - state.busySince;
+                state.busySince = null;
             }
 
             try {
-                const result = JSON.parse(dataString);
-                resolve(result);
+                const result = JSON.parse(line);
+                if (result.error) {
+                    state.errors++;
+                    request.reject(new Error(`Prediction failed: ${result.error}`));
+                } else {
+                    request.resolve(result);
+                }
             } catch (error) {
-                reject(new Error(`Failed to parse Python output: ${error.message}\nOutput: ${dataString}`));
+                state.errors++;
+                request.reject(new Error(`Failed to parse Python output: ${error.message}\nOutput: ${line}`));
             }
-        });
+        }
+        dispatch();
+    });
 
-        // Send features as JSON to stdin
-        python.stdin.write(JSON.stringify(features));
-        python.stdin.end();
+    python.stderr.on('data', (data) => {
+        state.errorString += data.toString();
     });
+
+    let failed = false;
+    const fail = (error) => {
+        if (failed) return;
+        failed = true;
+        const index = workers.indexOf(state);
+        if (index !== -1) workers.splice(index, 1);
+        poolStats.exits++;
+        for (const request of state.pending.splice(0)) {
+            request.reject(error);
+        }
+        // A replacement is started if requests are still waiting
+        dispatch();
+    };
+
+    // Write errors (EPIPE after the process died) are reported through 'close'
+    python.stdin.on('error', () => {});
+    python.on('error', (error) => fail(new Error(`Failed to start Python predictor: ${error.message}`)));
+    python.on('close', (code) => {
+        fail(new Error(`Python script exited with code ${code}: ${state.errorString}${state.buffer}`));
+    });
+
+    workers.push(state);
+    return state;
+}
+
+function writeRequest(worker, entry) {
+    if (worker.pending.length === 0) {
+        worker.busySince = Date.now();
+    }
+    worker.pending.push(entry);
+    // Send request as one JSON line to stdin
+    worker.python.stdin.write(JSON.stringify(entry.request) + '\n');
+}
+
+function leastLoadedWorker() {
+    let best = null;
+    for (const worker of workers) {
+        if (!best || worker.pending.length < best.pending.length) best = worker;
+    }
+    return best;
+}
+
+function canAddWorker() {
+    return workers.length === 0 || (workers.length < POOL_SIZE && workers.some((worker) => worker.ready));
+}
+
+// Move queued requests to workers with spare depth, starting workers as needed
+function dispatch() {
+    while (queue.length > 0) {
+        let worker = leastLoadedWorker();
+        if ((!worker || worker.pending.length > 0) && canAddWorker()) {
+            worker = startPredictor();
+        }
+        if (!worker || worker.pending.length >= WORKER_DEPTH) return;
+
+        const entry = queue.shift();
+        const waitMs = Date.now() - entry.queuedAt;
+        poolStats.dispatched++;
+        poolStats.waitMsTotal += waitMs;
+        poolStats.waitMsMax = Math.max(poolStats.waitMsMax, waitMs);
+        writeRequest(worker, entry);
+    }
+}
+
+function sendRequest(request) {
+    return new Promise((resolve, reject) => {
+        if (queue.length >= QUEUE_LIMIT) {
+            poolStats.rejected++;
+            const error = new Error(`Prediction queue is full (${QUEUE_LIMIT} waiting), try again later`);
+            error.statusCode = 503;
+            reject(error);
+            return;
+        }
+        queue.push({ request, resolve, reject, queuedAt: Date.now() });
+        dispatch();
+    });
+}
+
+// Send a command to every running worker (starting one if none is), bypassing the queue
+function broadcast(request) {
+    if (workers.length === 0) startPredictor();
+    return Promise.all(workers.map((worker) => new Promise((resolve, reject) => {
+        writeRequest(worker, { request, resolve, reject });
+    }).then((result) => ({ worker: worker.id, ...result }))));
+}
+
+// Send the open micro-batch as one list request and hand each caller its row
+function flushBatch() {
+    const batch = openBatch;
+    openBatch = null;
+    clearTimeout(batch.timer);
+
+    const now = Date.now();
+    const size = batch.entries.length;
+    batchStats.batches++;
+    batchStats.rows += size;
+    batchStats.maxSize = Math.max(batchStats.maxSize, size);
+    const bucket = BATCH_SIZE_BUCKETS.findIndex((edge) => size <= edge);
+    batchStats.sizeHistogram[bucket === -1 ? BATCH_SIZE_BUCKETS.length : bucket]++;
+    for (const entry of batch.entries) {
+        const delayMs = now - entry.queuedAt;
+        batchStats.delayMsTotal += delayMs;
+        batchStats.delayMsMax = Math.max(batchStats.delayMsMax, delayMs);
+    }
+
+    if (size === 1) {
+        const [entry] = batch.entries;
+        sendRequest(entry.features).then(entry.resolve, entry.reject);
+        return;
+    }
+    sendRequest(batch.entries.map((entry) => entry.features)).then(
+        (results) => batch.entries.forEach((entry, i) => entry.resolve(results[i])),
+        (error) => {
+            if (error.statusCode === 503) {
+                batch.entries.forEach((entry) => entry.reject(error));
+                return;
+            }
+            // One bad row fails the whole list: retry singly so only that caller sees the error
+            batchStats.fallbacks++;
+            for (const entry of batch.entries) {
+                sendRequest(entry.features).then(entry.resolve, entry.reject);
+            }
+        }
+    );
+}
+
+function predictDemand(features) {
+    // A lone feature object is sent as is, so it must not read as a predictor command or mode
+    if ('command' in features || 'mode' in features) {
+        return Promise.reject(new Error('predictDemand takes feature objects; commands go through broadcast()'));
+    }
+    if (BATCH_WINDOW_MS === 0 || features.timings) {
+        return sendRequest(features);
+    }
+
+    const key = JSON.stringify(features);
+    const shared = inFlightPredictions.get(key);
+    if (shared) {
+        batchStats.deduplicated++;
+        // Each caller gets its own copy of the shared result
+        return shared.then((result) => structuredClone(result));
+    }
+
+    const prediction = new Promise((resolve, reject) => {
+        if (!openBatch) {
+            openBatch = { entries: [], timer: setTimeout(flushBatch, BATCH_WINDOW_MS) };
+        }
+        openBatch.entries.push({ features, resolve, reject, queuedAt: Date.now() });
+        if (openBatch.entries.length >= BATCH_MAX) flushBatch();
+    });
+    inFlightPredictions.set(key, prediction);
+    const forget = () => inFlightPredictions.delete(key);
+    prediction.then(forget, forget);
+    return prediction;
+}
+
+/**
+ * Predict many feature objects with one model call.
+ * Resolves to an array of prediction results in input order.
+ */
+function predictDemandBatch(featuresList) {
+    if (featuresList.length === 0) return Promise.resolve([]);
+    return sendRequest(featuresList);
+}
+
+/**
+ * Multi-day hourly forecast (days x 24 x items) with bounds, from one model call.
+ * params: { start_date, days, temperature, rainfall, event_flag } where weather
+ * may be a scalar, 24 hourly values or days x 24 values.
+ */
+function forecastHorizon(params) {
+    return sendRequest({ ...params, mode: 'horizon' });
+}
+
+/**
+ * Monte Carlo run of the multi-day simulation loop in Python (model/simulate.py).
+ * params: { days, scenarios, event_days, seed, temperature, rainfall, percentiles }
+ * Resolves to per-metric distributions (mean, std, min, max, percentiles).
+ */
+function simulateScenarios(params) {
+    return sendRequest({ ...params, mode: 'simulate' });
+}
+
+/**
+ * Cumulative per-stage latency counters and histograms of each predictor worker.
+ * Pass reset = true to clear them after reading.
+ */
+async function getPredictorTimings(reset = false) {
+    return { workers: await broadcast({ command: 'timings', reset }) };
+}
+
+/**
+ * Models resident in each predictor worker (model/model_registry.py): version,
+ * source file digest, request counts and the recent load/swap events.
+ * Pass reload = true to check the model files for changes first.
+ */
+async function getModelRegistry(reload = false) {
+    if (reload) {
+        await broadcast({ command: 'reload' });
+    }
+    return { workers: await broadcast({ command: 'models' }) };
+}
+
+/**
+ * Pool size, queue depth and backpressure counters, micro-batch sizes and
+ * batching delay, and per-worker utilization (share of its lifetime with at
+ * least one request in flight).
+ */
+function getPoolStats() {
+    const now = Date.now();
+    return {
+        size: POOL_SIZE,
+        running: workers.length,
+        queued: queue.length,
+        queueLimit: QUEUE_LIMIT,
+        dispatched: poolStats.dispatched,
+        rejected: poolStats.rejected,
+        workerExits: poolStats.exits,
+        queueWaitMs: {
+            mean: poolStats.dispatched ? +(poolStats.waitMsTotal / poolStats.dispatched).toFixed(2) : 0,
+            max: poolStats.waitMsMax
+        },
+        batching: {
+            windowMs: BATCH_WINDOW_MS,
+            maxSize: BATCH_MAX,
+            batches: batchStats.batches,
+            rows: batchStats.rows,
+            meanSize: batchStats.batches ? +(batchStats.rows / batchStats.batches).toFixed(2) : 0,
+            largest: batchStats.maxSize,
+            sizeHistogram: Object.fromEntries(
+                [...BATCH_SIZE_BUCKETS.map((edge) => `<=${edge}`), `>${BATCH_SIZE_BUCKETS.at(-1)}`]
+                    .map((label, i) => [label, batchStats.sizeHistogram[i]])
+                    .filter(([, n]) => n)
+            ),
+            deduplicated: batchStats.deduplicated,
+            fallbacks: batchStats.fallbacks,
+            batchDelayMs: {
+                mean: batchStats.rows ? +(batchStats.delayMsTotal / batchStats.rows).toFixed(2) : 0,
+                max: batchStats.delayMsMax
+            }
+        },
+        workers: workers.map((worker) => {
+            const busyMs = worker.busyMs + (worker.busySince !== null ? now - worker.busySince : 0);
+            return {
+                id: worker.id,
+                pid: worker.python.pid,
+                ready: worker.ready,
+                inFlight: worker.pending.length,
+                requests: worker.requests,
+                errors: worker.errors,
+                utilization: +(busyMs / Math.max(1, now - worker.started)).toFixed(3)
+            };
+        })
+    };
 }
 
-module.exports = { predictDemand };
+module.exports = {
+    predictDemand, predictDemandBatch, forecastHorizon, simulateScenarios,
+    getPredictorTimings, getModelRegistry, getPoolStats
+};
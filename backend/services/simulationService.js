@@ -6,11 +6,12 @@
  * - Comprehensive metrics tracking
  */
 
-const { predictDemand } = require('./predictionService');
+const { predictDemand, predictDemandBatch, simulateScenarios } = require('./predictionService');
 const { getCurrentWeather } = require('./weatherService');
 const { computeIngredientUsage, computeSurplus, computeSurplusRisk, DEFAULT_INVENTORY } = require('./ingredientMapping');
 const { makeDecision, resetShelter } = require('./decisionEngine');
 const { BaselineStrategy } = require('./baselineStrategy');
+const { modelDayOfWeek } = require('./calendar');
 
 // AI System state
 let simulationState = {
@@ -24,26 +25,34 @@ let simulationState = {
     adaptationHistory: []
 };
 
-async function simulateDay(dayNumber, weather = null, eventFlag = 0, cookingFactor = null) {
+function buildDayFeatures(dayNumber, weather, eventFlag) {
     const date = new Date();
     date.setDate(date.getDate() + dayNumber);
 
     const hour = 14; // Peak prediction hour
-    const dayOfWeek = date.getDay();
-
-    // Get weather
-    const currentWeather = weather || await getCurrentWeather();
+    const dayOfWeek = modelDayOfWeek(date);
 
     const features = {
         hour,
         day_of_week: dayOfWeek,
-        temperature: currentWeather.temperature,
-        rainfall: currentWeather.rainfall,
+        temperature: weather.temperature,
+        rainfall: weather.rainfall,
         event_flag: eventFlag
     };
 
-    // Predict demand
-    const predictionResult = await predictDemand(features);
+    return { date, features };
+}
+
+async function simulateDay(dayNumber, weather = null, eventFlag = 0, cookingFactor = null, predictionResult = null) {
+    // Get weather
+    const currentWeather = weather || await getCurrentWeather();
+
+    const { date, features } = buildDayFeatures(dayNumber, currentWeather, eventFlag);
+
+    // Predict demand (unless already predicted in a batch)
+    if (!predictionResult) {
+        predictionResult = await predictDemand(features);
+    }
     // Use Daily Predictions if available for simulation scale, otherwise fallback to hourly
     const predictions = predictionResult.daily_predictions || predictionResult.predictions;
     const uncertainty = predictionResult.daily_uncertainty || predictionResult.uncertainty;
@@ -167,11 +176,23 @@ async function runSimulation(numDays = 7, eventDays = []) {
     const aiResults = [];
     const baselineResults = [];
 
+    // Predictions don't depend on simulation state, so fetch every day's
+    // weather up front and predict all days in a single batch call
+    const eventFlags = [];
+    const weathers = [];
+    for (let i = 0; i < numDays; i++) {
+        eventFlags.push(eventDays.includes(i) ? 1 : 0);
+        weathers.push(await getCurrentWeather());
+    }
+    const predictionResults = await predictDemandBatch(
+        weathers.map((weather, i) => buildDayFeatures(i, weather, eventFlags[i]).features)
+    );
+
     for (let i = 0; i < numDays; i++) {
-        const eventFlag = eventDays.includes(i) ? 1 : 0;
+        const eventFlag = eventFlags[i];
 
         // Run AI simulation
-        const aiDay = await simulateDay(i, null, eventFlag);
+        const aiDay = await simulateDay(i, weathers[i], eventFlag, null, predictionResults[i]);
         aiResults.push(aiDay);
 
         // Run baseline simulation (same actual demand)
@@ -199,6 +220,16 @@ async function runSimulation(numDays = 7, eventDays = []) {
     };
 }
 
+/**
+ * Many independent runs of the same loop as runSimulation, vectorized in one
+ * Python call. Returns distributions of the summary metrics (waste reduced,
+ * meals donated, revenue delta, ...) instead of a single random path.
+ * Leaves the interactive simulation state untouched.
+ */
+async function runMonteCarlo(numDays = 7, eventDays = [], scenarios = 1000, seed = null) {
+    return simulateScenarios({ days: numDays, event_days: eventDays, scenarios, seed });
+}
+
 function calculateComparison(aiMetrics, baselineMetrics) {
     // "Food Saved" is strictly what AI redistributed/saved from waste
     // Baseline wastes everything surplus. AI saves surplus via redistribution.
@@ -271,6 +302,7 @@ function getMetrics() {
 module.exports = {
     simulateDay,
     runSimulation,
+    runMonteCarlo,
     getMetrics,
     resetSimulation
 };
@@ -54,7 +54,7 @@ function Dashboard({ initialConfig, onBack }) {
 
         const now = new Date();
         const hour = now.getHours();
-        const dayOfWeek = now.getDay();
+        const dayOfWeek = (now.getDay() + 6) % 7; // Monday = 0, as the model was trained
 
         const features = {
             hour,
@@ -24,6 +24,17 @@ export const api = {
         return data.data;
     },
 
+    async forecast({ startDate, days = 7, temperature, rainfall, eventFlag = 0 }) {
+        const response = await fetch(`${API_BASE}/forecast`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ start_date: startDate, days, temperature, rainfall, event_flag: eventFlag })
+        });
+        const data = await response.json();
+        if (!data.success) throw new Error(data.error);
+        return data.data;
+    },
+
     async simulateDay(day, eventFlag = 0) {
         const response = await fetch(`${API_BASE}/simulate-day`, {
             method: 'POST',
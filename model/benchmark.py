@@ -0,0 +1,361 @@
+"""
+Performance Benchmarks
+======================
+Repeatable timings for the prediction and training paths, written to a JSON
+file that can be compared against a stored baseline.
+
+Suites:
+  predict    cold start of `python predict.py` (process launch to exit),
+             warm single-row latency and batch throughput at several sizes
+             against one `predict.py --serve --cache-size 0` process
+  features   engineer_features and pivot_features time versus row count
+  train      train_model_v2 fit time (feature build + one engine fit)
+
+Inputs are generated from a seed: prediction requests are hourly rows from
+generate_data.py, Kaggle-format sales are drawn around the per-weekday
+levels, price and promo rate of kaggle_sample.csv. The predict suite uses
+the deployed demand_model_kaggle.pkl. Its requests carry no store_id, so
+timings don't depend on whether history_store.npz or store_models/ exist
+on the machine (both are looked up by store_id in predict.py).
+
+Every metric is recorded with its unit and direction; `compare` flags any
+metric that got worse by more than --threshold (relative) and exits with
+status 1 if there are regressions.
+
+Usage:
+  python benchmark.py run                                  all suites -> benchmark_results.json
+  python benchmark.py run --suites predict --quick
+  python benchmark.py run --output benchmark_baseline.json store a baseline
+  python benchmark.py compare benchmark_baseline.json      against benchmark_results.json
+  python benchmark.py compare old.json new.json --threshold 0.05
+"""
+
+import os
+import sys
+import json
+import time
+import io
+import argparse
+import platform
+import contextlib
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import generate_data
+from features import ITEM_MAPPING, engineer_features, pivot_features, prepare_sales
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PREDICT_SCRIPT = os.path.join(BASE_DIR, 'predict.py')
+MODEL_PATH = os.path.join(BASE_DIR, 'demand_model_kaggle.pkl')
+SAMPLE_PATH = os.path.join(BASE_DIR, 'kaggle_sample.csv')
+RESULTS_PATH = 'benchmark_results.json'
+
+SUITES = ['predict', 'features', 'train']
+SEED = 42
+THRESHOLD = 0.10  # relative change that counts as a regression
+
+# Full and --quick sizes per suite
+SIZES = {
+    'full': {'cold_runs': 7, 'warm_requests': 300, 'batch_sizes': [1, 16, 64, 256, 1024],
+             'batch_repeats': 15, 'feature_rows': [10_000, 50_000, 200_000], 'feature_repeats': 3,
+             'train_stores': 10, 'train_days': 730},
+    'quick': {'cold_runs': 3, 'warm_requests': 50, 'batch_sizes': [1, 64, 256],
+              'batch_repeats': 5, 'feature_rows': [10_000, 50_000], 'feature_repeats': 1,
+              'train_stores': 3, 'train_days': 365},
+}
+
+
+def metric(value, unit, better='lower'):
+    return {'value': round(float(value), 3), 'unit': unit, 'better': better}
+
+
+def quiet():
+    """Swallow the progress prints of the training/feature functions."""
+    return contextlib.redirect_stdout(io.StringIO())
+
+
+def latency_metrics(prefix, seconds):
+    """p50/p95/mean latency in ms for a list of timings in seconds."""
+    ms = np.asarray(seconds) * 1000
+    return {
+        f'{prefix}.p50_ms': metric(np.percentile(ms, 50), 'ms'),
+        f'{prefix}.p95_ms': metric(np.percentile(ms, 95), 'ms'),
+        f'{prefix}.mean_ms': metric(ms.mean(), 'ms'),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Reproducible inputs
+# ---------------------------------------------------------------------------
+
+def prediction_requests(n, seed=SEED, num_stores=10):
+    """
+    n single-row requests drawn from generate_data.py hourly rows, without
+    store_id, so they never hit the store history or per-store models.
+    """
+    scales = generate_data.store_scales(num_stores, seed)
+    rows = []
+    d = 0
+    while len(rows) < n:
+        day = generate_data.generate_day(d, num_stores, seed, scales)
+        for i in range(len(day['hour'])):
+            rows.append({
+                'hour': int(day['hour'][i]),
+                'day_of_week': int(day['day_of_week'][i]),
+                'temperature': float(day['temperature'][i]),
+                'rainfall': float(day['rainfall'][i]),
+                'event_flag': int(day['event_flag'][i]),
+            })
+        d += 1
+    order = np.random.default_rng(seed).permutation(len(rows))[:n]
+    return [rows[i] for i in order]
+
+
+def kaggle_sales(num_stores, num_days, seed=SEED, start='2019-01-01'):
+    """
+    Kaggle-format rows (date, store_id, item_id, sales, price, promo,
+    weekday, month) for the menu items, shaped like kaggle_sample.csv.
+    """
+    sample = pd.read_csv(SAMPLE_PATH)
+    weekday_level = sample.groupby('weekday')['sales'].mean().reindex(range(7)).to_numpy()
+    price = sample['price'].median()
+    promo_rate = sample['promo'].mean()
+
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(start, periods=num_days, freq='D')
+    items = list(ITEM_MAPPING)
+    shape = (num_stores, len(items), num_days)
+
+    level = (rng.lognormal(0, 0.2, num_stores)[:, None, None]
+             * rng.uniform(0.6, 1.4, len(items))[None, :, None]
+             * weekday_level[dates.weekday.to_numpy()][None, None, :])
+    promo = rng.random(shape) < promo_rate
+    sales = rng.poisson(level * np.where(promo, 1.2, 1.0))
+
+    return pd.DataFrame({
+        'date': np.tile(dates.strftime('%Y-%m-%d').to_numpy(), num_stores * len(items)),
+        'store_id': np.repeat([f'store_{i}' for i in range(1, num_stores + 1)], len(items) * num_days),
+        'item_id': np.tile(np.repeat(items, num_days), num_stores),
+        'sales': sales.ravel(),
+        'price': np.round(price * np.tile(rng.uniform(0.5, 1.5, len(items)).repeat(num_days), num_stores), 2),
+        'promo': promo.ravel().astype(int),
+        'weekday': np.tile(dates.weekday.to_numpy(), num_stores * len(items)),
+        'month': np.tile(dates.month.to_numpy(), num_stores * len(items)),
+    })
+
+
+# ---------------------------------------------------------------------------
+# Suites
+# ---------------------------------------------------------------------------
+
+class PredictServer:
+    """`predict.py --serve` child process answering one JSON line per request."""
+
+    def __init__(self):
+        self.proc = subprocess.Popen([sys.executable, PREDICT_SCRIPT, '--serve', '--cache-size', '0'],
+                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                                     cwd=BASE_DIR)
+
+    def request(self, payload):
+        self.proc.stdin.write(json.dumps(payload) + '\n')
+        self.proc.stdin.flush()
+        response = json.loads(self.proc.stdout.readline())
+        if isinstance(response, dict) and 'error' in response:
+            raise RuntimeError(f"predict.py: {response['error']}")
+        return response
+
+    def close(self):
+        self.proc.stdin.close()
+        self.proc.wait(timeout=30)
+
+
+def bench_predict(sizes, seed):
+    if not os.path.exists(MODEL_PATH):
+        raise FileNotFoundError(f'{MODEL_PATH} not found; train a model first')
+    results = {}
+    requests = prediction_requests(max(sizes['warm_requests'], max(sizes['batch_sizes'])), seed)
+
+    # Cold start: process launch to exit for one prediction
+    payload = json.dumps(requests[0])
+    cold = []
+    for _ in range(sizes['cold_runs']):
+        start = time.perf_counter()
+        proc = subprocess.run([sys.executable, PREDICT_SCRIPT], input=payload, capture_output=True,
+                              text=True, cwd=BASE_DIR)
+        cold.append(time.perf_counter() - start)
+        if proc.returncode != 0:
+            raise RuntimeError(f'predict.py failed: {proc.stdout or proc.stderr}')
+    results.update(latency_metrics('predict.cold_start', cold))
+    print(f"  cold start: p50 {results['predict.cold_start.p50_ms']['value']:.1f} ms")
+
+    server = PredictServer()
+    try:
+        model_version = server.request(requests[0]).get('model_version')
+        for payload in requests[1:10]:  # warm up
+            server.request(payload)
+
+        warm = []
+        for payload in requests[:sizes['warm_requests']]:
+            start = time.perf_counter()
+            server.request(payload)
+            warm.append(time.perf_counter() - start)
+        results.update(latency_metrics('predict.warm_single', warm))
+        print(f"  warm single row: p50 {results['predict.warm_single.p50_ms']['value']:.2f} ms")
+
+        for size in sizes['batch_sizes']:
+            batch = requests[:size]
+            times = []
+            for _ in range(sizes['batch_repeats']):
+                start = time.perf_counter()
+                server.request(batch)
+                times.append(time.perf_counter() - start)
+            median = float(np.median(times))
+            results[f'predict.batch_{size}.p50_ms'] = metric(median * 1000, 'ms')
+            results[f'predict.batch_{size}.rows_per_s'] = metric(size / median, 'rows/s', 'higher')
+            print(f"  batch {size:>5}: {median * 1000:8.2f} ms ({size / median:,.0f} rows/s)")
+    finally:
+        server.close()
+    return results, {'model_version': model_version}
+
+
+def bench_features(sizes, seed):
+    results = {}
+    items = len(ITEM_MAPPING)
+    for rows in sizes['feature_rows']:
+        num_stores = max(1, rows // (items * 365))
+        num_days = rows // (items * num_stores)
+        raw = kaggle_sales(num_stores, num_days, seed)
+        df = prepare_sales(raw)
+
+        engineer, pivot = [], []
+        for _ in range(sizes['feature_repeats']):
+            with quiet():
+                start = time.perf_counter()
+                engineered = engineer_features(df.copy())
+                mid = time.perf_counter()
+                pivot_features(engineered)
+                end = time.perf_counter()
+            engineer.append(mid - start)
+            pivot.append(end - mid)
+
+        results[f'features.engineer_{rows}.ms'] = metric(min(engineer) * 1000, 'ms')
+        results[f'features.pivot_{rows}.ms'] = metric(min(pivot) * 1000, 'ms')
+        results[f'features.engineer_{rows}.rows_per_s'] = metric(len(df) / min(engineer), 'rows/s', 'higher')
+        print(f"  {len(df):>8} rows: engineer {min(engineer) * 1000:8.1f} ms, "
+              f"pivot {min(pivot) * 1000:8.1f} ms")
+    return results, {}
+
+
+def bench_train(sizes, seed, engine):
+    from train_model_v2 import FIT_ENGINE, split_xy
+
+    raw = kaggle_sales(sizes['train_stores'], sizes['train_days'], seed)
+    with quiet():
+        start = time.perf_counter()
+        pivot_df = pivot_features(engineer_features(prepare_sales(raw)))
+        X, Y, _ = split_xy(pivot_df)
+        features_s = time.perf_counter() - start
+
+        # Same time-based 80/20 split as train_model_v2
+        dates = pivot_df['date'].sort_values().unique()
+        train_mask = pivot_df['date'] < dates[int(len(dates) * 0.8)]
+        start = time.perf_counter()
+        FIT_ENGINE[engine](X[train_mask], Y[train_mask], pivot_df['date'][train_mask])
+        fit_s = time.perf_counter() - start
+
+    print(f"  {int(train_mask.sum())} training rows: features {features_s:.2f}s, "
+          f"{engine} fit {fit_s:.2f}s")
+    return {
+        'train.features_s': metric(features_s, 's'),
+        f'train.fit_{engine}_s': metric(fit_s, 's'),
+    }, {'train_rows': int(train_mask.sum()), 'engine': engine}
+
+
+def run(suites, output, quick=False, seed=SEED, engine='gbr'):
+    sizes = SIZES['quick' if quick else 'full']
+    report = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'seed': seed,
+            'sizes': 'quick' if quick else 'full',
+        },
+        'results': {},
+    }
+    for suite in suites:
+        print(f"\n[{suite}]")
+        start = time.perf_counter()
+        if suite == 'predict':
+            results, meta = bench_predict(sizes, seed)
+        elif suite == 'features':
+            results, meta = bench_features(sizes, seed)
+        else:
+            results, meta = bench_train(sizes, seed, engine)
+        report['results'].update(results)
+        report['meta'][suite] = dict(meta, elapsed_s=round(time.perf_counter() - start, 1))
+
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults saved to {output}")
+    return report
+
+
+def compare(baseline_path, current_path, threshold=THRESHOLD):
+    """Print the relative change of every shared metric; returns the regressed names."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    with open(current_path) as f:
+        current = json.load(f)['results']
+
+    regressions = []
+    print(f'{"Metric":<36} {"Baseline":>12} {"Current":>12} {"Change":>8}')
+    print('-' * 72)
+    for name in sorted(set(baseline) & set(current)):
+        old, new = baseline[name]['value'], current[name]['value']
+        change = (new - old) / old if old else 0.0
+        worse = change > threshold if current[name]['better'] == 'lower' else change < -threshold
+        flag = '  REGRESSION' if worse else ''
+        if worse:
+            regressions.append(name)
+        print(f'{name:<36} {old:>12.3f} {new:>12.3f} {change:>+7.1%}{flag}')
+
+    missing = sorted(set(baseline) - set(current))
+    if missing:
+        print(f"\nNot in current results: {', '.join(missing)}")
+    print(f"\n{len(regressions)} regression(s) above {threshold:.0%}")
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Benchmark prediction and training performance')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='run benchmark suites')
+    run_parser.add_argument('--suites', nargs='+', choices=SUITES, default=SUITES)
+    run_parser.add_argument('--output', default=RESULTS_PATH, help='results file (default: %(default)s)')
+    run_parser.add_argument('--quick', action='store_true', help='smaller sizes for a fast check')
+    run_parser.add_argument('--seed', type=int, default=SEED)
+    run_parser.add_argument('--engine', choices=['gbr', 'hist'], default='gbr',
+                            help='engine for the train suite')
+
+    compare_parser = sub.add_parser('compare', help='compare results against a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current', nargs='?', default=RESULTS_PATH)
+    compare_parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                                help='relative change flagged as a regression (default: %(default)s)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.command == 'run':
+        run(args.suites, args.output, args.quick, args.seed, args.engine)
+    else:
+        sys.exit(1 if compare(args.baseline, args.current, args.threshold) else 0)
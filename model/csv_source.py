@@ -0,0 +1,75 @@
+"""
+CSV Source Tracking
+===================
+How a sales CSV changed since a store (feature_store.py, raw_store.py)
+last read it, so the store can skip it, parse only the appended bytes, or
+rebuild.
+
+A store keeps csv_state(path) in its manifest: the absolute path, size,
+mtime and a SHA-1 of the last TAIL_CHECK_BYTES bytes. csv_change() then
+tells
+  unchanged   same path and size, and the tail checksum still matches
+              (a touched file counts as unchanged)
+  appended    larger, and the bytes before the recorded size are the same
+  rewritten   anything else: another path, truncated, or edited in place
+and read_appended() parses the rows after the recorded size under the
+CSV's own header.
+"""
+
+import os
+import hashlib
+
+import pandas as pd
+
+# Bytes before the read offset whose checksum detects a rewritten CSV
+TAIL_CHECK_BYTES = 4096
+
+
+def tail_checksum(path, offset):
+    """SHA-1 of the TAIL_CHECK_BYTES bytes of path that end at offset."""
+    start = max(0, offset - TAIL_CHECK_BYTES)
+    with open(path, 'rb') as f:
+        f.seek(start)
+        return hashlib.sha1(f.read(offset - start)).hexdigest()
+
+
+def csv_state(path):
+    """What a store records about the CSV it has read."""
+    stat = os.stat(path)
+    return {
+        'path': os.path.abspath(path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'tail_sha1': tail_checksum(path, stat.st_size),
+    }
+
+
+def csv_change(state, path):
+    """'unchanged', 'appended' or 'rewritten': path compared with a csv_state (or None)."""
+    if not state or state.get('path') != os.path.abspath(path):
+        return 'rewritten'
+    stat = os.stat(path)
+    offset = state['size']
+    if stat.st_size == offset and stat.st_mtime_ns == state['mtime_ns']:
+        return 'unchanged'
+    if stat.st_size < offset or tail_checksum(path, offset) != state['tail_sha1']:
+        return 'rewritten'
+    return 'unchanged' if stat.st_size == offset else 'appended'
+
+
+def read_appended(path, offset, **read_csv_args):
+    """
+    Rows after byte offset of the CSV at path, parsed with its header's
+    column names. Extra arguments go to pd.read_csv; with chunksize the
+    result is an iterator of frames (the file stays open until it ends).
+    """
+    names = pd.read_csv(path, nrows=0).columns
+    if read_csv_args.get('chunksize'):
+        def chunks():
+            with open(path, 'rb') as f:
+                f.seek(offset)
+                yield from pd.read_csv(f, header=None, names=names, **read_csv_args)
+        return chunks()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        return pd.read_csv(f, header=None, names=names, **read_csv_args)
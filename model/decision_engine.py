@@ -0,0 +1,272 @@
+"""
+Decision Engine Sweep
+=====================
+Vectorized version of makeDecision / calculateCSVE
+(backend/services/decisionEngine.js, with the chicken spoilage check from
+foodSafetyService.js) for sensitivity analysis: many decision inputs times a
+grid of cost and rate parameters, evaluated in one NumPy pass.
+
+evaluate() reproduces, elementwise and with JavaScript rounding:
+  - expected costs: waste disposal of the chicken/potato/patty surplus,
+    discount loss on total demand, redistribution net benefit
+  - the CSVE tiers (revenue / redistribution / buffer) and their net value
+  - the action choice: cascading > redistribute > discount > normal
+  - the food-safety override (CRITICAL -> redistribute, HIGH -> cascading)
+  - shelter need, priority score and the uncertainty adjustments
+Every argument broadcasts, so a parameter can be a scalar or an array.
+
+sweep() lays out a parameter grid: each swept parameter gets its own leading
+axis (in the order given), followed by the axes of the inputs.
+
+    from decision_engine import sweep
+    result = sweep(surplus_risk, predictions, surplus, uncertainty,
+                   temperature=temps, grid={'transport_cost': [250, 500, 1000],
+                                            'social_value': np.linspace(50, 200, 31)})
+    result['action']        # (3, 31, N) codes into ACTIONS
+    result['action_share']  # (3, 31, 4) share of inputs per action
+    result['net_value']     # (3, 31, N) value of the chosen action
+
+From the command line, decision inputs (as makeDecision receives them) are
+read as a JSON list on stdin:
+  python decision_engine.py --grid transport_cost=250,500,1000 --grid social_value=50:200:31 < inputs.json
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+
+from ingredient_mapping import INGREDIENTS, sum_columns
+
+# decisionEngine.js COSTS, SHELTER and calculateCSVE parameters
+AVG_MEAL_PRICE = 150
+WASTE_DISPOSAL = 50
+TRANSPORT_COST = 500
+SOCIAL_VALUE = 100
+SHELTER_CAPACITY = 100
+SHELTER_OCCUPANCY = 65
+BASE_NEED_SCORE = 0.7
+DISCOUNT_RATE = 0.20
+CSVE_REVENUE_RATE = 0.40
+CSVE_REDISTRIBUTION_RATE = 0.50
+CSVE_DISCOUNT_PCT = 0.20
+SURPLUS_KG_INGREDIENTS = ['patty', 'potato', 'chicken']  # in surplus key order
+
+# foodSafetyService.js: chicken shelf life and heat stress steps
+CHICKEN_SHELF_HOURS = 48
+TEMP_STRESS = [(35, 2.5), (30, 2.0), (25, 1.5), (20, 1.2)]
+
+# Parameters that can be swept, with the values the backend uses
+DEFAULT_PARAMS = {
+    'waste_disposal': WASTE_DISPOSAL,
+    'avg_meal_price': AVG_MEAL_PRICE,
+    'transport_cost': TRANSPORT_COST,
+    'social_value': SOCIAL_VALUE,
+    'discount_rate': DISCOUNT_RATE,
+    'revenue_conversion_rate': CSVE_REVENUE_RATE,
+    'redistribution_rate': CSVE_REDISTRIBUTION_RATE,
+    'discount_pct': CSVE_DISCOUNT_PCT,
+    'shelter_capacity': SHELTER_CAPACITY,
+    'shelter_occupancy': SHELTER_OCCUPANCY,
+    'base_need_score': BASE_NEED_SCORE,
+}
+
+ACTIONS = ['normal', 'discount', 'redistribute', 'cascading']
+NORMAL, DISCOUNT, REDISTRIBUTE, CASCADING = range(len(ACTIONS))
+RISK_LEVELS = ['LOW', 'MEDIUM', 'HIGH', 'CRITICAL']
+UNCERTAINTY_LEVELS = ['low', 'medium', 'high']
+
+
+def js_round(x):
+    """Math.round: halves round up (towards +inf)."""
+    return np.floor(np.asarray(x, dtype=float) + 0.5)
+
+
+def heat_stress(temperature):
+    """calculateTempStress for an array of ambient temperatures."""
+    temperature = np.asarray(temperature, dtype=float)
+    stress = np.ones_like(temperature)
+    for limit, value in reversed(TEMP_STRESS):
+        stress = np.where(temperature > limit, value, stress)
+    return stress
+
+
+def surplus_kg(surplus):
+    """Surplus of the kg-costed ingredients in kg, from (..., ingredients) surplus in INGREDIENTS order."""
+    surplus = np.asarray(surplus, dtype=float)
+    return sum_columns(surplus[..., [INGREDIENTS.index(ing) for ing in SURPLUS_KG_INGREDIENTS]]) / 1000
+
+
+def uncertainty_adjustments(avg_uncertainty):
+    """calculateUncertaintyAdjustments from the mean item uncertainty."""
+    factor = np.minimum(np.asarray(avg_uncertainty, dtype=float) / 2.0, 1.0)
+    return {
+        'batch_multiplier': js_round((1.0 - factor * 0.15) * 100) / 100,
+        'redistribution_buffer': js_round((1.0 + factor * 0.25) * 100) / 100,
+        'discount_threshold': js_round((0.3 - factor * 0.1) * 100) / 100,
+        'uncertainty_level': np.select([factor > 0.6, factor > 0.3], [2, 1], 0),
+    }
+
+
+def evaluate(total_demand, surplus_risk, surplus_kg, temperature=25, rainfall=0, event_flag=0, **params):
+    """
+    makeDecision for broadcast arrays of inputs and parameters (see
+    DEFAULT_PARAMS for the keyword names). Returns a dict of arrays:
+    action (codes into ACTIONS), net_value of the chosen action, the
+    expected costs, CSVE tiers, redistribution_amount, risk_level (codes
+    into RISK_LEVELS), shelter_need and priority_score.
+    """
+    unknown = set(params) - set(DEFAULT_PARAMS)
+    if unknown:
+        raise ValueError(f"Unknown decision parameter(s): {', '.join(sorted(unknown))}")
+    p = {name: np.asarray(params.get(name, default), dtype=float) for name, default in DEFAULT_PARAMS.items()}
+    total_demand = np.asarray(total_demand, dtype=float)
+    surplus_risk = np.asarray(surplus_risk, dtype=float)
+
+    # calculateShelterNeed (terms added in the same order as the JS)
+    need = p['base_need_score'] + np.where(np.asarray(rainfall) > 2, 0.1, 0.0)
+    need = need + np.where(np.asarray(event_flag) == 1, 0.05, 0.0)
+    need = need + np.where(p['shelter_occupancy'] / p['shelter_capacity'] > 0.8, 0.1, 0.0)
+    need = np.minimum(need, 1.0)
+    priority = surplus_risk * need
+
+    # calculateExpectedCosts
+    waste_cost = js_round(surplus_kg * p['waste_disposal'])
+    discount_cost = js_round(total_demand * p['avg_meal_price'] * p['discount_rate'])
+    redistribute_amount = np.minimum(js_round(total_demand * surplus_risk), p['shelter_capacity'])
+    redistribute_cost = js_round(-(redistribute_amount * p['social_value'] - p['transport_cost']))
+
+    # calculateCSVE
+    surplus_items = js_round(total_demand * surplus_risk)
+    revenue_items = np.floor(surplus_items * p['revenue_conversion_rate'])
+    revenue_value = revenue_items * (p['avg_meal_price'] * (1 - p['discount_pct']))
+    donate_items = np.floor(surplus_items * p['redistribution_rate'])
+    social_value = donate_items * p['social_value']
+    buffer_items = np.maximum(0, surplus_items - revenue_items - donate_items)
+    csve_net = js_round(revenue_value + social_value - np.where(donate_items > 0, p['transport_cost'], 0))
+
+    action = np.select(
+        [(csve_net > -redistribute_cost) & (csve_net > -waste_cost),
+         (redistribute_cost < waste_cost) & (redistribute_cost < discount_cost),
+         discount_cost < waste_cost],
+        [CASCADING, REDISTRIBUTE, DISCOUNT], NORMAL)
+
+    # Food-safety override on chicken spoilage
+    effective_hours = js_round(CHICKEN_SHELF_HOURS / heat_stress(temperature))
+    risk_level = np.select([effective_hours < 12, effective_hours < 24, effective_hours < 48], [3, 2, 1], 0)
+    open_action = (action != REDISTRIBUTE) & (action != CASCADING)
+    action = np.where(open_action & (risk_level == 3), REDISTRIBUTE,
+                      np.where(open_action & (risk_level == 2), CASCADING, action))
+
+    net_value = np.choose(action, [-waste_cost, -discount_cost, -redistribute_cost, csve_net])
+    donated = np.select([action == CASCADING, action == REDISTRIBUTE],
+                        [donate_items, np.where(redistribute_amount > 0, redistribute_amount, 50)], 0)
+    return {
+        'action': action,
+        'net_value': net_value,
+        'expected_costs': {'waste': waste_cost, 'discount': discount_cost, 'redistribute': redistribute_cost},
+        'csve': {'net_value': csve_net, 'total_surplus': surplus_items, 'revenue_items': revenue_items,
+                 'revenue_value': js_round(revenue_value), 'redistribution_items': donate_items,
+                 'redistribution_value': js_round(social_value), 'buffer_items': buffer_items},
+        'redistribution_amount': donated,
+        'risk_level': risk_level,
+        'shelter_need': js_round(need * 100) / 100,
+        'priority_score': js_round(priority * 100) / 100,
+    }
+
+
+def sweep(surplus_risk, predictions, surplus, uncertainty=None, temperature=25, rainfall=0, event_flag=0,
+          grid=None):
+    """
+    Evaluate decisions for inputs (predictions (..., items), surplus
+    (..., ingredients) in INGREDIENTS order, uncertainty (..., items), the
+    rest broadcast against them) over a parameter grid {name: values}.
+    Result arrays have one leading axis per grid parameter, then the input
+    axes; action_share is (grid..., len(ACTIONS)).
+    """
+    grid = {name: np.atleast_1d(np.asarray(values, dtype=float)) for name, values in (grid or {}).items()}
+    total_demand = sum_columns(np.asarray(predictions, dtype=float))
+    kg = surplus_kg(surplus)
+    inputs = np.broadcast_shapes(np.shape(surplus_risk), total_demand.shape, kg.shape, np.shape(temperature),
+                                 np.shape(rainfall), np.shape(event_flag))
+
+    # Grid parameter k varies along axis k; the input axes follow the grid axes
+    params = {}
+    for k, (name, values) in enumerate(grid.items()):
+        shape = [1] * len(grid) + [1] * len(inputs)
+        shape[k] = len(values)
+        params[name] = values.reshape(shape)
+    result = evaluate(total_demand, surplus_risk, kg, temperature, rainfall, event_flag, **params)
+
+    # Every result array gets the full (grid..., inputs...) shape (read-only broadcast views)
+    shape = tuple(len(values) for values in grid.values()) + inputs
+    for key, value in result.items():
+        if isinstance(value, dict):
+            result[key] = {name: np.broadcast_to(arr, shape) for name, arr in value.items()}
+        else:
+            result[key] = np.broadcast_to(value, shape)
+    action = result['action']
+    input_axes = tuple(range(len(grid), action.ndim))
+    result['action_share'] = np.stack([(action == a).mean(axis=input_axes) for a in range(len(ACTIONS))], axis=-1)
+    result['grid'] = grid
+    if uncertainty is not None:
+        uncertainty = np.asarray(uncertainty, dtype=float)
+        result['uncertainty'] = uncertainty_adjustments(sum_columns(uncertainty) / uncertainty.shape[-1])
+    return result
+
+
+def parse_grid_spec(spec):
+    """'name=v1,v2,...' or 'name=start:stop:num' (inclusive linspace) -> (name, values)."""
+    name, sep, values = spec.partition('=')
+    if not sep or name not in DEFAULT_PARAMS:
+        raise argparse.ArgumentTypeError(f"expected NAME=VALUES with NAME one of {', '.join(DEFAULT_PARAMS)}")
+    if ':' in values:
+        start, stop, num = values.split(':')
+        return name, np.linspace(float(start), float(stop), int(num))
+    return name, np.array([float(v) for v in values.split(',')])
+
+
+def inputs_from_decisions(decisions):
+    """Arrays for sweep() from makeDecision-style dicts (surplusRisk, predictions, surplus, ...)."""
+    items = list(decisions[0]['predictions'])
+    weather = [d.get('weather') or {} for d in decisions]
+    return {
+        'surplus_risk': np.array([d['surplusRisk'] for d in decisions], dtype=float),
+        'predictions': np.array([[d['predictions'].get(item, 0) for item in items] for d in decisions], dtype=float),
+        'surplus': np.array([[d['surplus'].get(ing, 0) for ing in INGREDIENTS] for d in decisions], dtype=float),
+        'uncertainty': (np.array([[d['uncertainty'][item] for item in items] for d in decisions], dtype=float)
+                        if all(d.get('uncertainty') for d in decisions) else None),
+        'temperature': np.array([w.get('temperature', 25) for w in weather], dtype=float),
+        'rainfall': np.array([w.get('rainfall', 0) for w in weather], dtype=float),
+        'event_flag': np.array([d.get('eventFlag', 0) for d in decisions]),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Sweep decision-engine parameters over makeDecision inputs (JSON list on stdin).')
+    parser.add_argument('--grid', action='append', type=parse_grid_spec, default=[], metavar='NAME=VALUES',
+                        help="parameter values: 'a,b,c' or 'start:stop:num' (repeatable)")
+    parser.add_argument('--actions', action='store_true', help='also output the full action map per input')
+    args = parser.parse_args()
+
+    decisions = json.load(sys.stdin)
+    if isinstance(decisions, dict):
+        decisions = [decisions]
+    result = sweep(**inputs_from_decisions(decisions), grid=dict(args.grid))
+
+    output = {
+        'grid': {name: values.tolist() for name, values in result['grid'].items()},
+        'inputs': len(decisions),
+        'actions': ACTIONS,
+        'action_share': np.round(result['action_share'], 4).tolist(),
+        'mean_net_value': np.round(result['net_value'].mean(axis=-1), 2).tolist(),
+    }
+    if args.actions:
+        output['action_map'] = np.vectorize(ACTIONS.__getitem__, otypes=[object])(result['action']).tolist()
+    print(json.dumps(output))
+
+
+if __name__ == '__main__':
+    main()
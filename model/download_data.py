@@ -1,6 +1,10 @@
 import kagglehub
 import pandas as pd
 import os
+import filecmp
+import shutil
+
+from raw_store import DATA_PATH, RawStore
 
 def main():
     # Download latest version
@@ -22,25 +26,36 @@ def main():
             csv_file = os.path.join(path, f)
     
     if csv_file:
-        print(f"Reading {csv_file}...")
-        df = pd.read_csv(csv_file)
+        # The loaders read DATA_PATH, so that is the file the raw store tracks
+        if os.path.exists(DATA_PATH) and filecmp.cmp(csv_file, DATA_PATH, shallow=False):
+            print(f"{DATA_PATH} is already up to date")
+        else:
+            os.makedirs(os.path.dirname(os.path.abspath(DATA_PATH)), exist_ok=True)
+            tmp = f'{DATA_PATH}.tmp-{os.getpid()}'
+            shutil.copyfile(csv_file, tmp)
+            os.replace(tmp, DATA_PATH)
+            print(f"Copied {csv_file} to {DATA_PATH}")
+
+        # Stream the CSV into the partitioned raw store instead of reading it whole
+        print(f"Ingesting {DATA_PATH} into the raw store...")
+        raw_store = RawStore()
+        print(raw_store.update(DATA_PATH))
         print("Dataset Head:")
-        print(df.head())
+        print(pd.read_csv(DATA_PATH, nrows=5))
         print("\nDataset Info:")
-        print(df.info())
+        info = raw_store.info()
+        print(f"{info['rows']} rows, {info['stores']} stores, {info['partitions']} store/year partitions, "
+              f"{info['mb']} MB on disk")
+        print("Stored dtypes:", raw_store.manifest['columns'])
         print("\nUnique Items:")
-        if 'item' in df.columns:
-            print(df['item'].unique())
-        elif 'item_id' in df.columns:
-            print(df['item_id'].unique())
-            
+        print(raw_store.manifest['item_ids'])
+
         print("\nDate Range:")
-        if 'date' in df.columns:
-            print(f"Start: {df['date'].min()}, End: {df['date'].max()}")
-            
+        print(f"Start: {info['start']}, End: {info['end']}")
+
         # Save a sample for reference locally
         sample_path = os.path.join(os.getcwd(), 'kaggle_sample.csv')
-        df.head(100).to_csv(sample_path, index=False)
+        pd.read_csv(DATA_PATH, nrows=100).to_csv(sample_path, index=False)
         print(f"Saved sample to {sample_path}")
         
     else:
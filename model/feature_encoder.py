@@ -0,0 +1,177 @@
+"""
+Feature Encoder
+===============
+Builds model input matrices straight into a preallocated float64 NumPy buffer.
+
+Column positions for every name in model_data['features'] are resolved once
+when the encoder is created, so encoding a request is a handful of column
+assignments instead of building a dict per row and aligning it with
+DataFrame.reindex. Features the encoder doesn't produce stay 0, matching
+reindex(fill_value=0). Works for both schemas:
+  - v1: weekday, month, promo
+  - v2: calendar features + per-item lag/rolling/price defaults (44 columns)
+
+For v2, lag/rolling columns can be overridden per row with real recent
+sales from a HistoryStore (see history_store.py).
+"""
+
+import math
+from numbers import Real
+from datetime import datetime
+
+import numpy as np
+
+from history_store import HISTORY_FEATURES
+
+# Historical averages (fallback for lag/rolling features when no history is available)
+# These are per-item mean sales from the training data
+HISTORICAL_MEANS = {
+    'burger': 37.0, 'fries': 32.0, 'wrap': 36.0, 'bucket': 35.0, 'drink': 27.0
+}
+HISTORICAL_STDS = {
+    'burger': 5.0, 'fries': 4.5, 'wrap': 5.0, 'bucket': 4.8, 'drink': 3.5
+}
+# Typical prices from the training data
+DEFAULT_PRICES = {
+    'burger': 21.3, 'fries': 14.2, 'wrap': 18.4, 'bucket': 32.5, 'drink': 8.7
+}
+
+CALENDAR_FEATURES = ['weekday', 'month', 'promo', 'day_of_month', 'year',
+                     'is_weekend', 'is_month_start', 'is_month_end', 'quarter']
+
+
+def _numeric(inputs, name):
+    """
+    A numeric input field (default 0) of every row as a float array. Numeric
+    strings are accepted, as the DataFrame path before the encoder did.
+    """
+    values = [d.get(name, 0) for d in inputs]
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            try:
+                values[i] = value = float(value)
+            except ValueError:
+                raise TypeError(f'{name} must be a number, got {value!r}') from None
+        elif not isinstance(value, Real):
+            raise TypeError(f'{name} must be a number, got {value!r}')
+        if not math.isfinite(value):
+            raise ValueError(f'{name} must be finite, got {value!r}')
+    return np.array(values, dtype=float)
+
+
+class FeatureEncoder:
+    """Encodes prediction inputs into the column layout the model was trained on."""
+
+    def __init__(self, features, items, model_version='v1'):
+        self.features = list(features)
+        self.items = list(items)
+        self.model_version = model_version
+        self.n_features = len(self.features)
+
+        positions = {name: i for i, name in enumerate(self.features)}
+        self._col = {name: positions.get(name, -1) for name in CALENDAR_FEATURES}
+
+        # Row every request starts from: constant per-item defaults (v2 only)
+        self._template = np.zeros(self.n_features)
+        lag_1_cols = [positions.get(f'lag_1_{item}', -1) for item in self.items]
+        self._lag_1_present = np.array([col >= 0 for col in lag_1_cols], dtype=bool)
+        self._lag_1_cols = np.array(lag_1_cols, dtype=np.intp)[self._lag_1_present]
+        if model_version == 'v2':
+            for item in self.items:
+                mean_val = HISTORICAL_MEANS.get(item, 30.0)
+                std_val = HISTORICAL_STDS.get(item, 5.0)
+                defaults = {
+                    f'lag_7_{item}': round(mean_val * 1.0, 1),  # Same weekday last week
+                    f'lag_14_{item}': round(mean_val * 0.98, 1),  # 2 weeks ago
+                    f'price_{item}': DEFAULT_PRICES.get(item, 15.0),
+                    f'rolling_mean_7_{item}': round(mean_val, 1),
+                    f'rolling_std_7_{item}': round(std_val, 2),
+                    f'rolling_mean_30_{item}': round(mean_val * 0.98, 1),
+                }
+                for name, value in defaults.items():
+                    if name in positions:
+                        self._template[positions[name]] = value
+
+        # Columns filled from history: (len(HISTORY_FEATURES), n_items), -1 if absent
+        self._history_cols = np.array([[positions.get(f'{name}_{item}', -1) for item in self.items]
+                                       for name in HISTORY_FEATURES], dtype=np.intp)
+
+        # lag_1 defaults per weekday 0-6, looked up by index at encode time
+        self._lag_1_table = np.array([self._lag_1_row(day) for day in range(7)])
+        self._buffer = np.empty((0, self.n_features))
+
+    def _lag_1_row(self, day_of_week):
+        """lag_1 defaults for one weekday (small weekday variation around the mean)."""
+        noise_factor = 1.0 + (day_of_week - 3) * 0.02
+        row = [round(HISTORICAL_MEANS.get(item, 30.0) * noise_factor, 1) for item in self.items]
+        return np.array(row)[self._lag_1_present]
+
+    def _rows(self, n_rows):
+        """Reusable (n_rows, n_features) view; the buffer only grows."""
+        if self._buffer.shape[0] < n_rows:
+            self._buffer = np.empty((max(n_rows, 2 * self._buffer.shape[0]), self.n_features))
+        return self._buffer[:n_rows]
+
+    def _set(self, X, name, values):
+        col = self._col[name]
+        if col >= 0:
+            X[:, col] = values
+
+    def encode(self, inputs, now=None, dates=None, history=None):
+        """
+        Encode a list of input dicts (day_of_week, event_flag) into a feature matrix.
+        Both must be numbers or numeric strings (TypeError) and finite
+        (ValueError); a day_of_week outside 0-6 is encoded as given.
+        Calendar features come from now (default: current time), or per row
+        from dates when given. history is an optional
+        (n_rows, len(HISTORY_FEATURES), n_items) array from HistoryStore.lookup;
+        its non-NaN values replace the v2 lag/rolling defaults.
+
+        Returns a view into the encoder's buffer: it is overwritten by the
+        next encode() call, so copy it if it has to outlive that.
+        """
+        n_rows = len(inputs)
+        X = self._rows(n_rows)
+        X[:] = self._template
+
+        if dates is None:
+            now = now or datetime.now()
+            month, day, year = now.month, now.day, now.year
+        else:
+            month = np.fromiter((d.month for d in dates), float, n_rows)
+            day = np.fromiter((d.day for d in dates), float, n_rows)
+            year = np.fromiter((d.year for d in dates), float, n_rows)
+
+        day_of_week = _numeric(inputs, 'day_of_week')
+        event_flag = _numeric(inputs, 'event_flag')
+
+        self._set(X, 'weekday', day_of_week)
+        self._set(X, 'month', month)
+        self._set(X, 'promo', event_flag)
+
+        if self.model_version == 'v2':
+            self._set(X, 'day_of_month', day)
+            self._set(X, 'year', year)
+            self._set(X, 'is_weekend', day_of_week >= 5)
+            self._set(X, 'is_month_start', np.asarray(day) <= 3)
+            self._set(X, 'is_month_end', np.asarray(day) >= 28)
+            self._set(X, 'quarter', (np.asarray(month) - 1) // 3 + 1)
+
+            if len(self._lag_1_cols):
+                day_idx = day_of_week.astype(np.intp)
+                if ((day_idx == day_of_week) & (day_idx >= 0) & (day_idx < 7)).all():
+                    X[:, self._lag_1_cols] = self._lag_1_table[day_idx]
+                else:
+                    for i, weekday in enumerate(day_of_week):
+                        X[i, self._lag_1_cols] = self._lag_1_row(float(weekday))
+
+            if history is not None:
+                self._apply_history(X, history)
+
+        return X
+
+    def _apply_history(self, X, history):
+        present = self._history_cols >= 0
+        values = history[:, present]  # (n_rows, n_present_columns)
+        rows, idx = np.nonzero(~np.isnan(values))
+        X[rows, self._history_cols[present][idx]] = values[rows, idx]
@@ -0,0 +1,302 @@
+"""
+Incremental Feature Store
+=========================
+On-disk cache of the engineered v2 training rows (features.engineer_features
+output), so training doesn't re-read the whole CSV and recompute every lag
+and rolling window on each run.
+
+Layout (one columnar NumPy partition per store and date range, each column a
+raw array file whose dtype and length are in the manifest):
+
+    feature_store/
+        manifest.json              format version, column dtypes, items and
+                                   the CSV state (size, mtime, tail checksum)
+        store_1/
+            2019-01-01_2020-12-31/ date.bin, item.bin, sales.bin, lag_1.bin, ...
+            2021-01-01_2021-01-07/
+        store_2/
+            ...
+
+update() compares the CSV with the manifest:
+  - unchanged        nothing is read
+  - appended to      only the bytes after the recorded offset are parsed; each
+                     store's new rows are engineered together with the last
+                     LOOKBACK rows of every item already stored, and written
+                     as a new partition
+  - anything else    (rewritten, truncated, rows older than a store's stored
+                     range) full rebuild, engineered from the menu-item
+                     rows of the partitioned raw store (raw_store.py)
+                     rather than a full parse of the CSV
+The change check is csv_source.py's, shared with the raw store.
+The appended rows get the same features as a full rebuild, since the lag and
+rolling windows never reach back more than LOOKBACK rows.
+
+Usage:
+  python feature_store.py --update [--data ../data/kaggle_data.csv]
+  python feature_store.py --info
+  python feature_store.py --compact      merge each store's partitions into one
+"""
+
+import os
+import json
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from features import ITEM_MAPPING, ITEMS, engineer_features, prepare_sales
+from csv_source import csv_change, csv_state, read_appended
+from raw_store import RAW_STORE_DIR, RawStore
+
+# 2: rolling features from per-window sums (features.py)
+FEATURE_STORE_FORMAT_VERSION = 2
+FEATURE_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'feature_store')
+DATA_PATH = '../data/kaggle_data.csv'
+
+# Rows per (store, item) the lag/rolling features look back over (rolling_mean_30)
+LOOKBACK = 30
+
+# Raw columns the features are computed from (what the lookback tail carries)
+RAW_COLUMNS = ['date', 'store_id', 'item', 'sales', 'price', 'promo', 'weekday', 'month']
+
+def _date_str(value):
+    return str(np.datetime64(value, 'D'))
+
+
+class FeatureStore:
+    """Engineered training rows partitioned by store and date range."""
+
+    def __init__(self, root=FEATURE_STORE_DIR, raw_root=RAW_STORE_DIR):
+        self.root = root
+        self.raw_root = raw_root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format_version') != FEATURE_STORE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self):
+        tmp = f'{self.manifest_path}.tmp-{os.getpid()}'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    @property
+    def stores(self):
+        return list(self.manifest['stores']) if self.manifest else []
+
+    # ---- writing ----
+
+    def _write_partition(self, store_id, arrays):
+        """Write one store's engineered columns as a new date-range partition."""
+        start, end = _date_str(arrays['date'].min()), _date_str(arrays['date'].max())
+        name = f'{start}_{end}'
+        path = os.path.join(self.root, store_id, name)
+        os.makedirs(path, exist_ok=True)
+        for column, values in arrays.items():
+            values.tofile(os.path.join(path, f'{column}.bin'))
+
+        self.manifest['stores'].setdefault(store_id, []).append(
+            {'name': name, 'start': start, 'end': end, 'rows': len(arrays['date'])})
+
+    def _write_rows(self, df):
+        """Split engineered rows by store and write one partition each."""
+        arrays = {}
+        for column, dtype in self.manifest['columns'].items():
+            if column == 'item':
+                codes = pd.Categorical(df['item'], categories=self.manifest['items']).codes
+                arrays[column] = codes.astype(dtype)
+            else:
+                arrays[column] = df[column].to_numpy(dtype=dtype)
+
+        for store_id, rows in sorted(df.groupby('store_id').indices.items()):
+            self._write_partition(store_id, {column: values[rows] for column, values in arrays.items()})
+
+    def rebuild(self, data_path=DATA_PATH):
+        """Engineer every row of the CSV and replace the store's contents."""
+        # Menu-item rows only, from the partitioned raw store (synced with the CSV first)
+        raw_store = RawStore(self.raw_root)
+        raw_store.update(data_path)
+        raw = prepare_sales(raw_store.load(items=list(ITEM_MAPPING)))
+        df = engineer_features(raw)
+
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root)
+        self.manifest = {
+            'format_version': FEATURE_STORE_FORMAT_VERSION,
+            'items': sorted(set(ITEMS) | set(df['item'].unique())),
+            # Item names are stored as int16 codes into 'items'
+            'columns': {c: np.dtype(np.int16).str if c == 'item' else df[c].dtype.str
+                        for c in df.columns if c not in ('store_id', 'item_id')},
+            'stores': {},
+        }
+        self._write_rows(df)
+        self._record_source(data_path)
+        self._write_manifest()
+        return {'mode': 'full', 'new_rows': len(df), 'stores': len(self.manifest['stores'])}
+
+    def _record_source(self, data_path):
+        self.manifest['source'] = csv_state(data_path)
+
+    def update(self, data_path=DATA_PATH):
+        """Bring the store up to date with the CSV; returns what was done."""
+        if self.manifest is None:
+            return self.rebuild(data_path)
+
+        change = csv_change(self.manifest.get('source'), data_path)
+        if change == 'rewritten':
+            return self.rebuild(data_path)
+        new = (prepare_sales(read_appended(data_path, self.manifest['source']['size']))
+               if change == 'appended' else pd.DataFrame(columns=RAW_COLUMNS))
+        if new.empty:
+            self._record_source(data_path)
+            self._write_manifest()
+            return {'mode': 'unchanged', 'new_rows': 0, 'stores': 0}
+
+        # Appends must start after everything already stored for that store
+        ends = {store_id: max(p['end'] for p in parts)
+                for store_id, parts in self.manifest['stores'].items()}
+        first_new = new.groupby('store_id')['date'].min()
+        if any(store_id in ends and _date_str(date) <= ends[store_id]
+               for store_id, date in first_new.items()):
+            return self.rebuild(data_path)
+
+        # Engineer new rows together with each store's lookback tail, keep the new ones
+        stores = sorted(first_new.index)
+        tail = self._tail([s for s in stores if s in ends])
+        combined = pd.concat([tail, new[RAW_COLUMNS]], ignore_index=True)
+        combined['is_new'] = np.r_[np.zeros(len(tail), bool), np.ones(len(new), bool)]
+        df = engineer_features(combined)
+        df = df[df.pop('is_new')]
+
+        self._write_rows(df)
+        self._record_source(data_path)
+        self._write_manifest()
+        return {'mode': 'incremental', 'new_rows': len(df), 'stores': len(stores)}
+
+    # ---- reading ----
+
+    def _read_partition(self, store_id, part, columns, mmap=False):
+        path = os.path.join(self.root, store_id, part['name'])
+        dtypes = self.manifest['columns']
+        if mmap:
+            return {column: np.memmap(os.path.join(path, f'{column}.bin'), dtype=dtypes[column],
+                                      mode='r', shape=(part['rows'],)) for column in columns}
+        return {column: np.fromfile(os.path.join(path, f'{column}.bin'), dtype=dtypes[column])
+                for column in columns}
+
+    def _frame(self, store_ids, partitions, columns):
+        """DataFrame from {store_id: [column dicts]} in store order."""
+        chunks = {column: [] for column in columns}
+        store_col = []
+        for store_id in store_ids:
+            for part in partitions[store_id]:
+                for column in columns:
+                    chunks[column].append(part[column])
+                store_col.append(np.full(len(part['date']), store_id, dtype=object))
+
+        data = {column: np.concatenate(chunks[column]) if chunks[column] else
+                np.empty(0, dtype=self.manifest['columns'][column]) for column in columns}
+        data['store_id'] = np.concatenate(store_col) if store_col else np.empty(0, dtype=object)
+        data['item'] = np.array(self.manifest['items'], dtype=object)[data['item']]
+        df = pd.DataFrame(data)
+        return df[['date', 'store_id'] + [c for c in columns if c != 'date']]
+
+    def _tail(self, store_ids):
+        """Raw columns of the last LOOKBACK rows per item of each store."""
+        columns = [c for c in RAW_COLUMNS if c != 'store_id']
+        partitions = {}
+        for store_id in store_ids:
+            # Newest partitions first, until every item has LOOKBACK rows
+            parts, rows_per_item = [], 0
+            for part in reversed(self.manifest['stores'][store_id]):
+                parts.insert(0, self._read_partition(store_id, part, columns, mmap=True))
+                if len(parts[0]['item']):
+                    rows_per_item += np.unique(parts[0]['item'], return_counts=True)[1].min()
+                if rows_per_item >= LOOKBACK:
+                    break
+
+            # Each item's rows are in date order across and within partitions,
+            # so a stable sort by item keeps them that way
+            item = np.concatenate([p['item'] for p in parts])
+            order = np.argsort(item, kind='stable')
+            sorted_item = item[order]
+            group_end = np.searchsorted(sorted_item, sorted_item, side='right')
+            keep = order[group_end - np.arange(len(order)) <= LOOKBACK]
+            partitions[store_id] = [{column: np.concatenate([p[column] for p in parts])[keep]
+                                     for column in columns}]
+
+        return self._frame(store_ids, partitions, columns)
+
+    def load(self, stores=None):
+        """Engineered rows (engineer_features layout) for stores, or all stores."""
+        if self.manifest is None:
+            raise FileNotFoundError(f'No feature store at {self.root}; run update() first')
+        known = self.manifest['stores']
+        store_ids = [s for s in (known if stores is None else stores) if s in known]
+        columns = list(self.manifest['columns'])
+        partitions = {store_id: [self._read_partition(store_id, part, columns) for part in known[store_id]]
+                      for store_id in store_ids}
+        return self._frame(store_ids, partitions, columns)
+
+    def compact(self):
+        """Merge every store's partitions into one."""
+        columns = list(self.manifest['columns'])
+        for store_id, parts in list(self.manifest['stores'].items()):
+            if len(parts) < 2:
+                continue
+            arrays = [self._read_partition(store_id, p, columns) for p in parts]
+            merged = {column: np.concatenate([a[column] for a in arrays]) for column in columns}
+            old = [os.path.join(self.root, store_id, p['name']) for p in parts]
+            self.manifest['stores'][store_id] = []
+            self._write_partition(store_id, merged)
+            for path in old:
+                if os.path.basename(path) != self.manifest['stores'][store_id][0]['name']:
+                    shutil.rmtree(path, ignore_errors=True)
+        self._write_manifest()
+
+    def info(self):
+        if self.manifest is None:
+            return {'stores': 0}
+        parts = [p for store_parts in self.manifest['stores'].values() for p in store_parts]
+        return {
+            'stores': len(self.manifest['stores']),
+            'partitions': len(parts),
+            'rows': sum(p['rows'] for p in parts),
+            'start': min((p['start'] for p in parts), default=None),
+            'end': max((p['end'] for p in parts), default=None),
+            'source': self.manifest.get('source'),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Incremental on-disk feature store')
+    parser.add_argument('--update', action='store_true', help='sync with the CSV (incremental when appended)')
+    parser.add_argument('--rebuild', action='store_true', help='recompute everything from the CSV')
+    parser.add_argument('--compact', action='store_true', help="merge each store's partitions")
+    parser.add_argument('--info', action='store_true', help='print a summary')
+    parser.add_argument('--data', default=DATA_PATH, help='sales CSV (default: %(default)s)')
+    parser.add_argument('--root', default=FEATURE_STORE_DIR, help='store directory (default: %(default)s)')
+    args = parser.parse_args()
+
+    store = FeatureStore(args.root)
+    if args.rebuild:
+        print(store.rebuild(args.data))
+    elif args.update:
+        print(store.update(args.data))
+    if args.compact:
+        store.compact()
+    if args.info or not (args.update or args.rebuild or args.compact):
+        print(json.dumps(store.info(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
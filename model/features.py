@@ -0,0 +1,164 @@
+"""
+Feature Engineering (v2)
+========================
+Shared by the v2 training scripts and the feature store: turns long Kaggle
+rows (date, store_id, item_id, sales, price, promo, weekday, month) into the
+per-item lag/rolling features and the wide one-row-per-(date, store) layout
+the model trains on.
+
+Lag/rolling features and the wide layout are built with vectorized NumPy
+operations over contiguous (store, item) groups: shifted arrays for lags,
+windowed sums of shifted arrays for rolling windows (two-pass for the
+standard deviation) and a direct scatter into the wide matrix instead of
+pivot_table. Lags and the wide layout are the same as the
+groupby/shift/pivot_table version they replaced. Rolling means and stds
+are not bit-identical to groupby().rolling(): each window is summed on
+its own (within an ulp or two of the exact value), while pandas keeps
+running sums whose error drifts by up to ~1e-12.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Map Kaggle items to our menu
+ITEM_MAPPING = {
+    'item_1': 'burger',
+    'item_2': 'fries',
+    'item_3': 'wrap',
+    'item_4': 'bucket',
+    'item_5': 'drink'
+}
+
+ITEMS = list(ITEM_MAPPING.values())
+
+# Wide layout: one row per PIVOT_INDEX combination, one column per (value, item)
+PIVOT_INDEX = ['date', 'store_id', 'weekday', 'month', 'promo', 'day_of_month',
+               'year', 'is_weekend', 'is_month_start', 'is_month_end', 'quarter']
+PIVOT_VALUES = ['sales', 'price', 'lag_1', 'lag_7', 'lag_14',
+                'rolling_mean_7', 'rolling_std_7', 'rolling_mean_30']
+
+
+def prepare_sales(df, stores=None):
+    """Menu-item rows of a raw Kaggle frame, with item names and parsed dates."""
+    if stores is not None:
+        df = df[df['store_id'].isin(stores)]
+    # A copy, so the new columns never touch (or warn about) the caller's frame
+    df = df[df['item_id'].isin(ITEM_MAPPING.keys())].copy()
+    df['item'] = df['item_id'].map(ITEM_MAPPING)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def _group_positions(df):
+    """Position of every row inside its (store_id, item) run; df must be sorted by them."""
+    store = df['store_id'].to_numpy()
+    item = df['item'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, (store[1:] != store[:-1]) | (item[1:] != item[:-1])])
+    sizes = np.diff(np.r_[starts, len(df)])
+    return np.arange(len(df)) - np.repeat(starts, sizes)
+
+
+def _lag(values, pos, k):
+    """values shifted k rows down within each group (NaN for the first k rows)."""
+    lagged = np.full(len(values), np.nan)
+    lagged[k:] = values[:len(values) - k]
+    lagged[pos < k] = np.nan
+    return lagged
+
+
+def _window_sum(values, pos, window, center=None):
+    """
+    Sum over each row's window (its last min(pos + 1, window) values within
+    the group), oldest value first, of values (or (values - center) ** 2).
+    One shifted add per window position, so the error depends on the window
+    length only, never on how many rows the frame has.
+    """
+    n = len(values)
+    total = np.zeros(n)
+    for k in range(window - 1, -1, -1):
+        shifted = values[:n - k]
+        if center is not None:
+            shifted = (shifted - center[k:]) ** 2
+        total[k:] += np.where(pos[k:] >= k, shifted, 0.0)
+    return total
+
+
+def engineer_features(df):
+    """Create rich feature set from raw data."""
+    print("Engineering features...")
+
+    # Sort for lag computation
+    df = df.sort_values(['store_id', 'item', 'date']).reset_index(drop=True)
+
+    # Basic time features
+    df['day_of_month'] = df['date'].dt.day
+    df['year'] = df['date'].dt.year
+    df['is_weekend'] = (df['weekday'] >= 5).astype(int)
+    df['is_month_start'] = (df['day_of_month'] <= 3).astype(int)
+    df['is_month_end'] = (df['day_of_month'] >= 28).astype(int)
+    df['quarter'] = df['date'].dt.quarter
+
+    # Lag features (per store+item group)
+    pos = _group_positions(df)
+    sales = df['sales'].to_numpy(dtype=float)
+    df['lag_1'] = _lag(sales, pos, 1)
+    df['lag_7'] = _lag(sales, pos, 7)
+    df['lag_14'] = _lag(sales, pos, 14)
+
+    # Rolling features (min_periods=1) from windowed sums; a window never
+    # reaches back past its group's first row
+    count_7 = np.minimum(pos + 1, 7)
+    count_30 = np.minimum(pos + 1, 30)
+    mean_7 = _window_sum(sales, pos, 7) / count_7
+    df['rolling_mean_7'] = mean_7
+    # Two-pass sample variance (ddof=1) around each window's own mean;
+    # NaN for single-value windows, like rolling().std()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var_7 = _window_sum(sales, pos, 7, center=mean_7) / (count_7 - 1)
+    df['rolling_std_7'] = np.sqrt(var_7)
+    df['rolling_mean_30'] = _window_sum(sales, pos, 30) / count_30
+
+    # Fill NaN from lags (first few rows per group)
+    df['lag_1'] = df['lag_1'].fillna(df['rolling_mean_7'])
+    df['lag_7'] = df['lag_7'].fillna(df['rolling_mean_7'])
+    df['lag_14'] = df['lag_14'].fillna(df['rolling_mean_30'])
+    df['rolling_std_7'] = df['rolling_std_7'].fillna(0)
+
+    # Drop any remaining NaN
+    df = df.dropna()
+
+    print(f"  After feature engineering: {len(df)} rows")
+    return df
+
+
+def pivot_features(df):
+    """
+    One row per (date, store_id, ...) with a `{value}_{item}` column per
+    PIVOT_VALUES x item, in the same row/column order as
+    pivot_table(aggfunc='first').reset_index() followed by fillna(0).
+    """
+    # df has no NaN left (engineer_features drops them), so every row has a key
+    row = df.groupby(PIVOT_INDEX, sort=True).ngroup().to_numpy()
+    items = np.sort(df['item'].unique())
+    col = np.searchsorted(items, df['item'].to_numpy())
+    n_rows = int(row.max()) + 1 if len(row) else 0
+    n_items = len(items)
+
+    # First source row of every (row, item) cell and of every row
+    cells, first = np.unique(row * n_items + col, return_index=True)
+    _, row_first = np.unique(row, return_index=True)
+
+    wide = df[PIVOT_INDEX].iloc[row_first].reset_index(drop=True)
+    columns = {}
+    for value in sorted(PIVOT_VALUES):
+        source = df[value].to_numpy()
+        if len(cells) == n_rows * n_items:
+            block = np.empty(n_rows * n_items, dtype=source.dtype)
+        else:
+            block = np.zeros(n_rows * n_items)  # missing cells -> fillna(0)
+        block[cells] = source[first]
+        block = block.reshape(n_rows, n_items)
+        for j, item in enumerate(items):
+            columns[f'{value}_{item}'] = block[:, j]
+
+    return pd.concat([wide, pd.DataFrame(columns)], axis=1)
@@ -1,141 +1,201 @@
 """
 Synthetic Historical Sales Data Generator
-Generates 30 days × 24 hours of realistic restaurant sales data
-for 5 menu items with weather and event correlations.
+Generates hourly restaurant sales data for 5 menu items with weather and
+event correlations: 30 days × 24 hours for one store by default, or years of
+data for hundreds of stores for load testing.
+
+Each day is generated as arrays over (stores × hours × items) from its own
+random stream (derived from the seed and the day number), so the output for
+a given seed doesn't depend on the chunk size. Rows are written to the CSV
+every --chunk-days days, keeping memory flat however long the range is.
+
+Usage:
+  python generate_data.py                                  30 days, 1 store (synthetic_data.csv)
+  python generate_data.py --days 730 --stores 200 --output ../data/load_test.csv
+  python generate_data.py --seed 7 --start 2024-01-01
 """
 
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta
+import argparse
+import time
 import os
 
-np.random.seed(42)
-
 ITEMS = ['burger', 'fries', 'wrap', 'bucket', 'drink']
 NUM_DAYS = 30
 START_DATE = datetime(2025, 1, 1)
+SEED = 42
+CHUNK_DAYS = 30
+
+# Base orders per item per hour, before time/weather/event multipliers
+BASE_DEMAND = np.array([15, 20, 10, 8, 25], dtype=float)
+DRINK = ITEMS.index('drink')
+BUCKET = ITEMS.index('bucket')
+
+EVENT_DAYS = [5, 12, 20, 27]  # Match days, repeating every EVENT_PERIOD days
+EVENT_PERIOD = 30
+STORE_SPREAD = 0.25  # log-normal sigma of per-store demand scale
+
+HOURS = np.arange(24)
+
+# Peak at lunch/dinner
+TIME_FACTOR = 0.1 + 0.9 * (np.exp(-0.5 * ((HOURS - 13) / 2) ** 2)
+                           + np.exp(-0.5 * ((HOURS - 20) / 2.5) ** 2))
+# Diurnal temperature variation
+HOUR_OFFSET = -5 * np.cos(2 * np.pi * (HOURS - 14) / 24)
+
 
-def generate_weather(num_days):
-    """Generate realistic daily weather patterns."""
-    temps = []
-    rainfalls = []
-    for d in range(num_days):
-        # Base temperature with seasonal variation
-        base_temp = 25 + 10 * np.sin(2 * np.pi * d / 365)
-        for h in range(24):
-            # Diurnal temperature variation
-            hour_offset = -5 * np.cos(2 * np.pi * (h - 14) / 24)
-            temp = base_temp + hour_offset + np.random.normal(0, 2)
-            temps.append(round(temp, 1))
-
-            # Rainfall: higher probability on some days
-            rain_prob = 0.3 if d % 7 in [2, 5] else 0.1
-            rain = max(0, np.random.exponential(2)) if np.random.random() < rain_prob else 0.0
-            rainfalls.append(round(rain, 1))
+def store_scales(num_stores, seed):
+    """Per-store demand multiplier; the first store is always 1.0."""
+    rng = np.random.default_rng([seed, 0xC0FFEE])
+    scales = rng.lognormal(0.0, STORE_SPREAD, num_stores)
+    scales[0] = 1.0
+    return scales
+
+
+def generate_weather(rng, d, num_stores):
+    """Hourly temperature and rainfall for every store on day d: (stores, 24) each."""
+    # Base temperature with seasonal variation
+    base_temp = 25 + 10 * np.sin(2 * np.pi * d / 365)
+    temps = np.round(base_temp + HOUR_OFFSET + rng.normal(0, 2, (num_stores, 24)), 1)
+
+    # Rainfall: higher probability on some days
+    rain_prob = 0.3 if d % 7 in [2, 5] else 0.1
+    raining = rng.random((num_stores, 24)) < rain_prob
+    rainfalls = np.round(np.where(raining, rng.exponential(2, (num_stores, 24)), 0.0), 1)
     return temps, rainfalls
 
-def generate_event_flags(num_days):
-    """Generate event flags (weekend evenings, special events)."""
-    flags = []
-    for d in range(num_days):
-        day_of_week = (START_DATE + timedelta(days=d)).weekday()
-        for h in range(24):
-            is_weekend_evening = day_of_week >= 4 and 17 <= h <= 22
-            is_special_event = d in [5, 12, 20, 27] and 18 <= h <= 22  # Match days
-            flag = 1 if (is_weekend_evening or is_special_event) else 0
-            flags.append(flag)
-    return flags
-
-def generate_orders(hour, day_of_week, temperature, rainfall, event_flag):
-    """Generate order counts for each item based on features."""
-
-    # Base orders per item per hour (peak at lunch/dinner)
-    lunch_peak = np.exp(-0.5 * ((hour - 13) / 2) ** 2)
-    dinner_peak = np.exp(-0.5 * ((hour - 20) / 2.5) ** 2)
-    time_factor = 0.1 + 0.9 * (lunch_peak + dinner_peak)
-
-    # Weekend multiplier
+
+def generate_event_flags(d, day_of_week):
+    """Event flags for day d (weekend evenings, special events): (24,)."""
+    is_weekend_evening = (day_of_week >= 4) & (HOURS >= 17) & (HOURS <= 22)
+    is_special_event = (d % EVENT_PERIOD in EVENT_DAYS) & (HOURS >= 18) & (HOURS <= 22)
+    return (is_weekend_evening | is_special_event).astype(np.int64)
+
+
+def generate_orders(rng, day_of_week, temperature, rainfall, event_flag, scales):
+    """Order counts (stores, 24, items) from the day's features."""
     # Weekend multiplier: MASSIVE boost for lunch too
     weekend_mult = 2.5 if day_of_week >= 5 else 1.0
 
     # Rain effect: increases delivery orders (all items)
-    rain_mult = 1.0 + 0.3 * min(rainfall / 5, 1.0)
+    rain_mult = 1.0 + 0.3 * np.minimum(rainfall / 5, 1.0)
 
     # Event effect: MASSIVE spike to force baseline stockout
-    event_mult = 3.0 if event_flag else 1.0
+    event_mult = np.where(event_flag == 1, 3.0, 1.0)
 
-    orders = {}
-    # Base demand per item
-    base = {
-        'burger': 15, 'fries': 20, 'wrap': 10,
-        'bucket': 8, 'drink': 25
-    }
+    demand = (scales[:, None] * TIME_FACTOR * weekend_mult * rain_mult * event_mult)[:, :, None] * BASE_DEMAND
+
+    # Temperature effect on drinks
+    demand[:, :, DRINK] *= 1.0 + 0.02 * np.maximum(0, temperature - 25)
+
+    # Bucket more popular on weekends
+    if day_of_week >= 5:
+        demand[:, :, BUCKET] *= 1.3
+
+    # Add noise
+    noise = rng.poisson(np.maximum(1, demand * 0.15))
+    return np.maximum(0, np.trunc(demand + noise - demand * 0.15)).astype(np.int64)
 
-    for item in ITEMS:
-        base_demand = base[item] * time_factor * weekend_mult * rain_mult * event_mult
 
-        # Temperature effect on drinks
-        if item == 'drink':
-            temp_mult = 1.0 + 0.02 * max(0, temperature - 25)
-            base_demand *= temp_mult
+def generate_day(d, num_stores, seed, scales, start=START_DATE):
+    """All rows for day d as a dict of columns (store-major, then hour)."""
+    rng = np.random.default_rng([seed, d])
+    date = start + timedelta(days=d)
+    day_of_week = date.weekday()
 
-        # Bucket more popular on weekends
-        if item == 'bucket':
-            base_demand *= (1.3 if day_of_week >= 5 else 1.0)
+    temps, rainfalls = generate_weather(rng, d, num_stores)
+    event_flags = generate_event_flags(d, day_of_week)
+    orders = generate_orders(rng, day_of_week, temps, rainfalls, event_flags, scales)
 
-        # Add noise
-        noise = np.random.poisson(max(1, base_demand * 0.15))
-        orders[item] = max(0, int(base_demand + noise - base_demand * 0.15))
+    n = num_stores * 24
+    columns = {
+        'date': np.full(n, date.strftime('%Y-%m-%d'), dtype=object),
+        'store_id': np.repeat(np.array([f'store_{i}' for i in range(1, num_stores + 1)], dtype=object), 24),
+        'hour': np.tile(HOURS, num_stores),
+        'day_of_week': np.full(n, day_of_week),
+        'temperature': temps.ravel(),
+        'rainfall': rainfalls.ravel(),
+        'event_flag': np.tile(event_flags, num_stores),
+    }
+    for i, item in enumerate(ITEMS):
+        columns[f'{item}_orders'] = orders[:, :, i].ravel()
+    return columns
+
+
+def generate(filepath, num_days=NUM_DAYS, num_stores=1, seed=SEED, start=START_DATE,
+             chunk_days=CHUNK_DAYS):
+    """
+    Write num_days × num_stores × 24 rows to filepath in chunks of chunk_days.
+    Single-store output keeps the original schema (no store_id column).
+    Returns per-item (sum, max) totals and the row count.
+    """
+    scales = store_scales(num_stores, seed)
+    totals = np.zeros(len(ITEMS), dtype=np.int64)
+    maxima = np.zeros(len(ITEMS), dtype=np.int64)
+    rows = 0
+
+    tmp = f'{filepath}.tmp-{os.getpid()}'
+    with open(tmp, 'w', newline='') as f:
+        for chunk_start in range(0, num_days, chunk_days):
+            days = [generate_day(d, num_stores, seed, scales, start)
+                    for d in range(chunk_start, min(chunk_start + chunk_days, num_days))]
+            chunk = pd.DataFrame({name: np.concatenate([day[name] for day in days]) for name in days[0]})
+            if num_stores == 1:
+                chunk = chunk.drop(columns='store_id')
+            chunk.to_csv(f, index=False, header=chunk_start == 0, float_format='%.1f')
+
+            orders = chunk[[f'{item}_orders' for item in ITEMS]].to_numpy()
+            totals += orders.sum(axis=0)
+            maxima = np.maximum(maxima, orders.max(axis=0))
+            rows += len(chunk)
+    os.replace(tmp, filepath)
+    return totals, maxima, rows
+
+
+def parse_args():
+    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+    parser = argparse.ArgumentParser(description='Generate synthetic hourly sales data')
+    parser.add_argument('--days', type=int, default=NUM_DAYS, help='number of days (default: %(default)s)')
+    parser.add_argument('--stores', type=int, default=1,
+                        help='number of stores; more than one adds a store_id column (default: %(default)s)')
+    parser.add_argument('--start', default=START_DATE.strftime('%Y-%m-%d'), help='first date (YYYY-MM-DD)')
+    parser.add_argument('--seed', type=int, default=SEED)
+    parser.add_argument('--chunk-days', type=int, default=CHUNK_DAYS,
+                        help='days generated per write (default: %(default)s)')
+    parser.add_argument('--output', default=os.path.join(data_dir, 'synthetic_data.csv'))
+    args = parser.parse_args()
+    for name in ('days', 'stores', 'chunk_days'):
+        if getattr(args, name) < 1:
+            parser.error(f"--{name.replace('_', '-')} must be at least 1")
+    try:
+        datetime.strptime(args.start, '%Y-%m-%d')
+    except ValueError:
+        parser.error(f'--start must be a date in YYYY-MM-DD form, got {args.start!r}')
+    return args
 
-    return orders
 
 def main():
     """Generate and save synthetic dataset."""
-    temps, rainfalls = generate_weather(NUM_DAYS)
-    event_flags = generate_event_flags(NUM_DAYS)
-
-    rows = []
-    for d in range(NUM_DAYS):
-        date = START_DATE + timedelta(days=d)
-        day_of_week = date.weekday()
-
-        for h in range(24):
-            idx = d * 24 + h
-            temperature = temps[idx]
-            rainfall = rainfalls[idx]
-            event_flag = event_flags[idx]
-
-            orders = generate_orders(h, day_of_week, temperature, rainfall, event_flag)
-
-            rows.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'hour': h,
-                'day_of_week': day_of_week,
-                'temperature': temperature,
-                'rainfall': rainfall,
-                'event_flag': event_flag,
-                'burger_orders': orders['burger'],
-                'fries_orders': orders['fries'],
-                'wrap_orders': orders['wrap'],
-                'bucket_orders': orders['bucket'],
-                'drink_orders': orders['drink'],
-            })
-
-    df = pd.DataFrame(rows)
+    args = parse_args()
+    start = datetime.strptime(args.start, '%Y-%m-%d')
 
     # Ensure data directory exists
-    data_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
-    os.makedirs(data_dir, exist_ok=True)
-    filepath = os.path.join(data_dir, 'synthetic_data.csv')
-    df.to_csv(filepath, index=False)
-
-    print(f"✅ Generated {len(df)} rows of synthetic data")
-    print(f"   Date range: {df['date'].min()} to {df['date'].max()}")
-    print(f"   Saved to: {filepath}")
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    began = time.perf_counter()
+    totals, maxima, rows = generate(args.output, args.days, args.stores, args.seed, start,
+                                    args.chunk_days)
+    elapsed = time.perf_counter() - began
+
+    end = start + timedelta(days=args.days - 1)
+    print(f"✅ Generated {rows} rows of synthetic data in {elapsed:.1f}s")
+    print(f"   Date range: {start:%Y-%m-%d} to {end:%Y-%m-%d}, {args.stores} store(s), seed {args.seed}")
+    print(f"   Saved to: {args.output}")
     print(f"\n   Sample stats:")
-    for item in ITEMS:
-        col = f"{item}_orders"
-        print(f"   {item:>8}: mean={df[col].mean():.1f}, max={df[col].max()}, total={df[col].sum()}")
+    for i, item in enumerate(ITEMS):
+        print(f"   {item:>8}: mean={totals[i] / rows:.1f}, max={maxima[i]}, total={totals[i]}")
+
 
 if __name__ == '__main__':
     main()
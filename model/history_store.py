@@ -0,0 +1,321 @@
+"""
+Rolling Sales History
+=====================
+Per-store, per-item state for the v2 lag/rolling features, so predictions
+can use real recent sales instead of the HISTORICAL_MEANS defaults.
+
+Each store keeps a 30-day ring buffer of daily item sales plus running
+sums (7-day sum and sum of squares, 30-day sum), all in NumPy arrays
+indexed [store, slot, item]. Recording a new day is O(items): subtract the
+values that leave each window, add the new one, and refresh the store's
+feature row. Looking features up at predict time is a single fancy index
+into a precomputed (stores, features, items) table, so no rolling window
+is ever recomputed per request.
+
+Features describe the next day after the latest observation:
+  lag_1, lag_7, lag_14     sales 1, 7 and 14 days before that day
+  rolling_mean_7/30        mean of the last 7 / 30 days
+  rolling_std_7            sample std of the last 7 days
+The buffer holds calendar days: days skipped between two observations are
+recorded as zero sales (the training data has a row for every store and
+day, so a day without sales is a day that sold nothing).
+With fewer observations the fallbacks match engineer_features in
+train_model_v2.py (lag_1/lag_7 -> rolling_mean_7, lag_14 -> rolling_mean_30,
+std of a single value -> 0).
+
+Store ids are kept as strings (the .npz file stores them as text), so an
+int id from a JSON request finds the same row as its string form.
+
+The state is saved as one .npz file (history_store.npz next to the model).
+Processes that share the file (predictor workers) wrap each
+load-observe-save cycle in locked(), so no one saves over days another
+process recorded in the meantime.
+
+Usage:
+  python history_store.py --build ../data/kaggle_data.csv   seed from the last 30 days
+  python history_store.py --show store_1                    print a store's features
+"""
+
+import os
+import fcntl
+import argparse
+from contextlib import contextmanager
+
+import numpy as np
+
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history_store.npz')
+
+HISTORY_FEATURES = ['lag_1', 'lag_7', 'lag_14', 'rolling_mean_7', 'rolling_std_7', 'rolling_mean_30']
+WINDOW = 30
+
+@contextmanager
+def locked(path=HISTORY_PATH):
+    """Exclusive lock on <path>.lock for a read-modify-save cycle of the history file."""
+    with open(f'{path}.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+
+class HistoryStore:
+    """Ring buffers of recent daily sales with running window sums."""
+
+    def __init__(self, items, window=WINDOW):
+        self.items = list(items)
+        self.window = window
+        self.store_ids = []
+        self._index = {}
+        self._item_cols = {}
+
+        n_items = len(self.items)
+        self._values = np.zeros((0, window, n_items))
+        self._count = np.zeros(0, dtype=np.int64)      # observations held (<= window)
+        self._head = np.zeros(0, dtype=np.int64)       # slot of the next write
+        self._last_date = np.zeros(0, dtype='datetime64[D]')
+        self._sum_7 = np.zeros((0, n_items))
+        self._sumsq_7 = np.zeros((0, n_items))
+        self._sum_30 = np.zeros((0, n_items))
+        self._features = np.zeros((0, len(HISTORY_FEATURES), n_items))
+
+    def __len__(self):
+        return len(self.store_ids)
+
+    def _store_row(self, store_id):
+        """Row of store_id, appending an empty one for a new store."""
+        store_id = str(store_id)
+        row = self._index.get(store_id)
+        if row is not None:
+            return row
+
+        row = len(self.store_ids)
+        self.store_ids.append(store_id)
+        self._index[store_id] = row
+        for name in ('_values', '_count', '_head', '_last_date',
+                     '_sum_7', '_sumsq_7', '_sum_30', '_features'):
+            arr = getattr(self, name)
+            setattr(self, name, np.concatenate([arr, np.zeros((1,) + arr.shape[1:], dtype=arr.dtype)]))
+        return row
+
+    def _sales_vector(self, sales):
+        """Item sales as an array in self.items order (dict or sequence)."""
+        if isinstance(sales, dict):
+            missing = [item for item in self.items if item not in sales]
+            if missing:
+                raise ValueError(f'Missing sales for items: {missing}')
+            return np.array([sales[item] for item in self.items], dtype=float)
+        values = np.asarray(sales, dtype=float)
+        if values.shape != (len(self.items),):
+            raise ValueError(f'Expected {len(self.items)} item sales, got shape {values.shape}')
+        return values
+
+    def _back(self, row, k):
+        """Sales k observations back from the newest (k=1 is the newest)."""
+        return self._values[row, (self._head[row] - k) % self.window]
+
+    def observe(self, store_id, date, sales):
+        """
+        Record one day of item sales for a store. A repeated date replaces
+        that day's values; dates older than the latest one are rejected, and
+        days skipped since the latest one are recorded as zero sales.
+        """
+        # Validate before _store_row so a rejected day never adds an empty store
+        day = np.datetime64(date, 'D')
+        new = self._sales_vector(sales)
+        row = self._store_row(store_id)
+        count = self._count[row]
+
+        if count and day < self._last_date[row]:
+            raise ValueError(f'{store_id}: {day} is older than the latest observation '
+                             f'({self._last_date[row]})')
+
+        if count and day == self._last_date[row]:
+            # Correction of the newest day: it sits in both windows
+            slot = (self._head[row] - 1) % self.window
+            old = self._values[row, slot].copy()
+            self._sum_7[row] += new - old
+            self._sumsq_7[row] += new * new - old * old
+            self._sum_30[row] += new - old
+            self._values[row, slot] = new
+        else:
+            if count:
+                skipped = int((day - self._last_date[row]).astype(np.int64)) - 1
+                for _ in range(min(skipped, self.window)):
+                    self._push(row, np.zeros(len(self.items)))
+            self._push(row, new)
+            self._last_date[row] = day
+
+        self._refresh(row)
+
+    def _push(self, row, new):
+        """Append one day to the store's ring buffer and window sums."""
+        count = self._count[row]
+        slot = self._head[row]
+        if count >= 7:
+            out_7 = self._back(row, 7)
+            self._sum_7[row] -= out_7
+            self._sumsq_7[row] -= out_7 * out_7
+        if count >= self.window:
+            self._sum_30[row] -= self._values[row, slot]
+        self._sum_7[row] += new
+        self._sumsq_7[row] += new * new
+        self._sum_30[row] += new
+        self._values[row, slot] = new
+        self._head[row] = (slot + 1) % self.window
+        self._count[row] = min(count + 1, self.window)
+
+        if self._head[row] == 0 and self._count[row] == self.window:
+            # Once per buffer lap, resum exactly so float drift can't build up
+            self._resum(row)
+
+    def _resum(self, row):
+        last_7 = np.array([self._back(row, k) for k in range(1, min(self._count[row], 7) + 1)])
+        self._sum_7[row] = last_7.sum(axis=0)
+        self._sumsq_7[row] = (last_7 * last_7).sum(axis=0)
+        self._sum_30[row] = self._values[row].sum(axis=0)
+
+    def _refresh(self, row):
+        """Recompute the store's feature row from the running sums."""
+        count = self._count[row]
+        n_7 = min(count, 7)
+        n_30 = min(count, self.window)
+
+        mean_7 = self._sum_7[row] / n_7
+        mean_30 = self._sum_30[row] / n_30
+        if n_7 > 1:
+            var_7 = (self._sumsq_7[row] - self._sum_7[row] * mean_7) / (n_7 - 1)
+            std_7 = np.sqrt(np.maximum(var_7, 0))
+        else:
+            std_7 = np.zeros(len(self.items))
+
+        feats = self._features[row]
+        feats[0] = self._back(row, 1)
+        feats[1] = self._back(row, 7) if count >= 7 else mean_7
+        feats[2] = self._back(row, 14) if count >= 14 else mean_30
+        feats[3] = mean_7
+        feats[4] = std_7
+        feats[5] = mean_30
+
+    def features(self, store_id):
+        """{feature: {item: value}} for one store, or None if it has no history."""
+        row = self._index.get(str(store_id))
+        if row is None or not self._count[row]:
+            return None
+        return {name: dict(zip(self.items, self._features[row, i].tolist()))
+                for i, name in enumerate(HISTORY_FEATURES)}
+
+    def lookup(self, store_ids, items=None):
+        """
+        Features for many rows: (len(store_ids), len(HISTORY_FEATURES), len(items)),
+        with items in the given order (default self.items). Unknown stores,
+        stores with no observations and unknown items are NaN.
+        """
+        items = self.items if items is None else items
+        key = tuple(items)
+        cols = self._item_cols.get(key)
+        if cols is None:
+            positions = {item: i for i, item in enumerate(self.items)}
+            cols = self._item_cols[key] = np.array([positions.get(item, -1) for item in items])
+
+        out = np.full((len(store_ids), len(HISTORY_FEATURES), len(items)), np.nan)
+        rows = np.array([self._index.get(str(store_id), -1) for store_id in store_ids], dtype=np.intp)
+        known = rows >= 0
+        known[known] = self._count[rows[known]] > 0
+        present = cols >= 0
+        if known.any() and present.any():
+            block = np.full((int(known.sum()), len(HISTORY_FEATURES), len(items)), np.nan)
+            block[:, :, present] = self._features[rows[known]][:, :, cols[present]]
+            out[known] = block
+        return out
+
+    def save(self, path=HISTORY_PATH):
+        """Write the state to an .npz file (via a temporary file and rename)."""
+        tmp = f'{path}.tmp-{os.getpid()}.npz'
+        np.savez(tmp,
+                 items=np.array(self.items), store_ids=np.array(self.store_ids, dtype=str),
+                 window=np.array(self.window), values=self._values, count=self._count,
+                 head=self._head, last_date=self._last_date, sum_7=self._sum_7,
+                 sumsq_7=self._sumsq_7, sum_30=self._sum_30)
+        os.replace(tmp, path)
+        return path
+
+    @classmethod
+    def load(cls, path=HISTORY_PATH):
+        """Load a saved store, or None if the file doesn't exist."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            store = cls(data['items'].tolist(), int(data['window']))
+            store.store_ids = data['store_ids'].tolist()
+            store._index = {store_id: i for i, store_id in enumerate(store.store_ids)}
+            store._values = data['values']
+            store._count = data['count']
+            store._head = data['head']
+            store._last_date = data['last_date']
+            store._sum_7 = data['sum_7']
+            store._sumsq_7 = data['sumsq_7']
+            store._sum_30 = data['sum_30']
+        store._features = np.zeros((len(store.store_ids), len(HISTORY_FEATURES), len(store.items)))
+        for row in range(len(store.store_ids)):
+            if store._count[row]:
+                store._refresh(row)
+        return store
+
+    @classmethod
+    def from_sales(cls, df, items, window=WINDOW):
+        """
+        Seed from a long sales DataFrame (date, store_id, item, sales):
+        the last `window` days of every store are observed in date order.
+        """
+        wide = df.pivot_table(index=['store_id', 'date'], columns='item',
+                              values='sales', aggfunc='sum').reindex(columns=items)
+        store = cls(items, window)
+        for store_id, days in wide.groupby(level='store_id', sort=False):
+            for (_, date), sales in zip(days.index[-window:], days.values[-window:]):
+                store.observe(store_id, date, sales)
+        return store
+
+
+def build(data_path, stores=None, path=HISTORY_PATH):
+    """Seed the history store from a Kaggle-format sales CSV."""
+    import pandas as pd
+    from features import ITEM_MAPPING
+
+    df = pd.read_csv(data_path, usecols=['date', 'store_id', 'item_id', 'sales'])
+    df = df[df['item_id'].isin(ITEM_MAPPING.keys())]
+    if stores:
+        df = df[df['store_id'].isin(stores)]
+    df['item'] = df['item_id'].map(ITEM_MAPPING)
+    df['date'] = pd.to_datetime(df['date'])
+
+    store = HistoryStore.from_sales(df, list(ITEM_MAPPING.values()))
+    store.save(path)
+    print(f'History for {len(store)} stores saved to {path}')
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Rolling sales history for lag/rolling features')
+    parser.add_argument('--build', metavar='CSV', help='seed from a Kaggle-format sales CSV')
+    parser.add_argument('--stores', nargs='*', help='only these store ids (with --build)')
+    parser.add_argument('--show', metavar='STORE_ID', help="print a store's current features")
+    parser.add_argument('--path', default=HISTORY_PATH, help='history file (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.build:
+        build(args.build, args.stores, args.path)
+    if args.show:
+        store = HistoryStore.load(args.path)
+        features = store.features(args.show) if store is not None else None
+        if features is None:
+            print(f'No history for {args.show}')
+            return
+        row = store._index[args.show]
+        print(f'{args.show}: {store._count[row]} days up to {store._last_date[row]}')
+        print(f'{"Feature":<18}' + ''.join(f'{item:>9}' for item in store.items))
+        for name, values in features.items():
+            print(f'{name:<18}' + ''.join(f'{values[item]:>9.2f}' for item in store.items))
+    if not (args.build or args.show):
+        parser.print_help()
+
+
+if __name__ == '__main__':
+    main()
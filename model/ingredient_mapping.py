@@ -0,0 +1,117 @@
+"""
+Ingredient Mapping & Surplus Calculation
+========================================
+NumPy version of backend/services/ingredientMapping.js for many predictions
+at once: N rows of item predictions (stores, days, Monte Carlo paths...)
+become N rows of ingredient usage, surplus and surplus risk.
+
+INGREDIENT_MAP is held as an (items x ingredients) recipe matrix and
+DEFAULT_INVENTORY / EXPIRY_WEIGHTS as vectors in INGREDIENTS order, so
+
+    usage   = predictions @ recipe                       (N, ingredients)
+    surplus = max(0, inventory - usage)                  (N, ingredients)
+    risk    = mean(surplus / inventory * expiry)         (N,)
+
+with inventory either one vector for every row or one row per prediction.
+
+Results match the JavaScript functions exactly, not just to rounding: JS
+adds the terms one at a time in key order, while a BLAS matmul may reorder
+them or fuse multiply-adds, which changes the last bit. So by default the
+sums are accumulated item by item (and ingredient by ingredient for the
+risk), each step a broadcast over all N rows. ingredient_usage(...,
+exact=False) is the single matmul, for callers that don't need
+bit-for-bit agreement.
+
+    from ingredient_mapping import bulk_surplus
+    result = bulk_surplus(predictions, items)   # predictions: (N, len(items))
+    result['usage'], result['surplus'], result['risk']
+"""
+
+import numpy as np
+
+INGREDIENT_MAP = {
+    'burger': {'bun': 1, 'patty': 1, 'lettuce': 20, 'tomato': 15},
+    'fries': {'potato': 150},
+    'wrap': {'tortilla': 1, 'chicken': 80, 'lettuce': 30, 'sauce': 20},
+    'bucket': {'chicken': 600},
+    'drink': {'syrup': 50, 'water': 300, 'ice': 100}
+}
+
+# Default inventory (in grams or units)
+DEFAULT_INVENTORY = {
+    'bun': 500, 'patty': 500, 'lettuce': 10000, 'tomato': 5000,
+    'potato': 50000, 'tortilla': 300, 'chicken': 30000,
+    'sauce': 5000, 'syrup': 10000, 'water': 100000, 'ice': 20000
+}
+
+# Expiry urgency (hours remaining, 0-1 scale)
+EXPIRY_WEIGHTS = {
+    'bun': 0.8, 'patty': 0.9, 'lettuce': 0.7, 'tomato': 0.6,
+    'potato': 0.5, 'tortilla': 0.7, 'chicken': 0.9,
+    'sauce': 0.3, 'syrup': 0.2, 'water': 0.1, 'ice': 0.1
+}
+
+INGREDIENTS = list(DEFAULT_INVENTORY)
+
+
+def sum_columns(values, weights=None):
+    """Sum over the last axis in column order, like a JS reduce (same float result)."""
+    total = np.zeros(values.shape[:-1])
+    for j in range(values.shape[-1]):
+        total = total + (values[..., j] if weights is None else values[..., j] * weights[j])
+    return total
+
+
+def recipe_matrix(items, ingredients=INGREDIENTS):
+    """INGREDIENT_MAP as an (items, ingredients) matrix; unknown items are all zero."""
+    return np.array([[INGREDIENT_MAP.get(item, {}).get(ing, 0) for ing in ingredients]
+                     for item in items], dtype=float)
+
+
+def inventory_vector(inventory=None, ingredients=INGREDIENTS):
+    """An inventory dict (DEFAULT_INVENTORY if None) as a vector in ingredient order."""
+    inventory = DEFAULT_INVENTORY if inventory is None else inventory
+    return np.array([inventory.get(ing, 0) for ing in ingredients], dtype=float)
+
+
+def expiry_vector(ingredients=INGREDIENTS):
+    """EXPIRY_WEIGHTS in ingredient order; missing (or zero) weights count as 0.5."""
+    return np.array([EXPIRY_WEIGHTS.get(ing) or 0.5 for ing in ingredients])
+
+
+def ingredient_usage(predictions, items, exact=True, recipe=None):
+    """
+    computeIngredientUsage for (N, items) predictions -> (N, ingredients).
+    exact=False uses one matmul (may differ from JS in the last bit).
+    """
+    predictions = np.asarray(predictions, dtype=float)
+    recipe = recipe_matrix(items) if recipe is None else recipe
+    if not exact:
+        return predictions @ recipe
+
+    usage = np.zeros(predictions.shape[:-1] + (recipe.shape[1],))
+    for i in range(recipe.shape[0]):
+        cols = np.flatnonzero(recipe[i])  # JS only adds the item's own ingredients
+        usage[..., cols] += predictions[..., i, None] * recipe[i, cols]
+    return usage
+
+
+def compute_surplus(usage, inventory=None):
+    """computeSurplus: max(0, inventory - usage); inventory (ingredients,) or (N, ingredients)."""
+    inventory = inventory_vector() if inventory is None else np.asarray(inventory, dtype=float)
+    return np.maximum(0, inventory - usage)
+
+
+def surplus_risk(surplus, inventory=None):
+    """computeSurplusRisk: mean expiry-weighted surplus ratio per row -> (N,)."""
+    inventory = inventory_vector() if inventory is None else np.asarray(inventory, dtype=float)
+    ratio = surplus / np.where(inventory != 0, inventory, 1)  # inventory[ing] || 1
+    return sum_columns(ratio, expiry_vector()) / len(INGREDIENTS)
+
+
+def bulk_surplus(predictions, items, inventory=None, exact=True):
+    """Usage, surplus and surplus risk for (N, items) predictions in one pass."""
+    inventory = inventory_vector() if inventory is None else np.asarray(inventory, dtype=float)
+    usage = ingredient_usage(predictions, items, exact)
+    surplus = compute_surplus(usage, inventory)
+    return {'usage': usage, 'surplus': surplus, 'risk': surplus_risk(surplus, inventory)}
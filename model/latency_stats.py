@@ -0,0 +1,121 @@
+"""
+Prediction Latency Instrumentation
+==================================
+Per-stage timings for predict.py requests.
+
+StageTimer collects the high-resolution (perf_counter_ns) duration of each
+named stage of one request; NULL_TIMER is the no-op stand-in used when
+instrumentation is off, so untimed requests pay one attribute lookup and a
+nullcontext per stage.
+
+LatencyStats accumulates stage timings across requests in --serve mode:
+count / total / max per stage plus a fixed log-spaced histogram, from which
+p50/p95/p99 are estimated as the upper edge of the bucket holding that
+quantile (the observed max for the overflow bucket).
+"""
+
+import time
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+
+# Histogram bucket upper edges in ms; the last bucket is everything above
+BUCKETS_MS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class StageTimer:
+    """Stage durations of one request (repeated stages add up)."""
+
+    enabled = True
+
+    def __init__(self):
+        self._ns = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter_ns() - start)
+
+    def add(self, name, ns):
+        self._ns[name] = self._ns.get(name, 0) + ns
+
+    def ms(self):
+        """{stage: milliseconds} in the order stages first ran."""
+        return {name: ns / 1e6 for name, ns in self._ns.items()}
+
+    def report(self):
+        """{stage_ms: rounded milliseconds} for the response's timings field."""
+        return {f'{name}_ms': round(ns / 1e6, 3) for name, ns in self._ns.items()}
+
+
+class _NullTimer:
+    """Timer that records nothing."""
+
+    enabled = False
+    _context = nullcontext()
+
+    def stage(self, name):
+        return self._context
+
+    def add(self, name, ns):
+        pass
+
+
+NULL_TIMER = _NullTimer()
+
+
+class LatencyStats:
+    """Cumulative per-stage counters and latency histograms."""
+
+    def __init__(self, buckets=BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.errors = 0
+        self.rows = 0
+        self._stages = {}
+
+    def record(self, stages_ms, rows=1, error=False):
+        """Add one request's {stage: ms} timings."""
+        self.requests += 1
+        self.rows += rows
+        if error:
+            self.errors += 1
+        for name, ms in stages_ms.items():
+            stage = self._stages.get(name)
+            if stage is None:
+                stage = self._stages[name] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                              'hist': [0] * (len(self.buckets) + 1)}
+            stage['count'] += 1
+            stage['total'] += ms
+            stage['max'] = max(stage['max'], ms)
+            stage['hist'][bisect_left(self.buckets, ms)] += 1
+
+    def _quantile(self, stage, q):
+        target = q * stage['count']
+        seen = 0
+        for i, n in enumerate(stage['hist']):
+            seen += n
+            if seen >= target and n:
+                return min(self.buckets[i], stage['max']) if i < len(self.buckets) else stage['max']
+        return stage['max']
+
+    def stats(self):
+        labels = [f'<={edge}' for edge in self.buckets] + [f'>{self.buckets[-1]}']
+        stages = {}
+        for name, stage in self._stages.items():
+            summary = {
+                'count': stage['count'],
+                'mean_ms': round(stage['total'] / stage['count'], 3),
+                'max_ms': round(stage['max'], 3),
+            }
+            for q in QUANTILES:
+                summary[f'p{round(q * 100)}_ms'] = round(self._quantile(stage, q), 3)
+            summary['histogram_ms'] = {label: n for label, n in zip(labels, stage['hist']) if n}
+            stages[name] = summary
+        return {'requests': self.requests, 'errors': self.errors, 'rows': self.rows, 'stages': stages}
@@ -0,0 +1,147 @@
+"""
+Flat Model Artifact
+===================
+Memory-mappable, versioned copy of a trained model, written next to the
+pickle as a directory:
+
+    demand_model_kaggle.artifact -> demand_model_kaggle.artifact.v-<id>/
+        meta.json        format version, model metadata (features, items,
+                         uncertainty, daily_to_hourly_factors, model_version,
+                         accuracy), engine header, array dtypes/shapes and
+                         the size/mtime of the pickle it was built from
+        feature.npy      compiled tree arrays (see tree_engine.py),
+        threshold.npy    one file each
+        ...
+
+Arrays are opened with np.load(mmap_mode='r'), so loading is a few small
+file reads and the tree tables live in the OS page cache, shared by every
+process that maps them instead of being unpickled into each heap. Loading
+needs NumPy only: no joblib, sklearn, scipy or pandas imports.
+
+Each save writes a new versioned directory and swaps the .artifact symlink
+to it with one os.replace, so a reader always finds a complete artifact.
+Readers resolve the link once and read every file from that version; the
+previous version is kept for readers still loading it and removed on the
+save after.
+
+The training scripts write the artifact alongside the pickle. predict.py
+also rebuilds it from the pickle when it is missing or stale (the pickle's
+size or mtime no longer match meta.json).
+"""
+
+import os
+import json
+import uuid
+import shutil
+
+import numpy as np
+
+from tree_engine import TreeEnsemble, ENGINE_FORMAT_VERSION
+
+ARTIFACT_FORMAT_VERSION = 1
+
+
+def artifact_path(model_path):
+    return os.path.splitext(model_path)[0] + '.artifact'
+
+
+def _source_signature(model_path):
+    stat = os.stat(model_path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def model_metadata(model_data):
+    """JSON-serializable metadata from a loaded model_data dict."""
+    meta = {
+        'features': list(model_data['features']),
+        'items': list(model_data['items']),
+        'uncertainty': {item: float(v) for item, v in model_data['uncertainty'].items()},
+        'daily_to_hourly_factors': {str(h): float(f) for h, f in model_data['daily_to_hourly_factors'].items()},
+        'model_version': model_data.get('model_version', 'v1'),
+    }
+    if 'accuracy' in model_data:
+        meta['accuracy'] = model_data['accuracy']
+    return meta
+
+
+def _restore_metadata(meta):
+    meta['daily_to_hourly_factors'] = {int(h): f for h, f in meta['daily_to_hourly_factors'].items()}
+    return meta
+
+
+def save_artifact(model_data, path, engine=None, source=None):
+    """
+    Write model_data (and its compiled engine) as an artifact directory.
+    source is the pickle the artifact mirrors; its size/mtime are recorded
+    so readers can detect a stale artifact. The directory is written as a
+    new version and the path's symlink is switched to it atomically.
+    """
+    if engine is None:
+        engine = TreeEnsemble.from_model(model_data['model'])
+
+    tables = {name: arr for name, arr in engine.arrays.items() if np.ndim(arr) > 0}
+    header = {name: np.asarray(arr).item() for name, arr in engine.arrays.items() if np.ndim(arr) == 0}
+    meta = {
+        'format_version': ARTIFACT_FORMAT_VERSION,
+        'source': _source_signature(source) if source else None,
+        'metadata': model_metadata(model_data),
+        'engine': header,
+        'arrays': {name: {'dtype': arr.dtype.str, 'shape': list(arr.shape)} for name, arr in tables.items()},
+    }
+
+    version = f'{path}.v-{uuid.uuid4().hex[:12]}'
+    os.makedirs(version)
+    for name, arr in tables.items():
+        np.save(os.path.join(version, f'{name}.npy'), np.ascontiguousarray(arr))
+    with open(os.path.join(version, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        # Artifact from before versioning: readers fall back to the pickle until the link is in place
+        shutil.rmtree(path)
+    link = f'{path}.tmp-{os.getpid()}'
+    if os.path.lexists(link):
+        os.remove(link)
+    os.symlink(os.path.basename(version), link)
+    os.replace(link, path)
+    _remove_old_versions(path, keep=(version, previous))
+    return path
+
+
+def _remove_old_versions(path, keep):
+    """Delete version directories of path other than those in keep."""
+    directory, prefix = os.path.split(path)
+    keep = {os.path.realpath(p) for p in keep if p}
+    for entry in os.listdir(directory or '.'):
+        candidate = os.path.join(directory, entry)
+        if entry.startswith(f'{prefix}.v-') and os.path.realpath(candidate) not in keep:
+            shutil.rmtree(candidate, ignore_errors=True)
+
+
+def load_artifact(path, source=None, mmap=True):
+    """
+    (metadata dict, TreeEnsemble) from an artifact directory, or None if it
+    is missing, in another format version, or stale relative to source.
+    """
+    path = os.path.realpath(path)  # one version for every file, even if a save swaps the link
+    try:
+        with open(os.path.join(path, 'meta.json')) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    if (meta.get('format_version') != ARTIFACT_FORMAT_VERSION
+            or meta['engine'].get('format_version') != ENGINE_FORMAT_VERSION):
+        return None
+    if source and os.path.exists(source) and meta['source'] != _source_signature(source):
+        return None
+
+    mmap_mode = 'r' if mmap else None
+    try:
+        arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode=mmap_mode)
+                  for name in meta['arrays']}
+    except (OSError, ValueError):
+        return None
+    arrays.update(meta['engine'])
+    return _restore_metadata(meta['metadata']), TreeEnsemble(arrays)
@@ -0,0 +1,472 @@
+"""
+Model Registry
+==============
+Several trained models resident in one prediction process, selected per
+request by name or by model_version, and reloaded from disk without a
+restart.
+
+Each registered name points at a pickle path (its flat artifact next to it
+is preferred, see model_artifact.py). A load builds a complete ServedModel -
+metadata, compiled tree engine, FeatureEncoder - off to the side; swapping
+it in is one reference assignment of the registry's name -> model dict, so
+a request that already picked a model finishes on it while later requests
+get the new one.
+
+watch() polls the files in a background thread. A change of size/mtime is
+acted on once it has been stable for one poll (so a half-written pickle is
+not loaded); the new file's SHA-1 decides whether it is really a different
+model or just a touched file. Digests are computed by the watcher, never on
+the request path, so startup doesn't pay for hashing the pickle. A failed
+load keeps the current model and is recorded as an error; the watcher
+doesn't retry it until the file's size/mtime changes again.
+
+stats() reports every resident model with its request count, plus
+registry-wide loads, swaps, errors, requests per model_version and the
+recent load/swap events.
+
+Per-store models
+----------------
+StoreModels serves one model per store (or per cluster of stores) from a
+directory of pickles: <dir>/<store_id>.pkl, or the file named by
+<dir>/routes.json ({"store_7": "cluster_north"} -> cluster_north.pkl).
+They are loaded on first use and kept in an LRU bounded by their estimated
+memory (tree arrays plus the unpickled estimator, if one is held); loading
+past the budget evicts the least recently used ones. A store without a
+model of its own, or whose model fails to load, is served by the pooled
+model. Like the registry's watch poll, routes.json and each store's model
+file are stat'ed at most once per check interval, so a request for a
+resident (or absent) model normally touches no files; a model whose file
+changed since it was loaded is reloaded on the first request after the
+next check. A model that failed to load is not retried until its file's
+size/mtime changes. The directory listing is refreshed on the same interval;
+store ids with no model file in it go straight to the pooled model, so the
+per-model bookkeeping only ever holds names that exist on disk.
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from collections import OrderedDict, deque
+
+from feature_encoder import FeatureEncoder
+from tree_engine import TreeEnsemble
+from model_artifact import artifact_path, load_artifact, save_artifact
+
+EVENT_LOG_SIZE = 50
+
+
+def load_pickle(path):
+    """Unpickle the full model_data dict (imports joblib and sklearn on first use)."""
+    import joblib
+    return joblib.load(path)
+
+
+def watched_file(path):
+    """The file whose changes mean a new model: the pickle, else the artifact's meta.json."""
+    if os.path.exists(path):
+        return path
+    return os.path.join(artifact_path(path), 'meta.json')
+
+
+def fingerprint(path):
+    """(size, mtime_ns) of the watched file, or None if it doesn't exist."""
+    try:
+        stat = os.stat(watched_file(path))
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+def file_digest(path):
+    sha1 = hashlib.sha1()
+    with open(watched_file(path), 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+class ServedModel:
+    """One loaded model: metadata, compiled engine, encoder and request counter."""
+
+    def __init__(self, name, path, model_data, engine, model, source, load_ms, file_fingerprint):
+        self.name = name
+        self.path = path
+        self.model_data = model_data
+        self.engine = engine
+        self.model = model
+        self.source = source
+        self.load_ms = load_ms
+        self.fingerprint = file_fingerprint
+        self.digest = None  # SHA-1 of the watched file, filled in by the watcher
+        self.loaded_at = time.time()
+        self.requests = 0
+
+        self.features = model_data['features']
+        self.items = model_data['items']
+        self.uncertainty = model_data['uncertainty']
+        self.hourly_factors = model_data['daily_to_hourly_factors']
+        self.version = model_data.get('model_version', 'v1')
+        self.encoder = FeatureEncoder(self.features, self.items, self.version)
+        # Prediction cache namespace: a reloaded model never sees the old one's entries
+        self.cache_id = f'{name}:{self.fingerprint}'
+
+    @classmethod
+    def load(cls, name, path):
+        """
+        Load metadata and the compiled tree engine. A fresh flat artifact is
+        memory-mapped with NumPy only; otherwise the pickle is loaded and the
+        artifact rebuilt next to it.
+        """
+        start = time.perf_counter()
+        file_fingerprint = fingerprint(path)  # before reading, so a concurrent write shows as a change
+        loaded = load_artifact(artifact_path(path), source=path)
+        if loaded is not None:
+            model_data, engine = loaded
+            model = None
+            source = 'artifact'
+        else:
+            model_data = load_pickle(path)
+            model = model_data['model']
+            try:
+                engine = TreeEnsemble.from_model(model)
+            except TypeError:
+                engine = None  # Unsupported model type: model.predict only
+            if engine is not None:
+                try:
+                    save_artifact(model_data, artifact_path(path), engine, source=path)
+                except OSError:
+                    pass  # Read-only deployment: keep serving from the pickle
+            source = 'pickle'
+        return cls(name, path, model_data, engine, model, source,
+                   round((time.perf_counter() - start) * 1000, 1), file_fingerprint)
+
+    def memory_bytes(self):
+        """Estimated footprint: compiled tree arrays, plus the pickle's size if the estimator is loaded."""
+        size = 0
+        if self.engine is not None:
+            size += sum(arr.nbytes for arr in self.engine.arrays.values() if hasattr(arr, 'nbytes'))
+        if self.model is not None:
+            try:
+                size += os.path.getsize(self.path)
+            except OSError:
+                pass
+        return size
+
+    def sklearn_model(self):
+        """
+        The sklearn estimator, unpickled on first use when loaded from the
+        artifact. None if only the artifact is deployed, or if the pickle
+        on disk is no longer the one this model was loaded from.
+        """
+        if self.model is None and os.path.exists(self.path) and fingerprint(self.path) == self.fingerprint:
+            self.model = load_pickle(self.path)['model']
+        return self.model
+
+    def info(self):
+        return {
+            'path': self.path,
+            'model_version': self.version,
+            'source': self.source,
+            'digest': self.digest[:12] if self.digest else None,
+            'loaded_at': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self.loaded_at)),
+            'load_ms': self.load_ms,
+            'requests': self.requests,
+        }
+
+
+class ModelRegistry:
+    """Named ServedModels with background reload and atomic swap."""
+
+    def __init__(self, default='default'):
+        self.default = default
+        self._models = {}          # name -> ServedModel; replaced whole on every swap
+        self._paths = {}
+        self._pending = {}         # name -> fingerprint seen changed on the last poll
+        self._failed = {}          # name -> fingerprint whose reload failed
+        self._lock = threading.Lock()
+        self._watcher = None
+        self.loads = 0
+        self.swaps = 0
+        self.errors = 0
+        self.version_requests = {}
+        self.events = deque(maxlen=EVENT_LOG_SIZE)
+
+    def __contains__(self, name):
+        return name in self._models
+
+    def names(self):
+        return list(self._models)
+
+    def get(self, name=None):
+        """The model registered as name (default model if None), without counting a request."""
+        return self._models[self.default if name is None else name]
+
+    def _event(self, kind, name, **details):
+        self.events.append(dict(time=time.strftime('%Y-%m-%dT%H:%M:%S'), event=kind, name=name, **details))
+
+    def register(self, name, path):
+        """Load path under name (replacing any model of that name) and return it."""
+        path = os.path.abspath(path)
+        with self._lock:
+            served = ServedModel.load(name, path)
+            self._paths[name] = path
+            self._failed.pop(name, None)
+            self._install(served)
+            self.loads += 1
+            self._event('load', name, load_ms=served.load_ms)
+        return served
+
+    def _install(self, served):
+        models = dict(self._models)
+        models[served.name] = served
+        self._models = models
+
+    def select(self, name=None, version=None):
+        """
+        The model for a request: by name, else the first registered model with
+        model_version == version, else the default. Counts the request.
+        """
+        models = self._models
+        if name is not None:
+            served = models.get(name)
+            if served is None:
+                raise ValueError(f"Unknown model '{name}' (loaded: {', '.join(models)})")
+        elif version is not None:
+            served = next((m for m in models.values() if m.version == version), None)
+            if served is None:
+                raise ValueError(f"No model with model_version '{version}' loaded")
+        else:
+            served = models[self.default]
+        served.requests += 1
+        self.version_requests[served.version] = self.version_requests.get(served.version, 0) + 1
+        return served
+
+    def reload(self, name, force=False):
+        """
+        Load name's file again and swap it in if its content changed (or
+        force). Returns True if a new model was swapped in.
+        """
+        with self._lock:
+            current = self._models[name]
+            path = self._paths[name]
+            file_fingerprint = fingerprint(path)
+            try:
+                digest = file_digest(path)
+                if not force and digest == current.digest:
+                    current.fingerprint = fingerprint(path)  # touched, same content
+                    return False
+                served = ServedModel.load(name, path)
+                served.digest = digest
+            except Exception as e:
+                self._failed[name] = file_fingerprint
+                self.errors += 1
+                self._event('error', name, error=str(e))
+                return False
+            self._failed.pop(name, None)
+            self.loads += 1
+            self._install(served)
+            self.swaps += 1
+            self._event('swap', name, digest=digest[:12], load_ms=served.load_ms,
+                        previous=current.digest[:12] if current.digest else None)
+            return True
+
+    def check(self):
+        """
+        Poll every model's file once; reload those whose size/mtime changed
+        and stayed the same since the previous poll. Returns swapped names.
+        """
+        swapped = []
+        for name, served in list(self._models.items()):
+            current = fingerprint(self._paths[name])
+            if current is None or current == served.fingerprint or current == self._failed.get(name):
+                self._pending.pop(name, None)
+                continue
+            if self._pending.get(name) != current:
+                self._pending[name] = current  # wait one poll for the write to finish
+                continue
+            del self._pending[name]
+            if self.reload(name):
+                swapped.append(name)
+        return swapped
+
+    def watch(self, interval=2.0):
+        """Start a daemon thread calling check() every interval seconds."""
+        if self._watcher is not None or interval <= 0:
+            return
+
+        def loop():
+            for served in list(self._models.values()):
+                if served.digest is None and served.fingerprint == fingerprint(served.path):
+                    try:
+                        served.digest = file_digest(served.path)
+                    except OSError:
+                        pass
+            while True:
+                time.sleep(interval)
+                self.check()
+
+        self._watcher = threading.Thread(target=loop, name='model-registry-watch', daemon=True)
+        self._watcher.start()
+
+    def stats(self):
+        return {
+            'default': self.default,
+            'models': {name: served.info() for name, served in self._models.items()},
+            'requests_by_version': dict(self.version_requests),
+            'loads': self.loads,
+            'swaps': self.swaps,
+            'errors': self.errors,
+            'watching': self._watcher is not None,
+            'events': list(self.events),
+        }
+
+
+class StoreModels:
+    """Per-store models loaded on demand into an LRU bounded by estimated memory."""
+
+    def __init__(self, directory, budget_mb=256, check_interval=2.0):
+        self.directory = os.path.abspath(directory)
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.check_interval = check_interval  # seconds between stats of a file (<= 0: every request)
+        self._resident = OrderedDict()  # model name -> ServedModel, least recently used first
+        self._routes_fingerprint = None
+        self._routes_checked = None
+        self._names = set()     # model names with a pickle or artifact in the directory
+        self._checked = {}      # model name -> monotonic time its file was last stat'ed
+        self._unavailable = {}  # model name -> fingerprint that is missing (None) or failed to load
+        self.routes = {}
+        self.requests = 0
+        self.hits = 0
+        self.loads = 0
+        self.fallbacks = 0
+        self.evictions = 0
+        self.errors = 0
+        self.load_ms_total = 0.0
+        self.load_ms_max = 0.0
+
+    def _due(self, checked, now):
+        return checked is None or self.check_interval <= 0 or now - checked >= self.check_interval
+
+    def _refresh_routes(self, now):
+        if not self._due(self._routes_checked, now):
+            return
+        self._routes_checked = now
+        self._refresh_names()
+        path = os.path.join(self.directory, 'routes.json')
+        try:
+            stat = os.stat(path)
+        except OSError:
+            self.routes, self._routes_fingerprint = {}, None
+            return
+        if (stat.st_size, stat.st_mtime_ns) != self._routes_fingerprint:
+            with open(path) as f:
+                self.routes = json.load(f)
+            self._routes_fingerprint = (stat.st_size, stat.st_mtime_ns)
+
+    def _refresh_names(self):
+        """Re-list the directory's models and forget state kept for names that are gone."""
+        try:
+            entries = os.listdir(self.directory)
+        except OSError:
+            entries = []
+        self._names = {os.path.splitext(entry)[0] for entry in entries
+                       if entry.endswith(('.pkl', '.artifact'))}
+        for state in (self._checked, self._unavailable):
+            for name in [name for name in state if name not in self._names]:
+                del state[name]
+
+    def model_path(self, store_id):
+        """Pickle path of the model serving store_id (it may not exist)."""
+        name = str(self.routes.get(str(store_id), store_id))
+        return os.path.join(self.directory, f'{os.path.basename(name)}.pkl')
+
+    def resident_bytes(self):
+        return sum(served.memory_bytes() for served in self._resident.values())
+
+    def get(self, store_id):
+        """The model for store_id, loading it if needed; None means use the pooled model."""
+        self.requests += 1
+        if isinstance(store_id, bool) or not isinstance(store_id, (str, int)):
+            self.fallbacks += 1
+            return None
+        now = time.monotonic()
+        try:
+            self._refresh_routes(now)
+        except (OSError, ValueError):
+            self.errors += 1
+        path = self.model_path(store_id)
+        key = os.path.splitext(os.path.basename(path))[0]
+        if key not in self._names and key not in self._resident:
+            self.fallbacks += 1  # no model file for this store (as of the last listing)
+            return None
+
+        # Between checks, trust what the last stat found
+        served = self._resident.get(key)
+        if not self._due(self._checked.get(key), now) and (served is not None or key in self._unavailable):
+            current = served.fingerprint if served is not None else self._unavailable[key]
+        else:
+            current = fingerprint(path)
+            self._checked[key] = now
+
+        if served is not None and current == served.fingerprint:
+            self._resident.move_to_end(key)
+            self.hits += 1
+            served.requests += 1
+            return served
+
+        self._resident.pop(key, None)  # changed on disk (or deleted): drop the old copy
+        if current is None or (key in self._unavailable and self._unavailable[key] == current):
+            # No model file, or the same file that already failed to load
+            self._unavailable[key] = current
+            self.fallbacks += 1
+            return None
+        try:
+            served = ServedModel.load(f'store:{key}', path)
+        except Exception:
+            self._unavailable[key] = current
+            self.errors += 1
+            self.fallbacks += 1
+            return None
+        self._unavailable.pop(key, None)
+        self.loads += 1
+        self.load_ms_total += served.load_ms
+        self.load_ms_max = max(self.load_ms_max, served.load_ms)
+
+        self._resident[key] = served
+        self._evict(keep=key)
+        served.requests += 1
+        return served
+
+    def _evict(self, keep):
+        """Drop least recently used models until the resident estimate fits the budget."""
+        total = self.resident_bytes()
+        while total > self.budget and len(self._resident) > 1:
+            name = next(iter(self._resident))
+            if name == keep:
+                break
+            total -= self._resident.pop(name).memory_bytes()
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.loads
+        return {
+            'directory': self.directory,
+            'requests': self.requests,
+            'hits': self.hits,
+            'loads': self.loads,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else None,
+            'fallbacks': self.fallbacks,
+            'evictions': self.evictions,
+            'errors': self.errors,
+            'unavailable': sorted(name for name, state in self._unavailable.items() if state is not None),
+            'check_interval': self.check_interval,
+            'load_ms': {'mean': round(self.load_ms_total / self.loads, 1) if self.loads else None,
+                        'max': self.load_ms_max},
+            'resident': len(self._resident),
+            'resident_mb': round(self.resident_bytes() / 2**20, 2),
+            'budget_mb': round(self.budget / 2**20, 2),
+            'models': {name: dict(served.info(), mb=round(served.memory_bytes() / 2**20, 3))
+                       for name, served in self._resident.items()},
+        }
@@ -1,38 +1,154 @@
+"""
+Demand Prediction
+=================
+Reads one JSON feature object from stdin and prints the prediction JSON.
+A JSON list of feature objects is predicted as one batch (a single
+model.predict call) and answered with a list of outputs in the same order.
+
+Modes:
+  python predict.py < input.json     one-shot (default)
+  python predict.py --serve          persistent: one JSON request per stdin
+                                     line, one JSON response per stdout line
+  python predict.py --serve --warm   also precompute the daily cache at startup
+
+{"mode": "horizon", ...} returns a multi-day (days x 24 x items) forecast, see
+predict_horizon(). {"mode": "simulate", ...} runs the backend's multi-day
+simulation loop as vectorized Monte Carlo scenarios, see predict_simulation()
+and simulate.py. In --serve mode {"command": "stats"} returns the
+daily-prediction cache counters.
+
+Model registry
+--------------
+Several models can be resident at once (see model_registry.py):
+--model NAME=PATH registers extra models next to the default one, and a
+request picks one with "model": NAME or "model_version": "v1"/"v2".
+In --serve mode a background thread polls the model files every --watch
+seconds and swaps in a retrained model without a restart; requests already
+running finish on the model they started with. Commands:
+{"command": "models"} lists the resident models with their request counts
+and the load/swap history, {"command": "reload"} (optional "name",
+"force": true) reloads now, and {"command": "load", "name", "path"}
+registers another model; the path is relative to this script's directory
+and must stay inside it (loading a pickle runs its code). Commands are for
+the operator's side of the pipe: the backend only sends them with
+broadcast(), never with a client's feature object.
+
+Per-store models: a request with "store_id" (and no explicit "model" /
+"model_version") is served by that store's own model when
+--store-models DIR (default: store_models/ next to this script, if it
+exists) has one, see StoreModels in model_registry.py and
+train_model_v2.py --per-store. Store models are loaded on first use and
+kept in an LRU of at most --store-model-budget MB; stores without one use
+the pooled model. Their files (and routes.json) are checked for changes
+at most every --watch seconds (0: on every request). Their hit rate, load
+latency and resident memory are part of {"command": "models"}.
+
+Latency instrumentation
+-----------------------
+Opt-in per-stage timings (see latency_stats.py): with --timings every
+object response, or a single request with "timings": true, gets a
+"timings" field in ms - history lookup, encode, cache, model, format and
+total (plus imports / model_load in one-shot mode). Batch (list) responses
+stay plain lists; their timings only go into the cumulative stats.
+Timed requests in --serve mode are also added to cumulative counters and
+latency histograms, along with parse, serialize and request (line in to
+line out); {"command": "timings"} dumps them ("reset": true clears them).
+
+Recent history
+--------------
+A request with "store_id" uses that store's recorded sales (history_store.npz,
+see history_store.py) for the v2 lag/rolling features instead of the
+historical-mean defaults.
+{"command": "observe", "store_id", "date", "sales": {item: units}} records one
+day of sales and saves the history file. Several predictor processes can
+share the file: an observe re-reads it under a lock before recording the
+day, and every process re-reads it when it changes before a lookup, so any
+worker can take an observe and all of them serve the new features.
+
+Cold start
+----------
+Startup imports NumPy only. The model is memory-mapped from the flat
+artifact next to the pickle (<model>.artifact/, see model_artifact.py),
+written by the training scripts or by the first load of a pickle, so
+sklearn/scipy/pandas are never imported unless a batch larger than
+ENGINE_MAX_ROWS needs sklearn's predict.
+--startup-report prints imports / model load / first prediction timings to
+stderr.
+
+Target: under 250 ms from process launch to the first printed prediction
+with demand_model_kaggle.pkl and a fresh artifact, measured as
+    time python predict.py --startup-report < ../input.json
+"""
+
+import time
+_START = time.perf_counter()
+
+import os
 import sys
 import json
-import joblib
+import argparse
+import warnings
 import numpy as np
-import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from prediction_cache import PredictionCache
+from model_registry import ModelRegistry, StoreModels
+from history_store import HistoryStore, HISTORY_PATH, locked
+from latency_stats import LatencyStats, StageTimer, NULL_TIMER
+
+# Up to this many rows the compiled tree engine beats sklearn's per-call overhead
+ENGINE_MAX_ROWS = 64
+
+# Models are fitted on DataFrames but fed encoded arrays in the training column order
+warnings.filterwarnings('ignore', message='X does not have valid feature names')
 
-# Load model artifacts
-import os
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 MODEL_PATH = os.path.join(BASE_DIR, 'demand_model_kaggle.pkl')
+STORE_MODELS_DIR = os.path.join(BASE_DIR, 'store_models')
+
+# Startup time breakdown in ms (reported with --startup-report)
+startup = {'imports_ms': round((time.perf_counter() - _START) * 1000, 1)}
+
+def load_model(path=MODEL_PATH, name='default'):
+    """
+    Load a model into the registry under name (see model_registry.py): a
+    fresh flat artifact is memory-mapped with NumPy only, otherwise the
+    pickle is loaded and the artifact rebuilt next to it.
+    """
+    served = registry.register(name, path)
+    if name == registry.default:
+        startup['model_source'] = served.source
+        startup['model_load_ms'] = served.load_ms
+    return served
+
+def model_file(path):
+    """
+    Path for the load command, resolved against BASE_DIR: only files inside
+    the model directory can be loaded by a request.
+    """
+    base = os.path.realpath(BASE_DIR)
+    resolved = os.path.realpath(os.path.join(base, path))
+    if os.path.commonpath([base, resolved]) != base:
+        raise ValueError(f'load: {path} is outside the model directory {base}')
+    return resolved
+
+# Load model artifacts
+registry = ModelRegistry()
 try:
-    model_data = joblib.load(MODEL_PATH)
-    model = model_data['model']
-    features = model_data['features']
-    items = model_data['items']
-    daily_uncertainty = model_data['uncertainty']
-    hourly_factors = model_data['daily_to_hourly_factors']
-    model_version = model_data.get('model_version', 'v1')
+    load_model()
 except Exception as e:
     print(json.dumps({'error': str(e)}))
     sys.exit(1)
 
-# Historical averages (fallback for lag/rolling features when no history is available)
-# These are per-item mean sales from the training data
-HISTORICAL_MEANS = {
-    'burger': 37.0, 'fries': 32.0, 'wrap': 36.0, 'bucket': 35.0, 'drink': 27.0
-}
-HISTORICAL_STDS = {
-    'burger': 5.0, 'fries': 4.5, 'wrap': 5.0, 'bucket': 4.8, 'drink': 3.5
-}
-# Typical prices from the training data
-DEFAULT_PRICES = {
-    'burger': 21.3, 'fries': 14.2, 'wrap': 18.4, 'bucket': 32.5, 'drink': 8.7
-}
+cache = PredictionCache()
+history = None
+history_version = None  # (inode, mtime, size) of the history file it was read from
+store_models = None  # StoreModels when per-store models are enabled
+
+# Stage timer of the request being served (NULL_TIMER unless it's instrumented)
+timer = NULL_TIMER
+timings_enabled = False
+latency = LatencyStats()
 
 def apply_weather_adjustment(demand, temperature, rainfall):
     """
@@ -53,134 +169,476 @@ def apply_weather_adjustment(demand, temperature, rainfall):
         
     return demand * adj
 
-def build_v2_features(day_of_week, current_month, event_flag):
-    """Build v2 feature vector (44 features) with reasonable defaults for lag/rolling."""
-    row = {
-        'weekday': day_of_week,
-        'month': current_month,
-        'promo': event_flag,
-        'day_of_month': datetime.now().day,
-        'year': datetime.now().year,
-        'is_weekend': 1 if day_of_week >= 5 else 0,
-        'is_month_start': 1 if datetime.now().day <= 3 else 0,
-        'is_month_end': 1 if datetime.now().day >= 28 else 0,
-        'quarter': (current_month - 1) // 3 + 1,
+def select_model(request):
+    """
+    The registry model a request asks for ("model": name or
+    "model_version"), else its store's own model, else the default.
+    """
+    name, version = request.get('model'), request.get('model_version')
+    if name is None and version is None and store_models is not None and request.get('store_id') is not None:
+        served = store_models.get(request['store_id'])
+        if served is not None:
+            return served
+    return registry.select(name, version)
+
+def predict_batch(inputs):
+    """
+    Predict many feature objects with a single model.predict call per
+    selected model. Returns one output dict per input, in the same order.
+    """
+    if not inputs:
+        return []
+
+    groups = {}
+    for i, input_data in enumerate(inputs):
+        served = select_model(input_data)
+        groups.setdefault(id(served), (served, []))[1].append(i)
+
+    outputs = [None] * len(inputs)
+    for served, rows in groups.values():
+        group = [inputs[i] for i in rows]
+
+        # Feature matrix in the model's column order
+        with timer.stage('history'):
+            recent = store_history([d.get('store_id') for d in group], served.items)
+        with timer.stage('encode'):
+            X = served.encoder.encode(group, history=recent)
+
+        # Predict Daily Demand (one row of item sales per input)
+        daily_preds = predict_daily(served, X)
+
+        with timer.stage('format'):
+            for i, input_data, daily in zip(rows, group, daily_preds):
+                outputs[i] = format_output(served, input_data, daily)
+    return outputs
+
+def history_file_version():
+    """(inode, mtime, size) of the history file, or None if there is none."""
+    try:
+        stat = os.stat(HISTORY_PATH)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+def current_history():
+    """The history store, re-read if the file changed (another worker saved it) since."""
+    global history, history_version
+    version = history_file_version()
+    if version is not None and version != history_version:
+        history = HistoryStore.load(HISTORY_PATH)
+        history_version = version
+    return history
+
+def store_history(store_ids, items):
+    """Recent-history features for rows with a known store_id, or None."""
+    if not any(store_ids):
+        return None
+    store = current_history()
+    if store is None:
+        return None
+    return store.lookup(store_ids, items)
+
+def observe(request):
+    """Record one day of store sales in the shared history file."""
+    global history, history_version
+    with locked(HISTORY_PATH):
+        # Start from the file, not this process's copy, so days other workers saved survive
+        store = current_history()
+        if store is None:
+            store = HistoryStore(select_model(request).items)
+        store_id = request['store_id']
+        store.observe(store_id, request['date'], request['sales'])
+        store.save(HISTORY_PATH)
+        history, history_version = store, history_file_version()
+    return {'store_id': store_id, 'features': store.features(store_id)}
+
+def sklearn_model(served):
+    """The served model's sklearn estimator (unpickled on first use), or None."""
+    if served.model is None:
+        with timer.stage('sklearn_load'):
+            return served.sklearn_model()
+    return served.model
+
+def model_predict(served, X):
+    """Run the model on encoded rows: compiled engine for small batches, sklearn otherwise."""
+    if served.engine is not None and (len(X) <= ENGINE_MAX_ROWS or sklearn_model(served) is None):
+        return served.engine.predict(X)
+    return sklearn_model(served).predict(X)
+
+def predict_daily(served, X):
+    """
+    Daily item predictions for encoded rows. Rows already in the cache skip
+    the model; the remaining distinct rows go through one model.predict call.
+    """
+    with timer.stage('cache'):
+        keys = [cache.key(served.cache_id, row) for row in X]
+        daily_preds = np.empty((len(keys), len(served.items)))
+
+        missing = {}
+        for i, key in enumerate(keys):
+            cached = cache.get(key)
+            if cached is None:
+                missing.setdefault(key, []).append(i)
+            else:
+                daily_preds[i] = cached
+
+    if missing:
+        with timer.stage('model'):
+            preds = model_predict(served, X[[rows[0] for rows in missing.values()]])
+        with timer.stage('cache'):
+            for pred, (key, rows) in zip(preds, missing.items()):
+                daily_preds[rows] = pred
+                cache.put(key, pred.copy())
+
+    return daily_preds
+
+def warm_cache(served):
+    """
+    Precompute daily predictions for the keys requests will hit: every
+    weekday x month x promo combination (168) for v1. v2 keys also carry
+    day_of_month and year, so only today's weekday x promo rows are warmed.
+    """
+    now = datetime.now()
+    if served.version == 'v2':
+        dates = [now]
+    else:
+        dates = [now.replace(month=month, day=1) for month in range(1, 13)]
+
+    grid = [{'day_of_week': day, 'event_flag': flag} for day in range(7) for flag in (0, 1)]
+    X = np.vstack([served.encoder.encode(grid, now=date).copy() for date in dates])
+    predict_daily(served, X)
+    return len(X)
+
+def predict(input_data):
+    """Predict hourly and daily demand for one feature object."""
+    return predict_batch([input_data])[0]
+
+def format_output(served, input_data, daily_preds):
+    """Turn one row of daily item predictions into the hourly output dict."""
+    items, hourly_factors, daily_uncertainty = served.items, served.hourly_factors, served.uncertainty
+    hour = input_data.get('hour', 12)
+    temperature = input_data.get('temperature', 25)
+    rainfall = input_data.get('rainfall', 0)
+
+    # Distribute to Hourly
+    hourly_factor = hourly_factors.get(hour, 0.04)
+
+    predictions = {}
+    uncertainty = {}
+    lower_bound = {}
+    upper_bound = {}
+
+    for i, item in enumerate(items):
+        daily_val = max(0, daily_preds[i])
+
+        # 1. Apply Hourly Factor
+        hourly_val = daily_val * hourly_factor
+
+        # 2. Apply Weather Adjustment
+        hourly_val = apply_weather_adjustment(hourly_val, temperature, rainfall)
+
+        predictions[item] = round(max(0, hourly_val), 1)
+
+        # 3. Calculate Uncertainty (scaled for hourly)
+        raw_uncertainty = daily_uncertainty[item] * hourly_factor * 1.5
+        uncertainty[item] = round(max(0.5, raw_uncertainty), 2)
+
+        # 4. Calculate Bounds (95% CI -> +/- 1.96 std dev)
+        lower_bound[item] = round(max(0, hourly_val - 1.96 * uncertainty[item]), 1)
+        upper_bound[item] = round(hourly_val + 1.96 * uncertainty[item], 1)
+
+    # Prepare Daily Predictions Dict
+    daily_predictions = {}
+    daily_unc = {}
+    for i, item in enumerate(items):
+        daily_predictions[item] = round(max(0, daily_preds[i]), 1)
+        daily_unc[item] = daily_uncertainty[item]
+
+    output = {
+        'predictions': predictions,
+        'uncertainty': uncertainty,
+        'lower_bound': lower_bound,
+        'upper_bound': upper_bound,
+        'daily_predictions': daily_predictions,
+        'daily_uncertainty': daily_unc,
+        'hourly_forecast': {},
+        'model_version': served.version,
+        'model_accuracy': served.model_data.get('accuracy', {})
     }
-    
-    # Add per-item features: lag_1, lag_7, lag_14, price, rolling_mean_7, rolling_std_7, rolling_mean_30
-    for item in items:
-        mean_val = HISTORICAL_MEANS.get(item, 30.0)
-        std_val = HISTORICAL_STDS.get(item, 5.0)
-        
-        # Add small noise to lag values so they vary realistically
-        noise_factor = 1.0 + (day_of_week - 3) * 0.02  # Weekday variation
-        
-        row[f'lag_1_{item}'] = round(mean_val * noise_factor, 1)
-        row[f'lag_7_{item}'] = round(mean_val * 1.0, 1) # Same weekday last week
-        row[f'lag_14_{item}'] = round(mean_val * 0.98, 1) # 2 weeks ago
-        row[f'price_{item}'] = DEFAULT_PRICES.get(item, 15.0)
-        row[f'rolling_mean_7_{item}'] = round(mean_val, 1)
-        row[f'rolling_std_7_{item}'] = round(std_val, 2)
-        row[f'rolling_mean_30_{item}'] = round(mean_val * 0.98, 1)
-    
-    return row
 
-def build_v1_features(day_of_week, current_month, event_flag):
-    """Build v1 feature vector (3 features)."""
+    # Generate 24h forecast (aggregated across all items)
+    total_daily_demand = sum(max(0, p) for p in daily_preds)
+    for h in range(24):
+        factor = hourly_factors.get(h, 0.04)
+        h_val = total_daily_demand * factor
+        h_val = apply_weather_adjustment(h_val, temperature, rainfall)
+        output['hourly_forecast'][h] = round(h_val, 1)
+
+    return output
+
+def weather_multiplier(temperature, rainfall):
+    """Array version of apply_weather_adjustment's multiplier."""
+    temperature = np.asarray(temperature, dtype=float)
+    rainfall = np.asarray(rainfall, dtype=float)
+    rain_adj = np.where(rainfall > 5, 0.85, np.where(rainfall > 0, 0.95, 1.0))
+    temp_adj = np.where((temperature > 35) | (temperature < 5), 0.90, 1.0)
+    return rain_adj * temp_adj
+
+def _per_day_hour(value, days, default):
+    """Broadcast a scalar, 24-hour list or days x 24 list to a (days, 24) array."""
+    arr = np.asarray(default if value is None else value, dtype=float)
+    return np.broadcast_to(arr, (days, 24))
+
+def predict_horizon(request):
+    """
+    Per-item forecast for every hour of `days` days from `start_date`:
+    (days x 24 x items) predictions with lower/upper bounds. One batched
+    daily prediction (one row per day) is spread over the hours by
+    broadcasting the hourly factors and weather multipliers.
+
+    request: start_date (YYYY-MM-DD, default today), days (default 7),
+    temperature / rainfall (scalar, 24 hourly values, or days x 24),
+    event_flag (scalar or one per day), store_id (optional: every day uses
+    the store's latest recorded history), model / model_version.
+    Values are rounded with NumPy, which can differ from the single-hour
+    output by 0.1 in rare exact half-way cases.
+    """
+    days = int(request.get('days', 7))
+    if days < 1:
+        raise ValueError('days must be at least 1')
+    start = datetime.strptime(request['start_date'], '%Y-%m-%d') if request.get('start_date') \
+        else datetime.now()
+    dates = [start + timedelta(days=d) for d in range(days)]
+    event_flags = np.broadcast_to(np.asarray(request.get('event_flag', 0)), (days,))
+
+    # One model row per day (weekday in the model's Monday=0 convention)
+    served = select_model(request)
+    inputs = [{'day_of_week': date.weekday(), 'event_flag': int(flag)}
+              for date, flag in zip(dates, event_flags)]
+    with timer.stage('history'):
+        recent = store_history([request.get('store_id')] * days, served.items)
+    with timer.stage('encode'):
+        X = served.encoder.encode(inputs, dates=dates, history=recent)
+    daily = np.maximum(0, predict_daily(served, X))  # (days, items)
+
+    with timer.stage('format'):
+        return horizon_output(served, request, dates, daily)
+
+def horizon_output(served, request, dates, daily):
+    """Spread (days, items) daily predictions over the hours with weather and bounds."""
+    items, hourly_factors, daily_uncertainty = served.items, served.hourly_factors, served.uncertainty
+    days = len(dates)
+    factors = np.array([hourly_factors.get(h, 0.04) for h in range(24)])  # (24,)
+    weather = weather_multiplier(_per_day_hour(request.get('temperature'), days, 25),
+                                 _per_day_hour(request.get('rainfall'), days, 0))  # (days, 24)
+
+    hourly = daily[:, None, :] * factors[None, :, None] * weather[:, :, None]
+    item_unc = np.array([daily_uncertainty[item] for item in items])
+    uncertainty = np.round(np.maximum(0.5, item_unc[None, :] * factors[:, None] * 1.5), 2)  # (24, items)
+    margin = 1.96 * uncertainty[None, :, :]
+
     return {
-        'weekday': day_of_week,
-        'month': current_month,
-        'promo': event_flag
+        'start_date': dates[0].strftime('%Y-%m-%d'),
+        'days': days,
+        'items': list(items),
+        'dates': [date.strftime('%Y-%m-%d') for date in dates],
+        'predictions': np.round(hourly, 1).tolist(),
+        'lower_bound': np.round(np.maximum(0, hourly - margin), 1).tolist(),
+        'upper_bound': np.round(hourly + margin, 1).tolist(),
+        'uncertainty': uncertainty.tolist(),
+        'daily_predictions': np.round(daily, 1).tolist(),
+        'hourly_total': np.round(daily.sum(axis=1)[:, None] * factors[None, :] * weather, 1).tolist(),
+        'model_version': served.version
     }
 
+def predict_simulation(request):
+    """
+    Monte Carlo run of the backend simulation (simulate.py): the daily
+    predictions for `days` days from today are made in one batch, exactly as
+    runSimulation requests them, and shared by every scenario.
+
+    request: days (default 7), scenarios (default 1000), event_days (0-based
+    day numbers), seed, temperature / rainfall (fixed weather, scalar or one
+    per day; default: simulated per scenario-day), percentiles, model /
+    model_version.
+    """
+    import simulate
+
+    days = int(request.get('days', 7))
+    if days < 1:
+        raise ValueError('days must be at least 1')
+    served = select_model(request)
+    with timer.stage('encode'):
+        X = served.encoder.encode(simulate.day_inputs(days, request.get('event_days') or []))
+    daily = predict_daily(served, X)
+    # Same values runSimulation reads from daily_predictions
+    predictions = [[round(max(0, value), 1) for value in row] for row in daily.tolist()]
+
+    with timer.stage('simulate'):
+        return simulate.monte_carlo(predictions, served.items, int(request.get('scenarios', 1000)),
+                                    request.get('seed'), request.get('temperature'),
+                                    request.get('rainfall'),
+                                    request.get('percentiles') or simulate.PERCENTILES)
+
+def run_request(request):
+    """
+    Dispatch a parsed request: a list is a batch, {"mode": "horizon"} a
+    multi-day forecast, any other object a single prediction.
+    """
+    if isinstance(request, list):
+        return predict_batch(request)
+    if request.get('command') == 'stats':
+        return {'cache': cache.stats()}
+    if request.get('command') == 'timings':
+        return timings_stats(reset=bool(request.get('reset')))
+    if request.get('command') == 'observe':
+        return observe(request)
+    if request.get('command') == 'models':
+        return dict(registry.stats(), store_models=store_models.stats() if store_models else None)
+    if request.get('command') == 'reload':
+        names = [request['name']] if request.get('name') else registry.names()
+        return {'reloaded': [name for name in names if registry.reload(name, force=bool(request.get('force')))]}
+    if request.get('command') == 'load':
+        return load_model(model_file(request['path']), request['name']).info()
+    if request.get('mode') == 'horizon':
+        return predict_horizon(request)
+    if request.get('mode') == 'simulate':
+        return predict_simulation(request)
+    return predict(request)
+
+def timed_request(request):
+    """
+    run_request, with stage timings if --timings is on or an object request
+    asks for them ("timings": true). Returns (output, timer); the timer is
+    NULL_TIMER for untimed requests and commands.
+    """
+    global timer
+    wanted = timings_enabled or (isinstance(request, dict) and request.get('timings'))
+    if not wanted or (isinstance(request, dict) and 'command' in request):
+        return run_request(request), NULL_TIMER
+
+    timer = StageTimer()
+    try:
+        with timer.stage('total'):
+            output = run_request(request)
+    finally:
+        request_timer, timer = timer, NULL_TIMER
+    if isinstance(output, dict):
+        output['timings'] = request_timer.report()
+    return output, request_timer
+
+def timings_stats(reset=False):
+    """Cumulative latency counters and histograms (then cleared if reset)."""
+    stats = dict(latency.stats(), enabled=timings_enabled, startup=startup)
+    if reset:
+        latency.reset()
+    return stats
+
+def serve(stream_in=sys.stdin, stream_out=sys.stdout, startup_report=False):
+    """
+    Persistent mode: the model stays loaded and each stdin line is one request.
+    Every request gets exactly one response line, in order; failures are
+    reported as {"error": ...} without stopping the loop.
+    """
+    for line in iter(stream_in.readline, ''):
+        line = line.strip()
+        if not line:
+            continue
+        request_start = time.perf_counter()
+        request_ns = time.perf_counter_ns()
+        request = None
+        request_timer = NULL_TIMER
+        try:
+            request = json.loads(line)
+            parse_ns = time.perf_counter_ns() - request_ns
+            output, request_timer = timed_request(request)
+        except Exception as e:
+            output = {'error': str(e)}
+
+        serialize_start = time.perf_counter_ns()
+        stream_out.write(json.dumps(output) + '\n')
+        stream_out.flush()
+
+        if request_timer.enabled:
+            done = time.perf_counter_ns()
+            request_timer.add('parse', parse_ns)
+            request_timer.add('serialize', done - serialize_start)
+            request_timer.add('request', done - request_ns)
+            latency.record(request_timer.ms(), rows=len(request) if isinstance(request, list) else 1)
+        elif timings_enabled and 'error' in output:
+            latency.record({'request': (time.perf_counter_ns() - request_ns) / 1e6}, rows=0, error=True)
+        if startup_report:
+            report_startup(request_start)
+            startup_report = False
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Predict demand from JSON features on stdin.')
+    parser.add_argument('--serve', action='store_true',
+                        help='keep the model loaded and answer one JSON request per line')
+    parser.add_argument('--warm', action='store_true',
+                        help='precompute cached daily predictions at startup')
+    parser.add_argument('--cache-size', type=int, default=cache.maxsize,
+                        help='max cached daily predictions (0 disables the cache)')
+    parser.add_argument('--startup-report', action='store_true',
+                        help='print the startup time breakdown to stderr after the first prediction')
+    parser.add_argument('--timings', action='store_true',
+                        help='add per-stage timings to responses and keep latency histograms')
+    parser.add_argument('--model', action='append', default=[], metavar='NAME=PATH',
+                        help='also load the model at PATH, selected by "model": NAME (repeatable)')
+    parser.add_argument('--watch', type=float, default=2.0, metavar='SECONDS',
+                        help='--serve: reload changed model files, polled every SECONDS (0 disables)')
+    parser.add_argument('--store-models', metavar='DIR',
+                        default=STORE_MODELS_DIR if os.path.isdir(STORE_MODELS_DIR) else None,
+                        help='per-store models <DIR>/<store_id>.pkl, routed by "store_id" '
+                             '(default: store_models/ if it exists)')
+    parser.add_argument('--store-model-budget', type=float, default=256, metavar='MB',
+                        help='memory budget of the loaded per-store models (default: %(default)s)')
+    return parser.parse_args(argv)
+
+def report_startup(first_request_start):
+    """Write the startup breakdown, ending at the first prediction, to stderr."""
+    now = time.perf_counter()
+    startup['first_prediction_ms'] = round((now - first_request_start) * 1000, 1)
+    startup['total_ms'] = round((now - _START) * 1000, 1)
+    sys.stderr.write(json.dumps(startup) + '\n')
+
 def main():
+    global timings_enabled, store_models
+    args = parse_args()
+    cache.maxsize = args.cache_size
+    timings_enabled = args.timings
+    for spec in args.model:
+        name, sep, path = spec.partition('=')
+        if not sep or not name or not path:
+            print(json.dumps({'error': f'--model expects NAME=PATH, got {spec!r}'}))
+            sys.exit(1)
+        load_model(path, name)
+    if args.store_models:
+        store_models = StoreModels(args.store_models, args.store_model_budget, args.watch)
+    if args.warm:
+        warm_cache(registry.get())
+
+    if args.serve:
+        registry.watch(args.watch)
+        serve(startup_report=args.startup_report)
+        return
+
     try:
         # Read input from stdin
         input_str = sys.stdin.read()
         if not input_str:
             return
-            
-        input_data = json.loads(input_str)
-        
-        # Extract features
-        hour = input_data.get('hour', 12)
-        day_of_week = input_data.get('day_of_week', 0)
-        temperature = input_data.get('temperature', 25)
-        rainfall = input_data.get('rainfall', 0)
-        event_flag = input_data.get('event_flag', 0)
-        
-        current_month = datetime.now().month
-        
-        # Build features based on model version
-        if model_version == 'v2':
-            row = build_v2_features(day_of_week, current_month, event_flag)
-        else:
-            row = build_v1_features(day_of_week, current_month, event_flag)
-        
-        # Create DataFrame with correct feature order
-        X = pd.DataFrame([row])
-        # Ensure columns match model's expected features
-        X = X.reindex(columns=features, fill_value=0)
-        
-        # Predict Daily Demand
-        daily_preds = model.predict(X)[0] # Array of sales for all items
-        
-        # Distribute to Hourly
-        hourly_factor = hourly_factors.get(hour, 0.04)
-        
-        predictions = {}
-        uncertainty = {}
-        lower_bound = {}
-        upper_bound = {}
-        
-        for i, item in enumerate(items):
-            daily_val = max(0, daily_preds[i])
-            
-            # 1. Apply Hourly Factor
-            hourly_val = daily_val * hourly_factor
-            
-            # 2. Apply Weather Adjustment
-            hourly_val = apply_weather_adjustment(hourly_val, temperature, rainfall)
-            
-            predictions[item] = round(max(0, hourly_val), 1)
-            
-            # 3. Calculate Uncertainty (scaled for hourly)
-            raw_uncertainty = daily_uncertainty[item] * hourly_factor * 1.5
-            uncertainty[item] = round(max(0.5, raw_uncertainty), 2)
-            
-            # 4. Calculate Bounds (95% CI -> +/- 1.96 std dev)
-            lower_bound[item] = round(max(0, hourly_val - 1.96 * uncertainty[item]), 1)
-            upper_bound[item] = round(hourly_val + 1.96 * uncertainty[item], 1)
-            
-        # Prepare Daily Predictions Dict
-        daily_predictions = {}
-        daily_unc = {}
-        for i, item in enumerate(items):
-            daily_predictions[item] = round(max(0, daily_preds[i]), 1)
-            daily_unc[item] = daily_uncertainty[item]
-
-        output = {
-            'predictions': predictions,
-            'uncertainty': uncertainty,
-            'lower_bound': lower_bound,
-            'upper_bound': upper_bound,
-            'daily_predictions': daily_predictions,
-            'daily_uncertainty': daily_unc,
-            'hourly_forecast': {},
-            'model_version': model_version,
-            'model_accuracy': model_data.get('accuracy', {})
-        }
-
-        # Generate 24h forecast (aggregated across all items)
-        total_daily_demand = sum(max(0, p) for p in daily_preds)
-        for h in range(24):
-            factor = hourly_factors.get(h, 0.04)
-            h_val = total_daily_demand * factor
-            h_val = apply_weather_adjustment(h_val, temperature, rainfall)
-            output['hourly_forecast'][h] = round(h_val, 1)
-        
+
+        request_start = time.perf_counter()
+        output, request_timer = timed_request(json.loads(input_str))
+        if request_timer.enabled and isinstance(output, dict):
+            # One-shot: the process startup is part of this request's latency
+            output['timings'] = {'imports_ms': startup['imports_ms'],
+                                 'model_load_ms': startup['model_load_ms'], **output['timings']}
         print(json.dumps(output))
-        
+        if args.startup_report:
+            report_startup(request_start)
+
     except Exception as e:
         print(json.dumps({'error': str(e)}))
         sys.exit(1)
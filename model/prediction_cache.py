@@ -0,0 +1,60 @@
+"""
+Daily Prediction Cache
+======================
+Bounded LRU of daily item predictions.
+
+The daily model output depends only on the encoded feature row (hour,
+temperature and rainfall are applied afterwards), and with the default
+lag/rolling values that row only varies by weekday, month, promo and - for
+v2 - day_of_month and year. Keying on (model_version, feature row bytes)
+therefore lets almost every request skip model.predict.
+"""
+
+from collections import OrderedDict
+
+
+class PredictionCache:
+    """LRU cache of daily prediction rows with hit/miss counters."""
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def key(model_version, row):
+        """Cache key for one encoded feature row."""
+        return (model_version, row.tobytes())
+
+    def get(self, key):
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': len(self._entries),
+            'maxsize': self.maxsize
+        }
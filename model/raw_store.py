@@ -0,0 +1,348 @@
+"""
+Raw Sales Store
+===============
+Columnar copy of the raw Kaggle CSV, so the loaders read only the stores,
+years, items and columns they use instead of parsing the whole file on
+every run.
+
+Layout (one partition per store and year, each column a raw array file in
+a compact dtype; lengths, dtypes and item runs are in the manifest):
+
+    raw_store/
+        manifest.json          format version, column dtypes, item ids and
+                               the CSV state (size, mtime, tail checksum)
+        store_1/
+            2019/              date.bin     int32  days since 1970-01-01
+                               item_id.bin  int16  index into manifest item_ids
+                               sales.bin    int32
+                               price.bin    int32  cents
+                               promo.bin, weekday.bin, month.bin  int8
+            2020/
+        store_2/
+            ...
+
+The CSV is streamed in CHUNK_ROWS chunks. Each chunk's rows are appended
+to their partitions grouped by item (stable, so CSV order is kept within
+an item), and the manifest records every partition's item runs, so
+load(items=...) reads just those byte ranges. Stores and years outside
+the request are never opened.
+
+update() follows the CSV with the feature store's change check
+(csv_source.py): unchanged -> nothing is read; appended to -> only the new
+bytes are parsed and added to their partitions; anything else -> full
+rebuild. Columns beyond RAW_COLUMNS are not stored. Prices with fractions
+of a cent are rejected.
+
+Usage:
+  python raw_store.py --update [--data ../data/kaggle_data.csv]
+  python raw_store.py --info
+
+    from raw_store import RawStore
+    store = RawStore()
+    store.update(DATA_PATH)
+    df = store.load(stores=['store_1'], items=['item_1', 'item_2'])
+"""
+
+import os
+import json
+import shutil
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from csv_source import csv_change, csv_state, read_appended
+
+RAW_STORE_FORMAT_VERSION = 1
+RAW_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'raw_store')
+DATA_PATH = '../data/kaggle_data.csv'
+
+# CSV rows parsed per chunk while ingesting
+CHUNK_ROWS = 200_000
+
+# Kaggle columns, in CSV order; store_id is the partition key, not a file
+RAW_COLUMNS = ['date', 'store_id', 'item_id', 'sales', 'price', 'promo', 'weekday', 'month']
+COLUMN_DTYPES = {
+    'date': '<i4',
+    'item_id': '<i2',
+    'sales': '<i4',
+    'price': '<i4',
+    'promo': '<i1',
+    'weekday': '<i1',
+    'month': '<i1',
+}
+PRICE_SCALE = 100
+
+
+def _days_str(days):
+    return str(np.datetime64(int(days), 'D'))
+
+
+class RawStore:
+    """Raw Kaggle rows partitioned by store and year, one file per column."""
+
+    def __init__(self, root=RAW_STORE_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, 'manifest.json')
+        self.manifest = self._read_manifest()
+
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format_version') != RAW_STORE_FORMAT_VERSION:
+            return None
+        return manifest
+
+    def _write_manifest(self):
+        tmp = f'{self.manifest_path}.tmp-{os.getpid()}'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+
+    @property
+    def stores(self):
+        return list(self.manifest['stores']) if self.manifest else []
+
+    # ---- writing ----
+
+    def _encode(self, chunk):
+        """Compact column arrays for a parsed CSV chunk (store_id stays as strings)."""
+        missing = [c for c in RAW_COLUMNS if c not in chunk.columns]
+        if missing:
+            raise ValueError(f'CSV is missing columns {missing}')
+        empty = [c for c in RAW_COLUMNS if chunk[c].isna().any()]
+        if empty:
+            raise ValueError(f'CSV has missing values in {empty}')
+
+        item_ids = self.manifest['item_ids']
+        known = set(item_ids)
+        item_ids.extend(sorted(set(chunk['item_id'].unique()) - known))
+        arrays = {
+            'date': pd.to_datetime(chunk['date']).to_numpy().astype('datetime64[D]').astype(np.int64),
+            'item_id': pd.Categorical(chunk['item_id'], categories=item_ids).codes,
+        }
+        price = chunk['price'].to_numpy(dtype=float)
+        cents = np.round(price * PRICE_SCALE)
+        if not np.array_equal(cents / PRICE_SCALE, price):
+            raise ValueError('price has fractions of a cent; the store keeps whole cents')
+        arrays['price'] = cents
+        for column in ('sales', 'promo', 'weekday', 'month'):
+            arrays[column] = chunk[column].to_numpy()
+
+        for column, values in arrays.items():
+            info = np.iinfo(COLUMN_DTYPES[column])
+            if len(values) and (values.min() < info.min or values.max() > info.max):
+                raise ValueError(f'{column} values outside the {np.dtype(COLUMN_DTYPES[column])} range')
+            arrays[column] = values.astype(COLUMN_DTYPES[column])
+        return arrays
+
+    def _append_partition(self, store_id, year, arrays):
+        """Append rows (already grouped by item) to a store/year partition."""
+        parts = self.manifest['stores'].setdefault(store_id, {})
+        part = parts.setdefault(str(year), {'rows': 0, 'start': None, 'end': None, 'runs': []})
+        path = os.path.join(self.root, store_id, str(year))
+        os.makedirs(path, exist_ok=True)
+        for column, values in arrays.items():
+            with open(os.path.join(path, f'{column}.bin'), 'ab') as f:
+                # Drop anything a failed earlier write left past the recorded rows
+                f.truncate(part['rows'] * values.itemsize)
+                values.tofile(f)
+
+        codes = arrays['item_id']
+        starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]])
+        stops = np.r_[starts[1:], len(codes)]
+        runs = part['runs']
+        for start, stop in zip(starts.tolist(), stops.tolist()):
+            code, start, stop = int(codes[start]), start + part['rows'], stop + part['rows']
+            if runs and runs[-1][0] == code and runs[-1][2] == start:
+                runs[-1][2] = stop
+            else:
+                runs.append([code, start, stop])
+
+        first, last = _days_str(arrays['date'].min()), _days_str(arrays['date'].max())
+        part['start'] = min(part['start'] or first, first)
+        part['end'] = max(part['end'] or last, last)
+        part['rows'] += len(codes)
+
+    def _ingest(self, chunks):
+        """Append every chunk's rows to their partitions; returns the row count."""
+        rows = 0
+        for chunk in chunks:
+            arrays = self._encode(chunk)
+            years = arrays['date'].astype('datetime64[D]').astype('datetime64[Y]').astype(int) + 1970
+            groups = pd.DataFrame({'store_id': chunk['store_id'].to_numpy(), 'year': years})
+            for (store_id, year), index in sorted(groups.groupby(['store_id', 'year']).indices.items()):
+                index = index[np.argsort(arrays['item_id'][index], kind='stable')]
+                self._append_partition(store_id, year, {c: v[index] for c, v in arrays.items()})
+            rows += len(chunk)
+        return rows
+
+    def rebuild(self, data_path=DATA_PATH):
+        """Stream the whole CSV into a fresh store."""
+        shutil.rmtree(self.root, ignore_errors=True)
+        os.makedirs(self.root)
+        self.manifest = {
+            'format_version': RAW_STORE_FORMAT_VERSION,
+            'columns': COLUMN_DTYPES,
+            'price_scale': PRICE_SCALE,
+            'item_ids': [],
+            'stores': {},
+        }
+        rows = self._ingest(pd.read_csv(data_path, usecols=RAW_COLUMNS, chunksize=CHUNK_ROWS))
+        self._record_source(data_path)
+        self._write_manifest()
+        return {'mode': 'full', 'new_rows': rows, 'stores': len(self.manifest['stores'])}
+
+    def _record_source(self, data_path):
+        self.manifest['source'] = csv_state(data_path)
+
+    def update(self, data_path=DATA_PATH):
+        """Bring the store up to date with the CSV; returns what was done."""
+        if self.manifest is None:
+            return self.rebuild(data_path)
+
+        change = csv_change(self.manifest.get('source'), data_path)
+        if change == 'rewritten':
+            return self.rebuild(data_path)
+        if change == 'unchanged':
+            if self.manifest['source']['mtime_ns'] != os.stat(data_path).st_mtime_ns:
+                self._record_source(data_path)
+                self._write_manifest()
+            return {'mode': 'unchanged', 'new_rows': 0, 'stores': 0}
+
+        stores_before = set(self.manifest['stores'])
+        rows = self._ingest(read_appended(data_path, self.manifest['source']['size'],
+                                          usecols=RAW_COLUMNS, chunksize=CHUNK_ROWS))
+        self._record_source(data_path)
+        self._write_manifest()
+        return {'mode': 'incremental', 'new_rows': rows,
+                'stores': len(set(self.manifest['stores']) - stores_before)}
+
+    # ---- reading ----
+
+    def _read_ranges(self, path, column, ranges):
+        dtype = np.dtype(self.manifest['columns'][column])
+        file = os.path.join(path, f'{column}.bin')
+        return np.concatenate([np.fromfile(file, dtype=dtype, count=stop - start, offset=start * dtype.itemsize)
+                               for start, stop in ranges] or [np.empty(0, dtype)])
+
+    def load(self, stores=None, items=None, start=None, end=None, columns=None):
+        """
+        Raw rows as pd.read_csv would give them (dates parsed, prices in
+        currency units), reading only the matching partitions, item runs
+        and columns. stores/items are id lists, start/end inclusive dates
+        and columns a subset of RAW_COLUMNS; None means all.
+        """
+        if self.manifest is None:
+            raise FileNotFoundError(f'No raw store at {self.root}; run update() first')
+        known = self.manifest['stores']
+        store_ids = [s for s in (known if stores is None else stores) if s in known]
+        columns = RAW_COLUMNS if columns is None else [c for c in RAW_COLUMNS if c in columns]
+        stored = [c for c in columns if c != 'store_id']
+        read = stored + [c for c in ('date',) if c not in stored and (start or end)]
+        start = None if start is None else pd.Timestamp(start)
+        end = None if end is None else pd.Timestamp(end)
+        item_ids = self.manifest['item_ids']
+        codes = None if items is None else {item_ids.index(i) for i in items if i in item_ids}
+
+        chunks = {column: [] for column in read}
+        store_col = []
+        for store_id in store_ids:
+            for year, part in sorted(known[store_id].items(), key=lambda kv: int(kv[0])):
+                if (start is not None and part['end'] < f'{start:%Y-%m-%d}'
+                        or end is not None and part['start'] > f'{end:%Y-%m-%d}'):
+                    continue
+                if codes is None:
+                    ranges = [(0, part['rows'])]
+                else:
+                    ranges = []
+                    for code, run_start, run_stop in part['runs']:
+                        if code not in codes:
+                            continue
+                        if ranges and ranges[-1][1] == run_start:
+                            ranges[-1] = (ranges[-1][0], run_stop)
+                        else:
+                            ranges.append((run_start, run_stop))
+                if not ranges:
+                    continue
+
+                path = os.path.join(self.root, store_id, year)
+                arrays = {column: self._read_ranges(path, column, ranges) for column in read}
+                if start is not None or end is not None:
+                    dates = arrays['date'].astype('datetime64[D]')
+                    keep = np.ones(len(dates), bool)
+                    if start is not None:
+                        keep &= dates >= start.to_datetime64()
+                    if end is not None:
+                        keep &= dates <= end.to_datetime64()
+                    arrays = {column: values[keep] for column, values in arrays.items()}
+                for column in read:
+                    chunks[column].append(arrays[column])
+                store_col.append(np.full(len(arrays[read[0]]) if read else sum(b - a for a, b in ranges),
+                                         store_id, dtype=object))
+
+        data = {}
+        for column in columns:
+            if column == 'store_id':
+                data[column] = np.concatenate(store_col) if store_col else np.empty(0, dtype=object)
+                continue
+            values = (np.concatenate(chunks[column]) if chunks[column]
+                      else np.empty(0, dtype=self.manifest['columns'][column]))
+            if column == 'date':
+                data[column] = values.astype('datetime64[D]')
+            elif column == 'item_id':
+                data[column] = np.array(item_ids, dtype=object)[values]
+            elif column == 'price':
+                data[column] = values / self.manifest['price_scale']
+            else:
+                data[column] = values.astype(np.int64)
+        return pd.DataFrame(data, columns=columns)
+
+    def info(self):
+        if self.manifest is None:
+            return {'stores': 0}
+        parts = [p for store_parts in self.manifest['stores'].values() for p in store_parts.values()]
+        rows = sum(p['rows'] for p in parts)
+        return {
+            'stores': len(self.manifest['stores']),
+            'partitions': len(parts),
+            'rows': rows,
+            'items': len(self.manifest['item_ids']),
+            'start': min((p['start'] for p in parts), default=None),
+            'end': max((p['end'] for p in parts), default=None),
+            'mb': round(rows * sum(np.dtype(d).itemsize for d in self.manifest['columns'].values()) / 2**20, 2),
+            'source': self.manifest.get('source'),
+        }
+
+
+def load_sales(data_path=DATA_PATH, stores=None, items=None, root=RAW_STORE_DIR):
+    """Raw rows for stores/items from the raw store, synced with data_path first."""
+    raw_store = RawStore(root)
+    status = raw_store.update(data_path)
+    print(f"  Raw store update: {status['mode']} ({status['new_rows']} new rows)")
+    return raw_store.load(stores, items)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Partitioned columnar copy of the raw sales CSV')
+    parser.add_argument('--update', action='store_true', help='sync with the CSV (incremental when appended)')
+    parser.add_argument('--rebuild', action='store_true', help='re-ingest the whole CSV')
+    parser.add_argument('--info', action='store_true', help='print a summary')
+    parser.add_argument('--data', default=DATA_PATH, help='sales CSV (default: %(default)s)')
+    parser.add_argument('--root', default=RAW_STORE_DIR, help='store directory (default: %(default)s)')
+    args = parser.parse_args()
+
+    store = RawStore(args.root)
+    if args.rebuild:
+        print(store.rebuild(args.data))
+    elif args.update:
+        print(store.update(args.data))
+    if args.info or not (args.update or args.rebuild):
+        print(json.dumps(store.info(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+"""
+Monte Carlo Simulation
+======================
+Vectorized version of the backend's multi-day simulation
+(backend/services/simulationService.js runSimulation): thousands of
+independent scenarios advance together, one NumPy step per day.
+
+Every scenario replays the same day-by-day loop:
+  - production = daily prediction x the scenario's cooking factor
+  - ingredient usage, surplus and surplus risk against the current inventory
+  - the decision engine's expected-cost choice between normal / discount /
+    redistribute / cascading (CSVE), with the food-safety override
+  - actual demand = prediction ± 10% uniform noise, rounded
+  - feedback: cooking factor ±0.05 when the total error exceeds 3 units,
+    clamped to [0.8, 1.2]
+  - inventory drawdown by actual usage, revenue (20% discount loss),
+    meals donated and waste reduced (0.3 kg per donated meal)
+  - BaselineStrategy on the same actual demand (fixed historical production)
+and ends with the same metrics and AI-vs-baseline comparison. Scenarios
+differ only in their random draws: demand noise and, unless fixed weather is
+given, the weather service's simulated temperature/rainfall.
+
+The constants mirror ingredientMapping.js (see ingredient_mapping.py),
+decisionEngine.js and foodSafetyService.js (see decision_engine.py) and
+baselineStrategy.js, and rounding uses Math.round semantics, so a scenario
+fed the same random numbers reproduces the JavaScript loop exactly. Daily
+predictions don't depend on the scenario (the models see weekday and event
+flag only), so one batched prediction per day is shared by all scenarios.
+The weekday input is Monday = 0 (pandas dayofweek, as in training and
+predict_horizon; calendar.js on the JS side); only the weather service's
+seasonal term keeps getDay().
+
+Usage (loads the deployed model through predict.py):
+  python simulate.py --days 365 --scenarios 10000
+  python simulate.py --days 30 --event-days 5 12 --seed 7 --temperature 38
+"""
+
+import json
+import argparse
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ingredient_mapping import (INGREDIENTS, expiry_vector, ingredient_usage, inventory_vector,
+                                recipe_matrix, sum_columns)
+from decision_engine import ACTIONS, DISCOUNT, DISCOUNT_RATE, SOCIAL_VALUE, evaluate, js_round, surplus_kg
+
+# simulationService.js / baselineStrategy.js
+PRICES = {'burger': 150, 'fries': 80, 'wrap': 120, 'bucket': 350, 'drink': 40}
+HISTORICAL_AVERAGES = {'burger': 15, 'fries': 20, 'wrap': 10, 'bucket': 8, 'drink': 25}
+PREDICTION_HOUR = 14
+COOKING_STEP = 0.05
+COOKING_MIN, COOKING_MAX = 0.8, 1.2
+ERROR_TOLERANCE = 3
+
+PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def js_weekday(date):
+    """Date.getDay(): Sunday = 0 (weatherService.js's seasonal temperature term)."""
+    return date.isoweekday() % 7
+
+
+def day_inputs(days, event_days=(), start=None):
+    """Prediction inputs per day, as simulationService.buildDayFeatures builds them."""
+    start = start or datetime.now()
+    event_days = set(event_days)
+    return [{'hour': PREDICTION_HOUR,
+             'day_of_week': (start + timedelta(days=d)).weekday(),
+             'event_flag': int(d in event_days)} for d in range(days)]
+
+
+def simulated_weather(rng, shape, now=None):
+    """weatherService.js fallback weather: (temperature, rainfall) arrays of shape."""
+    now = now or datetime.now()
+    base_temp = 25 + 10 * np.sin(2 * np.pi * js_weekday(now) / 365)
+    hour_offset = -5 * np.cos(2 * np.pi * (now.hour - 14) / 24)
+    temperature = js_round((base_temp + hour_offset + (rng.random(shape) - 0.5) * 4) * 10) / 10
+    raining = rng.random(shape) < 0.2
+    rainfall = np.where(raining, js_round(rng.random(shape) * 5 * 10) / 10, 0.0)
+    return temperature, rainfall
+
+
+def run_scenarios(predictions, items, scenarios=1000, temperature=None, rainfall=None, rng=None):
+    """
+    Run the simulation loop for `scenarios` paths over the (days, items)
+    daily predictions. temperature / rainfall: fixed weather (scalar or one
+    value per day); missing values are drawn per scenario-day from the
+    weather service's simulated fallback.
+    Returns per-scenario metric arrays plus per-day means and action counts.
+    """
+    rng = rng if rng is not None else np.random.default_rng()
+    predictions = np.asarray(predictions, dtype=float)
+    days, n_items = predictions.shape
+    S = scenarios
+
+    if temperature is None or rainfall is None:
+        sim_temperature, sim_rainfall = simulated_weather(rng, (S, days))
+    temperature = sim_temperature if temperature is None else np.broadcast_to(np.asarray(temperature, float), (S, days))
+    rainfall = sim_rainfall if rainfall is None else np.broadcast_to(np.asarray(rainfall, float), (S, days))
+
+    recipe = recipe_matrix(items)
+    prices = np.array([PRICES.get(item, 100) for item in items], dtype=float)
+    expiry = expiry_vector()
+    baseline_items = [i for i, item in enumerate(items) if item in HISTORICAL_AVERAGES]
+    production = np.array([HISTORICAL_AVERAGES[items[i]] for i in baseline_items], dtype=float)
+    baseline_prices = np.array([PRICES[items[i]] for i in baseline_items], dtype=float)
+
+    cooking = np.ones(S)
+    inventory = np.tile(inventory_vector(), (S, 1))
+    waste_reduced = np.zeros(S)
+    meals = np.zeros(S)
+    revenue = np.zeros(S)
+    revenue_loss = np.zeros(S)
+    risk_pct = np.zeros(S)
+    adaptations = np.zeros(S, dtype=np.int64)
+    baseline_waste = np.zeros(S)
+    baseline_revenue = np.zeros(S)
+
+    action_counts = np.zeros((days, len(ACTIONS)), dtype=np.int64)
+    cooking_mean = np.empty(days)
+    risk_mean = np.empty(days)
+
+    for d in range(days):
+        pred = predictions[d]
+        adjusted = cooking[:, None] * pred
+        usage = ingredient_usage(adjusted, items, recipe=recipe)
+        surplus = np.maximum(0, inventory - usage)
+        surplus_risk = sum_columns(surplus / np.where(inventory != 0, inventory, 1), expiry) / len(INGREDIENTS)
+
+        total_demand = sum_columns(adjusted)
+        decision = evaluate(total_demand, surplus_risk, surplus_kg(surplus), temperature[:, d])
+        action, donated = decision['action'], decision['redistribution_amount']
+        action_counts[d] = np.bincount(action, minlength=len(ACTIONS))
+        risk_mean[d] = surplus_risk.mean()
+
+        # Actual demand: prediction ± 10%
+        noise = (rng.random((S, n_items)) - 0.5) * pred * 0.2
+        actual = np.maximum(0, js_round(pred + noise))
+
+        # Feedback loop on the total prediction error
+        error = sum_columns(actual) - sum_columns(pred[None, :])[0]
+        step = np.where(error > 0, COOKING_STEP, -COOKING_STEP)
+        new_cooking = np.where(np.abs(error) > ERROR_TOLERANCE,
+                               np.clip(cooking + step, COOKING_MIN, COOKING_MAX), cooking)
+        adaptations += js_round(cooking * 100) != js_round(new_cooking * 100)
+        cooking = new_cooking
+        cooking_mean[d] = cooking.mean()
+
+        inventory = np.maximum(0, inventory - ingredient_usage(actual, items, recipe=recipe))
+        waste_reduced += donated * 0.3
+        meals += donated
+
+        day_revenue = sum_columns(np.minimum(adjusted, actual), prices)
+        discount = np.where(action == DISCOUNT, day_revenue * DISCOUNT_RATE, 0.0)
+        revenue += day_revenue - discount
+        revenue_loss += discount
+        risk_pct += js_round(surplus_risk * 10000) / 100
+
+        baseline_actual = actual[:, baseline_items]
+        baseline_waste += sum_columns(np.maximum(0, production - baseline_actual), np.full(len(production), 0.1))
+        baseline_revenue += sum_columns(np.minimum(production, baseline_actual), baseline_prices)
+
+    # getMetrics / BaselineStrategy.getMetrics / calculateComparison
+    ai_waste = js_round(waste_reduced * 10) / 10
+    ai_revenue = js_round(revenue)
+    baseline_waste = js_round(baseline_waste * 10) / 10
+    baseline_revenue = js_round(baseline_revenue)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        reduction_pct = np.where(baseline_waste > 0, ai_waste / baseline_waste * 100, 0.0)
+    revenue_delta = js_round(ai_revenue - baseline_revenue)
+
+    metrics = {
+        'wasteReductionKg': ai_waste,
+        'wasteReductionPercent': js_round(reduction_pct * 10) / 10,
+        'mealsDonated': meals,
+        'revenueDelta': revenue_delta,
+        'netSocialValue': meals * SOCIAL_VALUE + revenue_delta,
+        'aiRevenue': ai_revenue,
+        'aiRevenueLoss': js_round(revenue_loss),
+        'baselineRevenue': baseline_revenue,
+        'baselineWasteKg': baseline_waste,
+        'avgSurplusRisk': js_round(risk_pct / days * 1000) / 1000,
+        'finalCookingFactor': js_round(cooking * 100) / 100,
+        'adaptationCount': adaptations.astype(float),
+    }
+    daily = {'cooking_factor_mean': cooking_mean, 'surplus_risk_mean': risk_mean}
+    return metrics, daily, action_counts
+
+
+def summarize(values, percentiles=PERCENTILES):
+    """Mean, std, min/max and percentiles of one metric across scenarios."""
+    summary = {'mean': float(values.mean()), 'std': float(values.std()),
+               'min': float(values.min()), 'max': float(values.max())}
+    for p, value in zip(percentiles, np.percentile(values, percentiles)):
+        summary[f'p{p:g}'] = float(value)
+    return {key: round(value, 3) for key, value in summary.items()}
+
+
+def monte_carlo(predictions, items, scenarios=1000, seed=None, temperature=None, rainfall=None,
+                percentiles=PERCENTILES):
+    """Run the scenarios and summarize every metric into a distribution."""
+    if scenarios < 1:
+        raise ValueError('scenarios must be at least 1')
+    metrics, daily, action_counts = run_scenarios(predictions, items, scenarios, temperature, rainfall,
+                                                  np.random.default_rng(seed))
+    total = action_counts.sum()
+    return {
+        'scenarios': scenarios,
+        'days': len(predictions),
+        'seed': seed,
+        'items': list(items),
+        'distributions': {name: summarize(values, percentiles) for name, values in metrics.items()},
+        'actions': {action: round(float(n / total), 4) for action, n in zip(ACTIONS, action_counts.sum(axis=0))},
+        'daily': {name: np.round(values, 4).tolist() for name, values in daily.items()},
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Monte Carlo run of the surplus feedback-loop simulation')
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--scenarios', type=int, default=1000)
+    parser.add_argument('--event-days', type=int, nargs='*', default=[], help='0-based days with an event')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--temperature', type=float, default=None, help='fixed temperature (default: simulated)')
+    parser.add_argument('--rainfall', type=float, default=None, help='fixed rainfall (default: simulated)')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    import predict  # loads the deployed model
+
+    args = parse_args()
+    print(json.dumps(predict.predict_simulation({
+        'days': args.days, 'scenarios': args.scenarios, 'event_days': args.event_days,
+        'seed': args.seed, 'temperature': args.temperature, 'rainfall': args.rainfall
+    }), indent=2))
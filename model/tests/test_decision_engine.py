@@ -0,0 +1,126 @@
+"""
+decision_engine.py against makeDecision (backend/services/decisionEngine.js).
+The expected values were produced by makeDecision (node) on the same inputs,
+with COSTS.socialValue changed for the 'negative half' case, and must match
+exactly, including Math.round on halves (-203.5 -> -203, 301.5 -> 302).
+"""
+
+import numpy as np
+import pytest
+
+from decision_engine import ACTIONS, RISK_LEVELS, UNCERTAINTY_LEVELS, js_round, sweep
+from ingredient_mapping import INGREDIENTS
+
+# name: (surplusRisk, predictions, surplus (missing ingredients are 0), uncertainty,
+#        temperature, rainfall, eventFlag, COSTS overrides as sweep parameters)
+CASES = {
+    'typical': (
+        0.509900606060606, [12.3, 7.1, 0.1, 3.3, 21.7],
+        {'bun': 487.7, 'patty': 487.7, 'lettuce': 9751, 'tomato': 4815.5, 'potato': 48935,
+         'tortilla': 299.9, 'chicken': 28012, 'sauce': 4998, 'syrup': 8915, 'water': 93490, 'ice': 17830},
+        [0.52, 0.6, 0.55, 0.5, 0.7], 22, 0, 0, {}),
+    'half rounding': (
+        0.5, [5, 5, 5, 5, 5], {'patty': 2, 'potato': 3, 'chicken': 5}, [1, 1, 1, 1, 1], 25, 3, 1, {}),
+    'zero surplus': (
+        0, [40, 30, 20, 10, 50], {}, [2.5, 3, 2, 4, 1.5], 31, 0, 0, {}),
+    'negative surplus': (
+        0.05, [30, 20, 10, 5, 25], {'patty': 0, 'potato': 200, 'chicken': -5000},
+        [1.2, 1.3, 1.1, 1.0, 0.9], 36, 6, 0, {}),
+    'negative half': (
+        0.5, [4, 3, 3, 2, 2], {'patty': 100, 'potato': 300, 'chicken': 50}, [0.2] * 5, 18, 0, 0,
+        {'social_value': 100.5}),
+}
+
+JS_RESULTS = {
+    'typical': {
+        'action': 'redistribute', 'waste': 3872, 'discount': 1335, 'redistribute': -1800, 'csve_net': 1680,
+        'total_surplus': 23, 'revenue_items': 9, 'revenue_value': 1080, 'redistribution_items': 11,
+        'redistribution_value': 1100, 'buffer_items': 3, 'redistribution_amount': 23, 'risk_level': 'MEDIUM',
+        'shelter_need': 0.7, 'priority_score': 0.36, 'batch_multiplier': 0.96, 'redistribution_buffer': 1.07,
+        'discount_threshold': 0.27, 'uncertainty_level': 'low'},
+    'half rounding': {
+        'action': 'redistribute', 'waste': 1, 'discount': 750, 'redistribute': -800, 'csve_net': 700,
+        'total_surplus': 13, 'revenue_items': 5, 'revenue_value': 600, 'redistribution_items': 6,
+        'redistribution_value': 600, 'buffer_items': 2, 'redistribution_amount': 13, 'risk_level': 'MEDIUM',
+        'shelter_need': 0.85, 'priority_score': 0.43, 'batch_multiplier': 0.93, 'redistribution_buffer': 1.13,
+        'discount_threshold': 0.25, 'uncertainty_level': 'medium'},
+    'zero surplus': {
+        'action': 'normal', 'waste': 0, 'discount': 4500, 'redistribute': 500, 'csve_net': 0,
+        'total_surplus': 0, 'revenue_items': 0, 'revenue_value': 0, 'redistribution_items': 0,
+        'redistribution_value': 0, 'buffer_items': 0, 'redistribution_amount': 0, 'risk_level': 'MEDIUM',
+        'shelter_need': 0.7, 'priority_score': 0, 'batch_multiplier': 0.85, 'redistribution_buffer': 1.25,
+        'discount_threshold': 0.2, 'uncertainty_level': 'high'},
+    'negative surplus': {
+        'action': 'cascading', 'waste': -240, 'discount': 2700, 'redistribute': 0, 'csve_net': -60,
+        'total_surplus': 5, 'revenue_items': 2, 'revenue_value': 240, 'redistribution_items': 2,
+        'redistribution_value': 200, 'buffer_items': 1, 'redistribution_amount': 2, 'risk_level': 'HIGH',
+        'shelter_need': 0.8, 'priority_score': 0.04, 'batch_multiplier': 0.92, 'redistribution_buffer': 1.14,
+        'discount_threshold': 0.25, 'uncertainty_level': 'medium'},
+    'negative half': {
+        'action': 'redistribute', 'waste': 23, 'discount': 420, 'redistribute': -203, 'csve_net': 42,
+        'total_surplus': 7, 'revenue_items': 2, 'revenue_value': 240, 'redistribution_items': 3,
+        'redistribution_value': 302, 'buffer_items': 2, 'redistribution_amount': 7, 'risk_level': 'LOW',
+        'shelter_need': 0.7, 'priority_score': 0.35, 'batch_multiplier': 0.99, 'redistribution_buffer': 1.02,
+        'discount_threshold': 0.29, 'uncertainty_level': 'low'},
+}
+
+
+def flatten(result):
+    """The fields of one sweep() result (a single input, one value per grid axis) named as in JS_RESULTS."""
+    value = lambda arr: np.asarray(arr).reshape(-1)[0].item()
+    csve, costs, adjust = result['csve'], result['expected_costs'], result['uncertainty']
+    return {
+        'action': ACTIONS[value(result['action'])],
+        'waste': value(costs['waste']), 'discount': value(costs['discount']),
+        'redistribute': value(costs['redistribute']),
+        'csve_net': value(csve['net_value']), 'total_surplus': value(csve['total_surplus']),
+        'revenue_items': value(csve['revenue_items']), 'revenue_value': value(csve['revenue_value']),
+        'redistribution_items': value(csve['redistribution_items']),
+        'redistribution_value': value(csve['redistribution_value']), 'buffer_items': value(csve['buffer_items']),
+        'redistribution_amount': value(result['redistribution_amount']),
+        'risk_level': RISK_LEVELS[value(result['risk_level'])],
+        'shelter_need': value(result['shelter_need']), 'priority_score': value(result['priority_score']),
+        'batch_multiplier': value(adjust['batch_multiplier']),
+        'redistribution_buffer': value(adjust['redistribution_buffer']),
+        'discount_threshold': value(adjust['discount_threshold']),
+        'uncertainty_level': UNCERTAINTY_LEVELS[value(adjust['uncertainty_level'])],
+    }
+
+
+def run(case, **grid):
+    risk, predictions, surplus, uncertainty, temperature, rainfall, event_flag, params = CASES[case]
+    grid = {name: [value] for name, value in params.items()} | grid
+    return sweep(risk, predictions, [surplus.get(ing, 0) for ing in INGREDIENTS], uncertainty,
+                 temperature, rainfall, event_flag, grid=grid)
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_matches_make_decision(case):
+    assert flatten(run(case)) == JS_RESULTS[case]
+
+
+def test_js_round_halves():
+    np.testing.assert_array_equal(js_round([-203.5, -2.5, -0.5, 0.5, 2.5, 301.5]),
+                                  [-203, -2, 0, 1, 3, 302])
+
+
+def test_batched_inputs_match_single_inputs():
+    names = sorted(name for name in CASES if not CASES[name][-1])
+    columns = list(zip(*(CASES[name][:7] for name in names)))
+    risk, predictions, surplus, uncertainty, temperature, rainfall, event_flag = columns
+    result = sweep(np.array(risk), np.array(predictions),
+                   np.array([[s.get(ing, 0) for ing in INGREDIENTS] for s in surplus]), np.array(uncertainty),
+                   np.array(temperature), np.array(rainfall), np.array(event_flag))
+    for i, name in enumerate(names):
+        assert ACTIONS[result['action'][i]] == JS_RESULTS[name]['action']
+        assert result['csve']['net_value'][i] == JS_RESULTS[name]['csve_net']
+        assert result['expected_costs']['redistribute'][i] == JS_RESULTS[name]['redistribute']
+
+
+def test_grid_axis_matches_single_runs():
+    values = [100, 100.5]
+    result = run('negative half', social_value=values)
+    for k, social_value in enumerate(values):
+        single = run('negative half', social_value=[social_value])
+        assert result['expected_costs']['redistribute'][k] == single['expected_costs']['redistribute'][0]
+        assert result['csve']['net_value'][k] == single['csve']['net_value'][0]
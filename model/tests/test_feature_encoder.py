@@ -0,0 +1,51 @@
+"""
+FeatureEncoder input checks: missing or non-numeric weekday / promo values
+must fail, not encode as NaN; anything the DataFrame path accepted (numeric
+strings, weekdays outside 0-6) still encodes.
+"""
+
+import numpy as np
+import pytest
+
+from feature_encoder import CALENDAR_FEATURES, FeatureEncoder
+
+ITEMS = ['burger', 'fries']
+FEATURES = CALENDAR_FEATURES + [f'lag_1_{item}' for item in ITEMS]
+
+
+@pytest.fixture(params=['v1', 'v2'])
+def encoder(request):
+    return FeatureEncoder(FEATURES, ITEMS, request.param)
+
+
+@pytest.mark.parametrize('field, value, error', [
+    ('day_of_week', None, TypeError),
+    ('day_of_week', 'monday', TypeError),
+    ('day_of_week', float('nan'), ValueError),
+    ('day_of_week', 'nan', ValueError),
+    ('event_flag', None, TypeError),
+    ('event_flag', 'yes', TypeError),
+    ('event_flag', float('inf'), ValueError),
+])
+def test_invalid_input_raises(encoder, field, value, error):
+    with pytest.raises(error, match=field):
+        encoder.encode([{'day_of_week': 2, 'event_flag': 0}, {'day_of_week': 1, field: value}])
+
+
+def test_valid_inputs(encoder):
+    X = encoder.encode([{}, {'day_of_week': 6, 'event_flag': True}, {'day_of_week': np.int64(3)}])
+    weekday, promo = FEATURES.index('weekday'), FEATURES.index('promo')
+    np.testing.assert_array_equal(X[:, weekday], [0, 6, 3])
+    np.testing.assert_array_equal(X[:, promo], [0, 1, 0])
+    assert not np.isnan(X).any()
+
+
+def test_inputs_the_dataframe_path_accepted(encoder):
+    X = encoder.encode([{'day_of_week': '3', 'event_flag': '1'}, {'day_of_week': 3, 'event_flag': 1},
+                        {'day_of_week': 7}, {'day_of_week': -1}]).copy()
+    np.testing.assert_array_equal(X[0], X[1])
+    np.testing.assert_array_equal(X[2:, FEATURES.index('weekday')], [7, -1])
+    if encoder.model_version == 'v2':
+        # lag_1 defaults extrapolate the weekday variation, as build_v2_features did
+        lag_1 = [FEATURES.index(f'lag_1_{item}') for item in ITEMS]
+        np.testing.assert_array_equal(X[2:, lag_1], [encoder._lag_1_row(7), encoder._lag_1_row(-1)])
@@ -0,0 +1,140 @@
+"""
+HistoryStore keeps running window sums instead of recomputing windows, so
+these tests check its features against a direct computation over the
+calendar days it has seen.
+"""
+
+import numpy as np
+import pytest
+
+from history_store import HISTORY_FEATURES, HistoryStore
+
+ITEMS = ['burger', 'fries', 'wrap']
+
+
+def expected_features(days):
+    """Features after a list of daily sales vectors (oldest first), computed directly."""
+    days = np.array(days[-30:], dtype=float)
+    last_7, n = days[-7:], len(days)
+    mean_7, mean_30 = last_7.mean(axis=0), days.mean(axis=0)
+    return {
+        'lag_1': days[-1],
+        'lag_7': days[-7] if n >= 7 else mean_7,
+        'lag_14': days[-14] if n >= 14 else mean_30,
+        'rolling_mean_7': mean_7,
+        'rolling_std_7': last_7.std(axis=0, ddof=1) if len(last_7) > 1 else np.zeros(len(ITEMS)),
+        'rolling_mean_30': mean_30,
+    }
+
+
+def assert_features(store, store_id, days):
+    features = store.features(store_id)
+    for name, values in expected_features(days).items():
+        actual = [features[name][item] for item in ITEMS]
+        np.testing.assert_allclose(actual, values, rtol=1e-9, atol=1e-9, err_msg=name)
+
+
+def observe_days(store, store_id, days, start=np.datetime64('2021-01-01')):
+    for offset, sales in enumerate(days):
+        store.observe(store_id, start + offset, sales)
+
+
+@pytest.fixture
+def sales():
+    return np.random.default_rng(0).integers(0, 60, size=(70, len(ITEMS))).astype(float)
+
+
+def test_features_match_direct_computation(sales):
+    store = HistoryStore(ITEMS)
+    for offset, day in enumerate(sales):
+        store.observe('s1', np.datetime64('2021-01-01') + offset, day)
+        assert_features(store, 's1', sales[:offset + 1])
+
+
+def test_sales_by_item_name(sales):
+    store = HistoryStore(ITEMS)
+    store.observe('s1', '2021-01-01', dict(zip(ITEMS, sales[0])))
+    assert_features(store, 's1', sales[:1])
+    with pytest.raises(ValueError, match='Missing sales'):
+        store.observe('s1', '2021-01-02', {'burger': 1})
+
+
+def test_repeated_date_replaces_newest_day(sales):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 's1', sales[:40])
+    store.observe('s1', np.datetime64('2021-01-01') + 39, sales[50])
+    assert_features(store, 's1', list(sales[:39]) + [sales[50]])
+
+
+def test_older_date_rejected(sales):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 's1', sales[:10])
+    with pytest.raises(ValueError, match='older than the latest'):
+        store.observe('s1', '2021-01-05', sales[20])
+    assert_features(store, 's1', sales[:10])
+
+
+@pytest.mark.parametrize('date, values', [
+    ('not a date', [1.0, 2.0, 3.0]),
+    ('2021-01-01', [1.0, 2.0]),
+])
+def test_rejected_observation_adds_no_store(date, values):
+    store = HistoryStore(ITEMS)
+    with pytest.raises(ValueError):
+        store.observe('s1', date, values)
+    assert len(store) == 0
+    assert store.features('s1') is None
+
+
+@pytest.mark.parametrize('gap', [1, 3, 12, 29, 30, 45])
+def test_skipped_days_are_zero_sales(sales, gap):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 's1', sales[:20])
+    store.observe('s1', np.datetime64('2021-01-01') + 20 + gap, sales[20])
+    zeros = [np.zeros(len(ITEMS))] * gap
+    assert_features(store, 's1', list(sales[:20]) + zeros + [sales[20]])
+
+    # and the store carries on from there
+    observe_days(store, 's1', sales[21:30], start=np.datetime64('2021-01-01') + 21 + gap)
+    assert_features(store, 's1', list(sales[:20]) + zeros + list(sales[20:30]))
+
+
+def test_save_load_round_trip(tmp_path, sales):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 's1', sales[:35])
+    observe_days(store, 's2', sales[40:43])
+    path = store.save(str(tmp_path / 'history.npz'))
+
+    loaded = HistoryStore.load(path)
+    assert loaded.items == ITEMS and loaded.store_ids == ['s1', 's2']
+    np.testing.assert_array_equal(loaded.lookup(['s1', 's2']), store.lookup(['s1', 's2']))
+    loaded.observe('s1', np.datetime64('2021-01-01') + 35, sales[35])
+    assert_features(loaded, 's1', sales[:36])
+
+
+def test_load_missing_file(tmp_path):
+    assert HistoryStore.load(str(tmp_path / 'missing.npz')) is None
+
+
+def test_lookup_unknown_store_and_item_are_nan(sales):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 's1', sales[:3])
+    out = store.lookup(['s1', 'nope', None], items=['wrap', 'pizza'])
+    assert out.shape == (3, len(HISTORY_FEATURES), 2)
+    np.testing.assert_allclose(out[0, :, 0], [expected_features(sales[:3])[name][2]
+                                              for name in HISTORY_FEATURES])
+    assert np.isnan(out[0, :, 1]).all()
+    assert np.isnan(out[1:]).all()
+
+
+def test_int_store_id_survives_save_load(tmp_path, sales):
+    store = HistoryStore(ITEMS)
+    observe_days(store, 1, sales[:10])
+    loaded = HistoryStore.load(store.save(str(tmp_path / 'history.npz')))
+
+    np.testing.assert_array_equal(loaded.lookup([1]), store.lookup([1]))
+    assert not np.isnan(loaded.lookup([1])).any()
+    loaded.observe(1, np.datetime64('2021-01-01') + 10, sales[10])
+    assert len(loaded) == 1
+    assert_features(loaded, 1, sales[:11])
+    assert_features(loaded, '1', sales[:11])
@@ -0,0 +1,105 @@
+"""
+ingredient_mapping.py against backend/services/ingredientMapping.js. The
+expected values were produced by the JS functions (node) on the same inputs
+and must match exactly: the bulk sums are ordered to give JS's float
+results, not just close ones.
+"""
+
+import numpy as np
+import pytest
+
+from ingredient_mapping import (DEFAULT_INVENTORY, INGREDIENTS, bulk_surplus, compute_surplus,
+                                ingredient_usage, inventory_vector, surplus_risk)
+
+ITEMS = ['burger', 'fries', 'wrap', 'bucket', 'drink']
+
+# Inventory with a zero entry (JS divides by `inventory[ing] || 1`) and a fraction
+CUSTOM_INVENTORY = dict(DEFAULT_INVENTORY, bun=0, tortilla=250.5)
+
+# predictions -> computeIngredientUsage, computeSurplus / computeSurplusRisk with
+# DEFAULT_INVENTORY, and the same with CUSTOM_INVENTORY
+JS_CASES = {
+    'typical': (
+        {'burger': 12.3, 'fries': 7.1, 'wrap': 0.1, 'bucket': 3.3, 'drink': 21.7},
+        {'bun': 12.3, 'patty': 12.3, 'lettuce': 249, 'tomato': 184.5, 'potato': 1065, 'tortilla': 0.1,
+         'chicken': 1988, 'sauce': 2, 'syrup': 1085, 'water': 6510, 'ice': 2170},
+        {'bun': 487.7, 'patty': 487.7, 'lettuce': 9751, 'tomato': 4815.5, 'potato': 48935,
+         'tortilla': 299.9, 'chicken': 28012, 'sauce': 4998, 'syrup': 8915, 'water': 93490,
+         'ice': 17830},
+        0.509900606060606,
+        {'bun': 0, 'patty': 487.7, 'lettuce': 9751, 'tomato': 4815.5, 'potato': 48935,
+         'tortilla': 250.4, 'chicken': 28012, 'sauce': 4998, 'syrup': 8915, 'water': 93490,
+         'ice': 17830},
+        0.4389582326256578,
+    ),
+    'zero demand': (
+        dict.fromkeys(ITEMS, 0),
+        dict.fromkeys(INGREDIENTS, 0),
+        DEFAULT_INVENTORY,
+        0.5272727272727272,
+        CUSTOM_INVENTORY,
+        0.45454545454545453,
+    ),
+    'usage over inventory': (
+        {'burger': 600, 'fries': 0.5, 'wrap': 400, 'bucket': 60, 'drink': 2.5},
+        {'bun': 600, 'patty': 600, 'lettuce': 24000, 'tomato': 9000, 'potato': 75, 'tortilla': 400,
+         'chicken': 68000, 'sauce': 8000, 'syrup': 125, 'water': 750, 'ice': 250},
+        {'bun': 0, 'patty': 0, 'lettuce': 0, 'tomato': 0, 'potato': 49925, 'tortilla': 0,
+         'chicken': 0, 'sauce': 0, 'syrup': 9875, 'water': 99250, 'ice': 19750},
+        0.08134090909090909,
+        {'bun': 0, 'patty': 0, 'lettuce': 0, 'tomato': 0, 'potato': 49925, 'tortilla': 0,
+         'chicken': 0, 'sauce': 0, 'syrup': 9875, 'water': 99250, 'ice': 19750},
+        0.08134090909090909,
+    ),
+    'near inventory, negative item': (
+        {'burger': 499.5, 'fries': 333.3, 'wrap': 299.9, 'bucket': 0.7, 'drink': -3},
+        {'bun': 499.5, 'patty': 499.5, 'lettuce': 18987, 'tomato': 7492.5, 'potato': 49995,
+         'tortilla': 299.9, 'chicken': 24412, 'sauce': 5998, 'syrup': -150, 'water': -900,
+         'ice': -300},
+        {'bun': 0.5, 'patty': 0.5, 'lettuce': 0, 'tomato': 0, 'potato': 5,
+         'tortilla': 0.10000000000002274, 'chicken': 5588, 'sauce': 0, 'syrup': 10150,
+         'water': 100900, 'ice': 20300},
+        0.05227484848484849,
+        {'bun': 0, 'patty': 0.5, 'lettuce': 0, 'tomato': 0, 'potato': 5, 'tortilla': 0,
+         'chicken': 5588, 'sauce': 0, 'syrup': 10150, 'water': 100900, 'ice': 20300},
+        0.05218090909090909,
+    ),
+}
+
+
+def vector(values):
+    return np.array([values[ing] for ing in INGREDIENTS], dtype=float)
+
+
+@pytest.mark.parametrize('case', sorted(JS_CASES))
+def test_matches_js_exactly(case):
+    predictions, usage, surplus, risk, custom_surplus, custom_risk = JS_CASES[case]
+    row = np.array([[predictions[item] for item in ITEMS]])
+
+    got_usage = ingredient_usage(row, ITEMS)
+    np.testing.assert_array_equal(got_usage[0], vector(usage))
+    np.testing.assert_array_equal(compute_surplus(got_usage)[0], vector(surplus))
+    assert surplus_risk(compute_surplus(got_usage))[0] == risk
+
+    inventory = inventory_vector(CUSTOM_INVENTORY)
+    got_surplus = compute_surplus(got_usage, inventory)
+    np.testing.assert_array_equal(got_surplus[0], vector(custom_surplus))
+    assert surplus_risk(got_surplus, inventory)[0] == custom_risk
+
+
+def test_bulk_rows_match_single_rows():
+    predictions = [case[0] for case in JS_CASES.values()]
+    rows = np.array([[p[item] for item in ITEMS] for p in predictions])
+    result = bulk_surplus(rows, ITEMS)
+    np.testing.assert_array_equal(result['risk'], [case[3] for case in JS_CASES.values()])
+    for i, case in enumerate(JS_CASES.values()):
+        np.testing.assert_array_equal(result['surplus'][i], vector(case[2]))
+
+
+def test_per_row_inventory():
+    predictions, _, surplus, risk, custom_surplus, custom_risk = JS_CASES['typical']
+    rows = np.array([[predictions[item] for item in ITEMS]] * 2)
+    inventory = np.vstack([inventory_vector(), inventory_vector(CUSTOM_INVENTORY)])
+    result = bulk_surplus(rows, ITEMS, inventory)
+    np.testing.assert_array_equal(result['surplus'], [vector(surplus), vector(custom_surplus)])
+    np.testing.assert_array_equal(result['risk'], [risk, custom_risk])
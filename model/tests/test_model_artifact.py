@@ -0,0 +1,62 @@
+"""
+save_artifact swaps a symlink to a new version directory, so the artifact
+path never disappears during a save and a reader never mixes two versions.
+"""
+
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+from model_artifact import load_artifact, save_artifact
+
+ITEMS = ['burger', 'fries']
+
+
+def model_data(seed):
+    rng = np.random.default_rng(seed)
+    X, Y = rng.normal(size=(200, 3)), rng.normal(size=(200, 2))
+    model = MultiOutputRegressor(GradientBoostingRegressor(n_estimators=5, random_state=0)).fit(X, Y)
+    return {'model': model, 'features': ['weekday', 'month', 'promo'], 'items': ITEMS,
+            'uncertainty': {item: 1.0 for item in ITEMS}, 'daily_to_hourly_factors': {14: 0.1}}
+
+
+@pytest.fixture(scope='module')
+def models():
+    return [model_data(seed) for seed in range(3)]
+
+
+def versions(path):
+    directory, name = os.path.split(path)
+    return sorted(entry for entry in os.listdir(directory) if entry.startswith(f'{name}.v-'))
+
+
+def test_save_swaps_link_and_keeps_previous_version(tmp_path, models):
+    path = str(tmp_path / 'model.artifact')
+    X = np.random.default_rng(9).normal(size=(20, 3))
+    for i, data in enumerate(models):
+        save_artifact(data, path)
+        assert os.path.islink(path)
+        _, engine = load_artifact(path)
+        np.testing.assert_array_equal(engine.predict(X), data['model'].predict(X))
+        assert len(versions(path)) == min(i + 1, 2)
+    assert os.path.basename(os.path.realpath(path)) == os.readlink(path)
+
+
+def test_replaces_unversioned_directory(tmp_path, models):
+    path = tmp_path / 'model.artifact'
+    path.mkdir()
+    (path / 'meta.json').write_text('{}')
+    save_artifact(models[0], str(path))
+    assert os.path.islink(path) and load_artifact(str(path)) is not None
+
+
+def test_reader_stays_on_the_version_it_resolved(tmp_path, models):
+    path = str(tmp_path / 'model.artifact')
+    save_artifact(models[0], path)
+    resolved = os.path.realpath(path)
+    save_artifact(models[1], path)
+    # The version a reader resolved before the second save is still complete
+    assert load_artifact(resolved) is not None
@@ -0,0 +1,117 @@
+"""
+simulate.run_scenarios against runSimulation (backend/services/simulationService.js).
+The expected metrics were produced by runSimulation (node, with Math.random
+replaced by the same fixed draws, fixed weather and these daily
+predictions): one scenario fed the same random numbers must reproduce them
+exactly. The draws put pred + noise on halves (10.5, 9.5, 4.5, 0.5, ...),
+where Math.round and NumPy's round-half-to-even disagree.
+"""
+
+import os
+import json
+import shutil
+import subprocess
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from decision_engine import ACTIONS
+from simulate import day_inputs, js_weekday, monte_carlo, run_scenarios
+
+ITEMS = ['burger', 'fries', 'wrap', 'bucket', 'drink']
+
+# name: (daily predictions, Math.random draws in call order (day, item), temperature, rainfall)
+CASES = {
+    'halves': (
+        [[10, 12.5, 20, 5, 25.5]] * 6,
+        [0.75, 0.5, 0.625, 0, 0.5, 0.25, 0.5, 0.375, 1 - 2 ** -53, 0.9, 0.75, 0.1, 0.625, 0, 0.5,
+         0.25, 0.5, 0.375, 0, 0.5, 0.75, 0.5, 0.625, 0, 0.3, 0.25, 0.8, 0.375, 0.5, 0.5],
+        [22, 36, 28, 18, 31, 26], [0, 3, 0, 6, 0, 1]),
+    'depleted inventory': (
+        [[300, 100, 150, 60, 40], [280.5, 90, 160, 65.5, 0], [310, 120, 140, 55, 45], [0, 0, 0, 0, 0]],
+        [0.912, 0.044, 0.5, 0.731, 0.25, 0.118, 0.5, 0.964, 0.377, 0.5,
+         0.602, 0.831, 0.25, 0.009, 0.75, 0.5, 0.5, 0.5, 0.5, 0.5],
+        [38, 24, 33, 12], [0, 0, 0, 0]),
+    'low demand': (
+        [[1, 1.5, 0.5, 0.5, 1.5]] * 3,
+        [0.5] * 5 + [0.25, 0.75, 0.1, 0.9, 0.5, 0.0, 0.5, 0.6, 0.4, 0.95],
+        [15, 24, 28], [0, 0, 4]),
+}
+
+JS_RESULTS = {
+    'halves': (
+        ['redistribute'] * 6,
+        {'wasteReductionKg': 63.6, 'wasteReductionPercent': 722.7, 'mealsDonated': 212, 'revenueDelta': 6870,
+         'netSocialValue': 28070, 'aiRevenue': 46490, 'aiRevenueLoss': 0, 'baselineRevenue': 39620,
+         'baselineWasteKg': 8.8, 'avgSurplusRisk': 46.892, 'finalCookingFactor': 1.05, 'adaptationCount': 1}),
+    'depleted inventory': (
+        ['cascading', 'redistribute', 'redistribute', 'cascading'],
+        {'wasteReductionKg': 36.3, 'wasteReductionPercent': 352.4, 'mealsDonated': 121, 'revenueDelta': 247220,
+         'netSocialValue': 259320, 'aiRevenue': 272770, 'aiRevenueLoss': 0, 'baselineRevenue': 25550,
+         'baselineWasteKg': 10.3, 'avgSurplusRisk': 8.865, 'finalCookingFactor': 1.05, 'adaptationCount': 3}),
+    'low demand': (
+        ['discount'] * 3,
+        {'wasteReductionKg': 0, 'wasteReductionPercent': 0, 'mealsDonated': 0, 'revenueDelta': -942,
+         'netSocialValue': -942, 'aiRevenue': 1168, 'aiRevenueLoss': 292, 'baselineRevenue': 2110,
+         'baselineWasteKg': 21.5, 'avgSurplusRisk': 52.5, 'finalCookingFactor': 1, 'adaptationCount': 0}),
+}
+
+
+class ReplayRandom:
+    """Stands in for a Generator: random(shape) hands out fixed draws in order."""
+
+    def __init__(self, draws):
+        self.draws = list(draws)
+
+    def random(self, shape):
+        n = int(np.prod(shape))
+        if n > len(self.draws):
+            raise AssertionError('more random draws than the JS loop made')
+        values, self.draws = self.draws[:n], self.draws[n:]
+        return np.array(values, dtype=float).reshape(shape)
+
+
+@pytest.mark.parametrize('case', sorted(CASES))
+def test_matches_run_simulation(case):
+    predictions, draws, temperature, rainfall = CASES[case]
+    rng = ReplayRandom(draws)
+    metrics, daily, action_counts = run_scenarios(predictions, ITEMS, 1, temperature, rainfall, rng)
+
+    actions, expected = JS_RESULTS[case]
+    assert not rng.draws
+    assert [ACTIONS[a] for a in action_counts.argmax(axis=1)] == actions
+    assert {name: values[0].item() for name, values in metrics.items()} == expected
+
+
+def test_scenarios_are_independent():
+    predictions, draws, temperature, rainfall = CASES['halves']
+    metrics, _, _ = run_scenarios(predictions, ITEMS, 3, temperature, rainfall,
+                                  ReplayRandom(np.repeat(np.reshape(draws, (6, 1, 5)), 3, axis=1).ravel()))
+    for name, value in JS_RESULTS['halves'][1].items():
+        np.testing.assert_array_equal(metrics[name], [value] * 3, err_msg=name)
+
+
+def test_day_inputs_use_model_weekdays():
+    # Monday = 0, as pandas dayofweek in training (not Date.getDay()'s Sunday = 0)
+    sunday = datetime(2026, 10, 18)
+    assert js_weekday(sunday) == 0
+    inputs = day_inputs(8, event_days=[1, 7], start=sunday)
+    assert [d['day_of_week'] for d in inputs] == [6, 0, 1, 2, 3, 4, 5, 6]
+    assert [d['event_flag'] for d in inputs] == [0, 1, 0, 0, 0, 0, 0, 1]
+
+
+@pytest.mark.skipif(shutil.which('node') is None, reason='node is not installed')
+def test_js_weekdays_match_day_inputs():
+    calendar = os.path.join(os.path.dirname(__file__), '..', '..', 'backend', 'services', 'calendar.js')
+    script = (f'const {{ modelDayOfWeek }} = require({json.dumps(os.path.abspath(calendar))});'
+              'console.log(JSON.stringify([...Array(8).keys()].map((d) => modelDayOfWeek(new Date(2026, 9, 18 + d)))));')
+    js = json.loads(subprocess.run(['node', '-e', script], capture_output=True, text=True, check=True).stdout)
+    assert js == [d['day_of_week'] for d in day_inputs(8, start=datetime(2026, 10, 18))]
+
+
+def test_monte_carlo_is_reproducible_with_a_seed():
+    predictions = CASES['halves'][0]
+    first = monte_carlo(predictions, ITEMS, scenarios=50, seed=7)
+    assert monte_carlo(predictions, ITEMS, scenarios=50, seed=7) == first
+    assert sum(first['actions'].values()) == pytest.approx(1)
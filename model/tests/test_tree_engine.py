@@ -0,0 +1,75 @@
+"""
+TreeEnsemble must reproduce model.predict bit for bit. The HistGradientBoosting
+export reads sklearn's private _predictors / _baseline_prediction, so these
+tests are what catches an sklearn upgrade changing them.
+"""
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+from tree_engine import CHUNK_ROWS, TreeEnsemble
+
+N_FEATURES = 6
+N_OUTPUTS = 3
+
+
+def make_data(n_rows, seed):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, N_FEATURES))
+    X[:, :2] = rng.integers(0, 7, size=(n_rows, 2))  # discrete, like weekday/promo
+    X[:, 2] = np.round(X[:, 2], 1)                   # repeated values sit on split thresholds
+    noise = rng.normal(scale=0.3, size=(n_rows, N_OUTPUTS))
+    Y = X[:, :N_OUTPUTS] * [1.5, -2.0, 0.5] + np.sin(X[:, 3:4] * 3) + noise
+    return X, Y
+
+
+MODELS = {
+    'gbr': lambda: MultiOutputRegressor(GradientBoostingRegressor(
+        n_estimators=40, max_depth=4, learning_rate=0.1, subsample=0.8, random_state=0)),
+    'hist': lambda: MultiOutputRegressor(HistGradientBoostingRegressor(
+        max_iter=40, max_depth=5, early_stopping=False, random_state=0)),
+    'forest': lambda: RandomForestRegressor(n_estimators=25, max_depth=8, random_state=0),
+}
+
+
+@pytest.fixture(scope='module', params=sorted(MODELS))
+def fitted(request):
+    X, Y = make_data(600, seed=0)
+    return MODELS[request.param]().fit(X, Y)
+
+
+def test_predictions_match_sklearn_exactly(fitted):
+    X, _ = make_data(300, seed=1)
+    np.testing.assert_array_equal(TreeEnsemble.from_model(fitted).predict(X), fitted.predict(X))
+
+
+def test_training_rows_match_exactly(fitted):
+    # Training rows include every threshold's neighbours on both sides
+    X, _ = make_data(600, seed=0)
+    np.testing.assert_array_equal(TreeEnsemble.from_model(fitted).predict(X), fitted.predict(X))
+
+
+def test_chunked_batches_match_exactly(fitted):
+    X, _ = make_data(CHUNK_ROWS + 37, seed=2)
+    np.testing.assert_array_equal(TreeEnsemble.from_model(fitted).predict(X), fitted.predict(X))
+
+
+def test_saved_engine_matches(fitted, tmp_path):
+    X, _ = make_data(50, seed=3)
+    path = tmp_path / 'engine.npz'
+    TreeEnsemble.from_model(fitted).save(path)
+    np.testing.assert_array_equal(TreeEnsemble.load(path).predict(X), fitted.predict(X))
+
+
+def test_rejects_wrong_feature_count(fitted):
+    with pytest.raises(ValueError):
+        TreeEnsemble.from_model(fitted).predict(np.zeros((2, N_FEATURES + 1)))
+
+
+def test_unsupported_model():
+    from sklearn.linear_model import LinearRegression
+    X, Y = make_data(50, seed=0)
+    with pytest.raises(TypeError):
+        TreeEnsemble.from_model(LinearRegression().fit(X, Y))
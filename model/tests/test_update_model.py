@@ -0,0 +1,68 @@
+"""
+add_trees appends hist stages by editing sklearn's private _predictors, so
+these tests check the grafted model against the current model plus the
+residual model it was built from, and against the compiled tree engine.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.base import clone
+from sklearn.ensemble import HistGradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
+
+from tree_engine import TreeEnsemble
+from update_model import MIN_SAMPLES_LEAF, add_trees
+
+ITEMS = ['burger', 'fries', 'wrap']
+TREES = 10
+LEARNING_RATE = 0.1
+
+
+def make_data(n_rows, seed, shift=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, 5))
+    X[:, :2] = rng.integers(0, 7, size=(n_rows, 2))
+    Y = X[:, :3] * [1.5, -2.0, 0.5] + np.sin(X[:, 3:4] * 3) + shift + rng.normal(scale=0.3, size=(n_rows, 3))
+    return X, pd.DataFrame(Y, columns=ITEMS)
+
+
+@pytest.fixture(scope='module')
+def models():
+    X, Y = make_data(800, seed=0)
+    model = MultiOutputRegressor(HistGradientBoostingRegressor(
+        max_iter=30, max_depth=5, early_stopping=False, random_state=0)).fit(X, Y)
+    X_new, Y_new = make_data(400, seed=1, shift=2.0)
+    return model, add_trees(model, X_new, Y_new, TREES, LEARNING_RATE), X_new, Y_new
+
+
+def test_appended_stages_add_the_residual_model(models):
+    model, updated, X_new, Y_new = models
+    X, _ = make_data(300, seed=2)
+    for old, new, item in zip(model.estimators_, updated.estimators_, ITEMS):
+        residual = clone(old).set_params(max_iter=TREES, learning_rate=LEARNING_RATE,
+                                         min_samples_leaf=MIN_SAMPLES_LEAF, early_stopping=False,
+                                         warm_start=False).fit(X_new, Y_new[item] - old.predict(X_new))
+        np.testing.assert_allclose(new.predict(X), old.predict(X) + residual.predict(X),
+                                   rtol=1e-9, atol=1e-9, err_msg=item)
+        assert new.n_iter_ == old.n_iter_ + TREES
+        assert len(new._predictors) == new.n_iter_
+
+
+def test_original_model_untouched(models):
+    model, _, _, _ = models
+    assert all(est.n_iter_ == 30 and len(est._predictors) == 30 for est in model.estimators_)
+
+
+def test_engine_matches_updated_model(models):
+    _, updated, _, _ = models
+    X, _ = make_data(300, seed=3)
+    np.testing.assert_array_equal(TreeEnsemble.from_model(updated).predict(X), updated.predict(X))
+
+
+def test_missing_internals_fail_loudly(models):
+    model, _, X_new, Y_new = models
+    broken = MultiOutputRegressor(HistGradientBoostingRegressor())
+    broken.estimators_ = [clone(est) for est in model.estimators_]  # unfitted: no _predictors
+    with pytest.raises(RuntimeError, match='_predictors'):
+        add_trees(broken, X_new, Y_new, TREES, LEARNING_RATE)
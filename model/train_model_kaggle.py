@@ -6,6 +6,9 @@ from sklearn.metrics import mean_absolute_error, r2_score
 import joblib
 import json
 
+from model_artifact import artifact_path, save_artifact
+from raw_store import load_sales
+
 # Configuration
 DATA_PATH = '../data/kaggle_data.csv'
 MODEL_PATH = 'demand_model_kaggle.pkl'
@@ -23,13 +26,8 @@ ITEMS = list(ITEM_MAPPING.values())
 
 def load_and_process_data():
     print("Loading data...")
-    df = pd.read_csv(DATA_PATH)
-    
-    # Filter for Store 1
-    df = df[df['store_id'] == 'store_1']
-    
-    # Filter for selected items
-    df = df[df['item_id'].isin(ITEM_MAPPING.keys())]
+    # Store 1 and the selected items only: the raw store reads just their rows
+    df = load_sales(DATA_PATH, ['store_1'], list(ITEM_MAPPING))
     
     # Rename items
     df['item'] = df['item_id'].map(ITEM_MAPPING)
@@ -96,6 +94,8 @@ def train_model():
     }
     joblib.dump(model_data, MODEL_PATH)
     print(f"\nModel saved to {MODEL_PATH}")
+    artifact = save_artifact(model_data, artifact_path(MODEL_PATH), source=MODEL_PATH)
+    print(f"Flat artifact saved to {artifact}")
 
 def get_hourly_factors():
     # Heuristic hourly distribution for a restaurant
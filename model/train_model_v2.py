@@ -12,11 +12,37 @@ Features engineered:
   - item encoded (train one model, more data)
 
 Uses multiple stores for more training data.
+
+Feature engineering lives in features.py; by default the engineered rows
+come from the incremental feature store (feature_store.py), which only
+processes CSV rows added since the last run. --no-feature-store engineers
+them from the raw rows, read from the partitioned raw store (raw_store.py).
+
+Training engines (--engine):
+  gbr    GradientBoostingRegressor per item (exact splits, 200 stages)
+  hist   HistGradientBoostingRegressor per item (binned splits); the number
+         of iterations is picked by early stopping on the last 10% of the
+         training dates, then each item is refit on all training rows
+Both are saved as a MultiOutputRegressor with the same model_data layout.
+
+Usage:
+  python train_model_v2.py                        train on the first 10 stores
+  python train_model_v2.py --stores 0             train on all stores
+  python train_model_v2.py --engine hist          histogram-based boosting
+  python train_model_v2.py --compare              fit both engines, print a comparison
+  python train_model_v2.py --features-only        time feature engineering only
+  python train_model_v2.py --per-store --engine hist
+                                                  one model per store in store_models/
+                                                  (served by store_id, see predict.py)
 """
 
+import os
+import time
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor, RandomForestRegressor
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor, RandomForestRegressor
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error, r2_score, mean_squared_error
 from sklearn.multioutput import MultiOutputRegressor
@@ -25,98 +51,150 @@ import json
 import warnings
 warnings.filterwarnings('ignore')
 
+from model_artifact import artifact_path, save_artifact
+from features import ITEM_MAPPING, ITEMS, engineer_features, pivot_features, prepare_sales
+from feature_store import FeatureStore
+from raw_store import load_sales
+
 # Configuration
 DATA_PATH = '../data/kaggle_data.csv'
 MODEL_PATH = 'demand_model_kaggle.pkl'
-
-# Map Kaggle items to our menu
-ITEM_MAPPING = {
-    'item_1': 'burger',
-    'item_2': 'fries',
-    'item_3': 'wrap',
-    'item_4': 'bucket',
-    'item_5': 'drink'
-}
-
-ITEMS = list(ITEM_MAPPING.values())
+STORE_MODELS_DIR = 'store_models'
 
 # Use top 10 stores for more data (not just store_1)
 STORES_TO_USE = [f'store_{i}' for i in range(1, 11)]
 
+ENGINES = ['gbr', 'hist']
 
-def load_and_process_data():
+# Early stopping for the hist engine: validate on the last 10% of training dates
+VALIDATION_FRACTION = 0.1
+HIST_MAX_ITER = 1000
+
+
+def load_and_process_data(stores=STORES_TO_USE):
+    """Kaggle rows for the menu items; stores=None keeps every store."""
     print("Loading data...")
-    df = pd.read_csv(DATA_PATH)
+    # Only the requested stores' partitions and the menu items' rows are read
+    df = load_sales(DATA_PATH, stores, list(ITEM_MAPPING))
 
     # Use multiple stores for more training data
-    df = df[df['store_id'].isin(STORES_TO_USE)]
-    df = df[df['item_id'].isin(ITEM_MAPPING.keys())]
-    df['item'] = df['item_id'].map(ITEM_MAPPING)
-    df['date'] = pd.to_datetime(df['date'])
+    df = prepare_sales(df, stores)
 
     print(f"  Filtered data: {len(df)} rows from {df['store_id'].nunique()} stores")
     return df
 
 
-def engineer_features(df):
-    """Create rich feature set from raw data."""
-    print("Engineering features...")
-
-    # Sort for lag computation
-    df = df.sort_values(['store_id', 'item', 'date']).reset_index(drop=True)
-
-    # Basic time features
-    df['day_of_month'] = df['date'].dt.day
-    df['year'] = df['date'].dt.year
-    df['is_weekend'] = (df['weekday'] >= 5).astype(int)
-    df['is_month_start'] = (df['day_of_month'] <= 3).astype(int)
-    df['is_month_end'] = (df['day_of_month'] >= 28).astype(int)
-    df['quarter'] = df['date'].dt.quarter
-
-    # Lag features (per store+item group)
-    group = df.groupby(['store_id', 'item'])['sales']
-    df['lag_1'] = group.shift(1)
-    df['lag_7'] = group.shift(7)
-    df['lag_14'] = group.shift(14)
-
-    # Rolling features
-    df['rolling_mean_7'] = group.transform(lambda x: x.rolling(7, min_periods=1).mean())
-    df['rolling_std_7'] = group.transform(lambda x: x.rolling(7, min_periods=1).std())
-    df['rolling_mean_30'] = group.transform(lambda x: x.rolling(30, min_periods=1).mean())
-
-    # Fill NaN from lags (first few rows per group)
-    df['lag_1'] = df['lag_1'].fillna(df['rolling_mean_7'])
-    df['lag_7'] = df['lag_7'].fillna(df['rolling_mean_7'])
-    df['lag_14'] = df['lag_14'].fillna(df['rolling_mean_30'])
-    df['rolling_std_7'] = df['rolling_std_7'].fillna(0)
+def load_features(stores=STORES_TO_USE):
+    """Engineered rows from the feature store, synced with DATA_PATH first."""
+    print("Loading features from the feature store...")
+    feature_store = FeatureStore()
+    status = feature_store.update(DATA_PATH)
+    print(f"  Feature store update: {status['mode']} ({status['new_rows']} new rows)")
+    df = feature_store.load(stores)
+    print(f"  Loaded {len(df)} rows from {df['store_id'].nunique()} stores")
+    return df
 
-    # Drop any remaining NaN
-    df = df.dropna()
 
-    print(f"  After feature engineering: {len(df)} rows")
-    return df
+def build_features(stores=STORES_TO_USE, use_store=True):
+    """Engineered + pivoted training rows; prints the time each step takes."""
+    start = time.perf_counter()
+    if use_store:
+        df = load_features(stores)
+    else:
+        df = engineer_features(load_and_process_data(stores))
+    engineered = time.perf_counter()
+    pivot_df = pivot_features(df)
+    done = time.perf_counter()
+    print(f"  Timing: features {engineered - start:.2f}s, pivot {done - engineered:.2f}s")
+    return pivot_df
 
 
-def train_model():
-    df = load_and_process_data()
-    df = engineer_features(df)
+def fit_gbr(X_train, y_train, train_dates):
+    """GradientBoostingRegressor per item (the original v2 model)."""
+    base_model = GradientBoostingRegressor(
+        n_estimators=200,
+        max_depth=6,
+        learning_rate=0.1,
+        subsample=0.8,
+        random_state=42
+    )
+    model = MultiOutputRegressor(base_model, n_jobs=-1)
+    model.fit(X_train, y_train)
+    return model
+
+
+def fit_hist(X_train, y_train, train_dates):
+    """
+    HistGradientBoostingRegressor per item. Early stopping runs on a
+    time-based validation split (the last VALIDATION_FRACTION of the training
+    dates); each item is then refit on all training rows with the iteration
+    count that scored best on validation.
+    """
+    base_model = HistGradientBoostingRegressor(
+        max_iter=HIST_MAX_ITER,
+        max_depth=6,
+        learning_rate=0.1,
+        early_stopping=True,
+        scoring='loss',
+        n_iter_no_change=20,
+        random_state=42
+    )
+    dates = np.sort(train_dates.unique())
+    val_start = dates[int(len(dates) * (1 - VALIDATION_FRACTION))]
+    fit_mask = (train_dates < val_start).to_numpy()
+
+    estimators = []
+    for item in y_train.columns:
+        y = y_train[item]
+        probe = clone(base_model).fit(X_train[fit_mask], y[fit_mask],
+                                      X_val=X_train[~fit_mask], y_val=y[~fit_mask])
+        # validation_score_[0] is the score before the first iteration
+        n_iter = max(1, int(np.argmax(probe.validation_score_)))
+        print(f"  {item}: {n_iter} iterations (stopped at {probe.n_iter_})")
+        estimators.append(clone(base_model).set_params(max_iter=n_iter, early_stopping=False)
+                          .fit(X_train, y))
+
+    # Same fitted layout MultiOutputRegressor.fit produces
+    model = MultiOutputRegressor(clone(base_model).set_params(early_stopping=False))
+    model.estimators_ = estimators
+    model.n_features_in_ = estimators[0].n_features_in_
+    if hasattr(estimators[0], 'feature_names_in_'):
+        model.feature_names_in_ = estimators[0].feature_names_in_
+    return model
+
+
+FIT_ENGINE = {'gbr': fit_gbr, 'hist': fit_hist}
+ENGINE_NAMES = {'gbr': 'GradientBoosting', 'hist': 'HistGradientBoosting'}
+
+
+def fit_timed(engine, X_train, y_train, train_dates, X_test, y_test):
+    """Fit one engine; returns (model, fit seconds, test predict ms, per-item R²)."""
+    print(f"\nTraining {ENGINE_NAMES[engine]}Regressor (multi-output)...")
+    start = time.perf_counter()
+    model = FIT_ENGINE[engine](X_train, y_train, train_dates)
+    fit_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    y_pred = model.predict(X_test)
+    predict_ms = (time.perf_counter() - start) * 1000
+    r2s = [r2_score(y_test[item], y_pred[:, i]) for i, item in enumerate(ITEMS)]
+    return model, fit_s, predict_ms, r2s
 
-    # Pivot: one row per (date, store_id) with sales for each item as columns
-    pivot_df = df.pivot_table(
-        index=['date', 'store_id', 'weekday', 'month', 'promo', 'day_of_month',
-               'year', 'is_weekend', 'is_month_start', 'is_month_end', 'quarter'],
-        columns='item',
-        values=['sales', 'price', 'lag_1', 'lag_7', 'lag_14',
-                'rolling_mean_7', 'rolling_std_7', 'rolling_mean_30'],
-        aggfunc='first'
-    ).reset_index()
 
-    # Flatten multi-level columns
-    pivot_df.columns = ['_'.join(col).strip('_') if isinstance(col, tuple) else col
-                        for col in pivot_df.columns]
+def print_comparison(results, n_test):
+    print("\n" + "=" * 72)
+    print(f"ENGINE COMPARISON (same time-based split, predict on {n_test} test rows)")
+    print("=" * 72)
+    print(f'{"Engine":<8} {"Fit s":>8} {"Pred ms":>9}' + ''.join(f'{item:>8}' for item in ITEMS)
+          + f'{"Avg R²":>9}')
+    print('-' * 72)
+    for engine, (_, fit_s, predict_ms, r2s) in results.items():
+        print(f'{engine:<8} {fit_s:>8.1f} {predict_ms:>9.1f}' + ''.join(f'{r2:>8.3f}' for r2 in r2s)
+              + f'{np.mean(r2s):>9.3f}')
 
-    pivot_df = pivot_df.fillna(0)
 
+def split_xy(pivot_df):
+    """Feature frame, per-item target frame and feature column names."""
     # Define feature columns (everything except target sales columns and identifiers)
     id_cols = ['date', 'store_id']
     target_cols = [f'sales_{item}' for item in ITEMS]
@@ -126,6 +204,41 @@ def train_model():
     X = pivot_df[feature_cols]
     Y = pivot_df[target_cols]
     Y.columns = ITEMS  # Rename back to item names
+    return X, Y, feature_cols
+
+
+def residual_uncertainty(model, X, Y):
+    """Per-item std of the model's residuals on (X, Y)."""
+    residuals = Y.values - model.predict(X)
+    return {item: float(np.std(residuals[:, i])) for i, item in enumerate(ITEMS)}
+
+
+def save_model(model, feature_cols, uncertainty, accuracy, path=MODEL_PATH, **extra):
+    """
+    Write model_data (backward-compatible structure) and its flat artifact.
+    extra adds keys such as trained_through (last training date, where
+    update_model.py continues from).
+    """
+    model_data = {
+        'model': model,
+        'features': feature_cols,
+        'items': ITEMS,
+        'uncertainty': uncertainty,
+        'daily_to_hourly_factors': get_hourly_factors(),
+        'model_version': 'v2',
+        'accuracy': accuracy,
+        **extra
+    }
+    joblib.dump(model_data, path)
+    print(f"\nModel saved to {path}")
+    artifact = save_artifact(model_data, artifact_path(path), source=path)
+    print(f"Flat artifact saved to {artifact}")
+
+
+def train_model(stores=STORES_TO_USE, use_store=True, engine='gbr', compare=False):
+    # One row per (date, store_id) with sales for each item as columns
+    pivot_df = build_features(stores, use_store)
+    X, Y, feature_cols = split_xy(pivot_df)
 
     print(f"\nFeature matrix: {X.shape[0]} rows × {X.shape[1]} features")
     print(f"Features: {feature_cols}")
@@ -143,17 +256,14 @@ def train_model():
     print(f"Train: {len(X_train)} rows, Test: {len(X_test)} rows")
     print(f"Train period: up to {split_date}")
 
-    # Model: GradientBoosting for better accuracy
-    print("\nTraining GradientBoostingRegressor (multi-output)...")
-    base_model = GradientBoostingRegressor(
-        n_estimators=200,
-        max_depth=6,
-        learning_rate=0.1,
-        subsample=0.8,
-        random_state=42
-    )
-    model = MultiOutputRegressor(base_model, n_jobs=-1)
-    model.fit(X_train, y_train)
+    # Model: gradient boosting (exact or histogram-based splits)
+    train_dates = pivot_df['date'][train_mask]
+    results = {}
+    for name in (ENGINES if compare else [engine]):
+        results[name] = fit_timed(name, X_train, y_train, train_dates, X_test, y_test)
+    if compare:
+        print_comparison(results, len(X_test))
+    model = results[engine][0]
 
     # Evaluation on test set
     y_pred = model.predict(X_test)
@@ -177,36 +287,58 @@ def train_model():
     print(f'\nOverall R² Score: {avg_r2:.3f} ({avg_r2 * 100:.1f}%)')
 
     # Uncertainty from residuals
-    y_pred_train = model.predict(X_train)
-    residuals = y_train.values - y_pred_train
-    uncertainty = {item: float(np.std(residuals[:, i])) for i, item in enumerate(ITEMS)}
+    uncertainty = residual_uncertainty(model, X_train, y_train)
     print("\nUncertainty (Std Dev of Residuals):")
     for item, unc in uncertainty.items():
         print(f"  {item}: {unc:.2f}")
 
-    # Feature importance (from first sub-model as representative)
-    importances = model.estimators_[0].feature_importances_
-    feat_imp = sorted(zip(feature_cols, importances), key=lambda x: -x[1])[:15]
-    print("\nTop 15 Features:")
-    for feat, imp in feat_imp:
-        print(f"  {feat:<35} {imp:.4f}")
+    # Feature importance (from first sub-model as representative; gbr only)
+    importances = getattr(model.estimators_[0], 'feature_importances_', None)
+    if importances is not None:
+        feat_imp = sorted(zip(feature_cols, importances), key=lambda x: -x[1])[:15]
+        print("\nTop 15 Features:")
+        for feat, imp in feat_imp:
+            print(f"  {feat:<35} {imp:.4f}")
 
     # Save model (keep backward-compatible structure)
-    model_data = {
-        'model': model,
-        'features': feature_cols,
-        'items': ITEMS,
-        'uncertainty': uncertainty,
-        'daily_to_hourly_factors': get_hourly_factors(),
-        'model_version': 'v2',
-        'accuracy': {
-            'avg_r2': round(avg_r2, 4),
+    save_model(model, feature_cols, uncertainty, {
+        'avg_r2': round(avg_r2, 4),
+        'per_item_r2': {item: round(r2s[i], 4) for i, item in enumerate(ITEMS)}
+    }, trained_through=f"{train_dates.max():%Y-%m-%d}")
+    print(f"Model version: v2 ({ENGINE_NAMES[engine]}, {len(feature_cols)} features)")
+
+
+def train_store_models(stores=STORES_TO_USE, use_store=True, engine='hist', directory=STORE_MODELS_DIR):
+    """
+    Fit one model per store (same features and time-based split as the
+    pooled model) and save each as <directory>/<store_id>.pkl.
+    """
+    pivot_df = build_features(stores, use_store)
+    X, Y, feature_cols = split_xy(pivot_df)
+    os.makedirs(directory, exist_ok=True)
+
+    summary = []
+    for store_id, index in pivot_df.groupby('store_id').groups.items():
+        dates = pivot_df.loc[index, 'date']
+        split_date = dates.sort_values().unique()[int(dates.nunique() * 0.8)]
+        train_idx, test_idx = index[dates < split_date], index[dates >= split_date]
+        train_dates = dates[dates < split_date]
+
+        model, fit_s, _, r2s = fit_timed(engine, X.loc[train_idx], Y.loc[train_idx], train_dates,
+                                         X.loc[test_idx], Y.loc[test_idx])
+        uncertainty = residual_uncertainty(model, X.loc[train_idx], Y.loc[train_idx])
+        save_model(model, feature_cols, uncertainty, {
+            'avg_r2': round(float(np.mean(r2s)), 4),
             'per_item_r2': {item: round(r2s[i], 4) for i, item in enumerate(ITEMS)}
-        }
-    }
-    joblib.dump(model_data, MODEL_PATH)
-    print(f"\nModel saved to {MODEL_PATH}")
-    print(f"Model version: v2 (GradientBoosting, {len(feature_cols)} features)")
+        }, path=os.path.join(directory, f'{store_id}.pkl'), trained_through=f"{train_dates.max():%Y-%m-%d}")
+        summary.append((store_id, len(train_idx), fit_s, np.mean(r2s)))
+
+    print("\n" + "=" * 48)
+    print(f'{"Store":<12} {"Rows":>8} {"Fit s":>8} {"Avg R²":>9}')
+    print('-' * 48)
+    for store_id, rows, fit_s, r2 in summary:
+        print(f'{store_id:<12} {rows:>8} {fit_s:>8.1f} {r2:>9.3f}')
+    print(f"\n{len(summary)} store models saved to {directory}/")
 
 
 def get_hourly_factors():
@@ -224,5 +356,30 @@ def get_hourly_factors():
     return {h: w / total for h, w in weights.items()}
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description='Train the v2 demand model.')
+    parser.add_argument('--stores', type=int, default=len(STORES_TO_USE),
+                        help='use stores store_1..store_N (0 = all stores, default: %(default)s)')
+    parser.add_argument('--features-only', action='store_true',
+                        help='build the feature matrix and report timings without training')
+    parser.add_argument('--engine', choices=ENGINES, default='gbr',
+                        help='training engine (default: %(default)s)')
+    parser.add_argument('--compare', action='store_true',
+                        help='also fit the other engine on the same split and print a comparison')
+    parser.add_argument('--no-feature-store', action='store_true',
+                        help='engineer features from the raw CSV instead of the feature store')
+    parser.add_argument('--per-store', action='store_true',
+                        help=f'train one model per store into {STORE_MODELS_DIR}/ instead of the pooled model')
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    train_model()
+    args = parse_args()
+    stores = [f'store_{i}' for i in range(1, args.stores + 1)] if args.stores else None
+    if args.features_only:
+        pivot_df = build_features(stores, not args.no_feature_store)
+        print(f"Feature matrix: {pivot_df.shape[0]} rows × {pivot_df.shape[1]} columns")
+    elif args.per_store:
+        train_store_models(stores, not args.no_feature_store, args.engine)
+    else:
+        train_model(stores, not args.no_feature_store, args.engine, args.compare)
@@ -0,0 +1,311 @@
+"""
+Backtest and Hyperparameter Search (v2)
+=======================================
+Rolling-origin cross-validation of the v2 demand model over a grid of
+hyperparameters, run as (configuration x fold) tasks on a process pool.
+
+Folds: the last FOLDS x HORIZON days are cut into FOLDS consecutive test
+windows of HORIZON days; each fold trains on every date before its window
+(expanding window), so no fold ever sees its own future.
+
+The feature matrix is built once (train_model_v2.build_features) and saved
+as .npy files in a temporary directory; workers memory-map them, so tasks
+only carry fold boundaries and parameters and every worker shares the same
+pages instead of receiving a pickled copy.
+
+With --budget the search stops submitting work once the wall-clock budget
+is spent. A task that raises is logged and recorded as failed, and the
+search carries on. Configurations that didn't finish all folds (out of
+budget or failed) are left off the leaderboard. The best configuration (lowest mean --metric over folds and
+items) is refit on all rows and saved as demand_model_kaggle.pkl with its
+flat artifact, unless --no-save is given. The full leaderboard is written to
+tune_results.json.
+
+Usage:
+  python tune_model.py                          gbr grid, 4 folds of 28 days
+  python tune_model.py --engine hist --jobs 4   hist grid on 4 processes
+  python tune_model.py --budget 600 --max-configs 12
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import tempfile
+import itertools
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+from sklearn.multioutput import MultiOutputRegressor
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+import warnings
+warnings.filterwarnings('ignore')
+
+from features import ITEMS
+from train_model_v2 import (MODEL_PATH, STORES_TO_USE, build_features, split_xy,
+                            residual_uncertainty, save_model)
+
+RESULTS_PATH = 'tune_results.json'
+
+FOLDS = 4
+HORIZON = 28  # days per test window
+
+# Candidate hyperparameters per engine (full grid unless --max-configs samples it)
+PARAM_GRID = {
+    'gbr': {
+        'n_estimators': [100, 200],
+        'max_depth': [4, 6],
+        'learning_rate': [0.05, 0.1],
+        'subsample': [0.8],
+    },
+    'hist': {
+        'max_iter': [100, 200, 400],
+        'max_depth': [6, None],
+        'learning_rate': [0.05, 0.1],
+        'max_leaf_nodes': [31],
+        'l2_regularization': [0.0, 1.0],
+    },
+}
+
+METRICS = ['mae', 'rmse', 'r2']
+
+# Worker state: memory-mapped arrays opened once per process
+_shared = {}
+
+
+def make_model(engine, params, n_jobs=1):
+    if engine == 'gbr':
+        return MultiOutputRegressor(GradientBoostingRegressor(random_state=42, **params), n_jobs=n_jobs)
+    return MultiOutputRegressor(HistGradientBoostingRegressor(random_state=42, early_stopping=False,
+                                                              **params), n_jobs=n_jobs)
+
+
+def param_configs(engine, max_configs=None, seed=42):
+    grid = PARAM_GRID[engine]
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    if max_configs and max_configs < len(configs):
+        configs = random.Random(seed).sample(configs, max_configs)
+    return configs
+
+
+def rolling_origin_folds(day, n_folds=FOLDS, horizon=HORIZON):
+    """
+    (train_end, test_end) day numbers per fold: train on day < train_end,
+    test on train_end <= day < test_end.
+    """
+    last = int(day.max()) + 1
+    folds = []
+    for k in range(n_folds, 0, -1):
+        train_end = last - k * horizon
+        if train_end <= int(day.min()):
+            raise ValueError(f'Not enough history for {n_folds} folds of {horizon} days')
+        folds.append((train_end, train_end + horizon))
+    return folds
+
+
+def _init_worker(data_dir, limit_threads):
+    if limit_threads:
+        # One process per core: keep OpenMP/BLAS inside each worker single-threaded
+        from threadpoolctl import threadpool_limits
+        threadpool_limits(1)
+    for name in ('X', 'Y', 'day'):
+        _shared[name] = np.load(os.path.join(data_dir, f'{name}.npy'), mmap_mode='r')
+
+
+def _run_task(task):
+    """Fit one configuration on one fold; returns per-item metrics."""
+    config_id, engine, params, fold, (train_end, test_end) = task
+    X, Y, day = _shared['X'], _shared['Y'], _shared['day']
+    train = np.flatnonzero(day < train_end)
+    test = np.flatnonzero((day >= train_end) & (day < test_end))
+
+    start = time.perf_counter()
+    model = make_model(engine, params).fit(X[train], Y[train])
+    fit_s = time.perf_counter() - start
+    y_pred = model.predict(X[test])
+    y_test = Y[test]
+
+    return {
+        'config_id': config_id,
+        'fold': fold,
+        'fit_s': fit_s,
+        'mae': [float(mean_absolute_error(y_test[:, i], y_pred[:, i])) for i in range(Y.shape[1])],
+        'rmse': [float(np.sqrt(mean_squared_error(y_test[:, i], y_pred[:, i]))) for i in range(Y.shape[1])],
+        'r2': [float(r2_score(y_test[:, i], y_pred[:, i])) for i in range(Y.shape[1])],
+    }
+
+
+def run_search(data_dir, tasks, jobs, budget=None):
+    """
+    Run tasks on a process pool; stop submitting once budget seconds have
+    passed. Returns (results, failures): a task that raised is reported in
+    failures (config_id, fold, error) instead of stopping the search.
+    """
+    deadline = time.perf_counter() + budget if budget else None
+    results = []
+    failures = []
+    pending = iter(tasks)
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker,
+                             initargs=(data_dir, jobs > 1)) as pool:
+        running = {}
+        out_of_time = broken = False
+        while True:
+            # Keep one task queued per worker so the budget check stays responsive
+            while not (out_of_time or broken) and len(running) < jobs * 2:
+                if deadline and time.perf_counter() >= deadline:
+                    out_of_time = True
+                    break
+                task = next(pending, None)
+                if task is None:
+                    break
+                running[pool.submit(_run_task, task)] = task
+            if not running:
+                break
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                config_id, _, _, fold, _ = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    error = f'{type(e).__name__}: {e}'
+                    failures.append({'config_id': config_id, 'fold': fold, 'error': error})
+                    print(f"  config {config_id:>3} fold {fold}: FAILED ({error})")
+                    # A dead worker breaks the pool: nothing more can be submitted
+                    broken = broken or isinstance(e, BrokenProcessPool)
+                    continue
+                results.append(result)
+                print(f"  config {result['config_id']:>3} fold {result['fold']}: "
+                      f"RMSE {np.mean(result['rmse']):.3f}, fit {result['fit_s']:.1f}s")
+            if deadline and time.perf_counter() >= deadline and not out_of_time:
+                out_of_time = True
+                print("  Time budget spent; waiting for running tasks")
+    return results, failures
+
+
+def leaderboard(configs, results, n_folds, metric):
+    """Fold-averaged per-item metrics for every configuration that finished all folds."""
+    by_config = {}
+    for result in results:
+        by_config.setdefault(result['config_id'], []).append(result)
+
+    board = []
+    for config_id, fold_results in by_config.items():
+        if len(fold_results) < n_folds:
+            continue
+        entry = {'config_id': config_id, 'params': configs[config_id],
+                 'fit_s': float(np.mean([r['fit_s'] for r in fold_results]))}
+        for name in METRICS:
+            per_item = np.mean([r[name] for r in fold_results], axis=0)
+            entry[name] = {item: round(float(v), 4) for item, v in zip(ITEMS, per_item)}
+            entry[f'avg_{name}'] = round(float(per_item.mean()), 4)
+        board.append(entry)
+
+    reverse = metric == 'r2'  # higher is better
+    board.sort(key=lambda e: e[f'avg_{metric}'], reverse=reverse)
+    return board
+
+
+def print_leaderboard(board, engine, top=10):
+    print("\n" + "=" * 72)
+    print(f"LEADERBOARD ({engine}, fold-averaged)")
+    print("=" * 72)
+    print(f'{"#":>3} {"MAE":>7} {"RMSE":>7} {"R²":>7} {"Fit s":>7}  Params')
+    print('-' * 72)
+    for rank, entry in enumerate(board[:top], 1):
+        params = ', '.join(f'{k}={v}' for k, v in entry['params'].items())
+        print(f'{rank:>3} {entry["avg_mae"]:>7.3f} {entry["avg_rmse"]:>7.3f} {entry["avg_r2"]:>7.3f} '
+              f'{entry["fit_s"]:>7.1f}  {params}')
+
+    if board:
+        best = board[0]
+        print('\nBest configuration per item:')
+        print(f'{"Item":<10} {"MAE":>8} {"RMSE":>8} {"R²":>8}')
+        for item in ITEMS:
+            print(f'{item:<10} {best["mae"][item]:>8.3f} {best["rmse"][item]:>8.3f} {best["r2"][item]:>8.3f}')
+
+
+def tune(engine='gbr', stores=STORES_TO_USE, n_folds=FOLDS, horizon=HORIZON, jobs=None,
+         budget=None, max_configs=None, metric='rmse', save=True, use_store=True):
+    start = time.perf_counter()
+    pivot_df = build_features(stores, use_store)
+    X, Y, feature_cols = split_xy(pivot_df)
+    day = (pivot_df['date'].to_numpy().astype('datetime64[D]').astype(np.int64))
+    folds = rolling_origin_folds(day, n_folds, horizon)
+    configs = param_configs(engine, max_configs)
+    jobs = jobs or os.cpu_count() or 1
+
+    print(f"\nFeature matrix: {X.shape[0]} rows × {X.shape[1]} features")
+    print(f"{len(configs)} configurations × {len(folds)} folds ({horizon}-day windows) "
+          f"on {jobs} processes" + (f", budget {budget:.0f}s" if budget else ""))
+
+    data_dir = tempfile.mkdtemp(prefix='tune_')
+    try:
+        np.save(os.path.join(data_dir, 'X.npy'), X.to_numpy(dtype=np.float64))
+        np.save(os.path.join(data_dir, 'Y.npy'), Y.to_numpy(dtype=np.float64))
+        np.save(os.path.join(data_dir, 'day.npy'), day)
+
+        # Config-major order: each configuration's folds run together, so an
+        # exhausted budget leaves whole configurations rather than scattered folds
+        tasks = [(config_id, engine, params, fold, bounds)
+                 for config_id, params in enumerate(configs)
+                 for fold, bounds in enumerate(folds)]
+        results, failures = run_search(data_dir, tasks, jobs, budget)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    board = leaderboard(configs, results, len(folds), metric)
+    print_leaderboard(board, engine)
+    if failures:
+        print(f"\n{len(failures)} task(s) failed; their configurations are not on the leaderboard")
+    with open(RESULTS_PATH, 'w') as f:
+        json.dump({'engine': engine, 'metric': metric, 'folds': len(folds), 'horizon_days': horizon,
+                   'completed_tasks': len(results), 'total_tasks': len(tasks),
+                   'failed_tasks': [dict(failure, params=configs[failure['config_id']]) for failure in failures],
+                   'elapsed_s': round(time.perf_counter() - start, 1), 'leaderboard': board}, f, indent=2)
+    print(f"\nLeaderboard saved to {RESULTS_PATH}")
+
+    if not board:
+        print("No configuration finished all folds; nothing to save.")
+        return None
+    if save:
+        best = board[0]
+        print(f"\nRefitting best configuration on all {len(X)} rows...")
+        model = make_model(engine, best['params'], n_jobs=-1).fit(X, Y)
+        save_model(model, feature_cols, residual_uncertainty(model, X, Y), {
+            'avg_r2': best['avg_r2'],
+            'per_item_r2': best['r2'],
+            'cv': {'folds': len(folds), 'horizon_days': horizon, 'engine': engine,
+                   'params': best['params'], 'avg_mae': best['avg_mae'], 'avg_rmse': best['avg_rmse']}
+        }, MODEL_PATH, trained_through=f"{pivot_df['date'].max():%Y-%m-%d}")
+    return board
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest and hyperparameter search')
+    parser.add_argument('--engine', choices=list(PARAM_GRID), default='gbr')
+    parser.add_argument('--stores', type=int, default=len(STORES_TO_USE),
+                        help='use stores store_1..store_N (0 = all stores, default: %(default)s)')
+    parser.add_argument('--folds', type=int, default=FOLDS)
+    parser.add_argument('--horizon', type=int, default=HORIZON, help='days per test window')
+    parser.add_argument('--jobs', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--budget', type=float, default=None, help='wall-clock budget in seconds')
+    parser.add_argument('--max-configs', type=int, default=None,
+                        help='randomly sample this many configurations from the grid')
+    parser.add_argument('--metric', choices=METRICS, default='rmse', help='ranking metric')
+    parser.add_argument('--no-save', action='store_true', help="don't write the best model")
+    parser.add_argument('--no-feature-store', action='store_true',
+                        help='engineer features from the raw CSV instead of the feature store')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    stores = [f'store_{i}' for i in range(1, args.stores + 1)] if args.stores else None
+    board = tune(args.engine, stores, args.folds, args.horizon, args.jobs, args.budget,
+                 args.max_configs, args.metric, not args.no_save, not args.no_feature_store)
+    sys.exit(0 if board else 1)
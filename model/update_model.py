@@ -0,0 +1,262 @@
+"""
+Incremental Model Update (v2)
+=============================
+Teaches the deployed v2 model the days of sales observed since it was
+trained, in seconds, without a full retrain: a few boosting stages are
+added to each item's ensemble, fitted on the new window only.
+
+  1. optionally append observed rows (Kaggle CSV layout) to the data CSV;
+     the feature store engineers just the appended rows (feature_store.py)
+  2. the new window is every row dated after the model's trained_through
+     (or --since)
+  3. accuracy guard: a candidate trained on the window minus its last
+     --holdout share of dates must score at least as well (mean MAE, within
+     --tolerance) as the current model on those held-out dates; otherwise
+     nothing is published
+  4. the accepted update is refit on the whole window, the residual-based
+     uncertainty is recomputed over the last UNCERTAINTY_DAYS days, and the
+     model is saved with its flat artifact (the previous pickle is kept as
+     <model>.prev.pkl). A predictor running with --watch picks it up.
+
+Adding stages:
+  gbr   GradientBoostingRegressor warm_start: n_estimators grows by --trees
+        and fit() boosts on from the current ensemble's predictions (at the
+        model's own learning rate, which GBR applies to every stage).
+  hist  HistGradientBoostingRegressor can't warm-start on new data (it
+        re-bins the features and then scores the existing trees with the
+        new bins), so a --trees stage model is fitted to the residuals of
+        the current model and its trees are appended to the ensemble, with
+        the residual model's baseline folded into its first tree's leaves
+        (n_iter_ is len(_predictors), so it follows). This edits sklearn's
+        private _predictors, so an sklearn without them makes the update
+        fail rather than guess; tests/test_update_model.py checks the
+        result against the two models.
+        The new stages use --learning-rate.
+Either way predictions on old data change only by what the new stages add.
+A new window is small next to the training set, so the new stages use
+larger leaves (MIN_SAMPLES_LEAF) to fit its level shifts, not its noise.
+
+Usage:
+  python update_model.py                              rows after trained_through
+  python update_model.py --append new_sales.csv       append observed sales first
+  python update_model.py --since 2020-11-30 --trees 30
+  python update_model.py --dry-run                    run the guard, publish nothing
+"""
+
+import os
+import sys
+import copy
+import time
+import shutil
+import argparse
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.base import clone
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.metrics import mean_absolute_error, r2_score
+import warnings
+warnings.filterwarnings('ignore')
+
+from features import ITEMS
+from train_model_v2 import (DATA_PATH, MODEL_PATH, STORES_TO_USE, build_features, split_xy,
+                            residual_uncertainty, save_model)
+
+TREES = 20
+HOLDOUT = 0.2
+TOLERANCE = 0.0
+LEARNING_RATE = 0.05
+MIN_SAMPLES_LEAF = 100
+UNCERTAINTY_DAYS = 90
+
+
+def append_rows(csv_path, data_path=DATA_PATH):
+    """Append the rows of csv_path (same header as data_path) to data_path; returns the row count."""
+    new = pd.read_csv(csv_path)
+    columns = list(pd.read_csv(data_path, nrows=0).columns)
+    if list(new.columns) != columns:
+        raise ValueError(f"{csv_path} columns {list(new.columns)} don't match {data_path} {columns}")
+    with open(data_path, 'rb+') as f:
+        f.seek(-1, os.SEEK_END)
+        needs_newline = f.read(1) != b'\n'
+    with open(data_path, 'a', newline='') as f:
+        if needs_newline:
+            f.write('\n')
+        new.to_csv(f, header=False, index=False)
+    return len(new)
+
+
+HIST_ATTRIBUTES = ('_predictors', '_baseline_prediction')
+
+
+def _check_hist_internals(estimator):
+    """Fail loudly if a HistGradientBoostingRegressor lacks the private state the stages are grafted onto."""
+    missing = [name for name in HIST_ATTRIBUTES if not hasattr(estimator, name)]
+    if not missing:
+        nodes = estimator._predictors[0][0].nodes
+        missing = [f'nodes[{field!r}]' for field in ('value', 'is_leaf') if field not in nodes.dtype.names]
+    if missing:
+        raise RuntimeError(f'{type(estimator).__name__} has no {", ".join(missing)}; this scikit-learn '
+                           'version is not supported by incremental hist updates')
+
+
+def _add_hist_stages(estimator, X, y, trees, learning_rate):
+    """Append `trees` stages fitted to the residuals of estimator on (X, y)."""
+    _check_hist_internals(estimator)
+    residuals = y.to_numpy() - estimator.predict(X)
+    stages = clone(estimator).set_params(max_iter=trees, learning_rate=learning_rate,
+                                         min_samples_leaf=MIN_SAMPLES_LEAF, early_stopping=False,
+                                         warm_start=False).fit(X, residuals)
+    _check_hist_internals(stages)
+    first = stages._predictors[0][0]
+    first.nodes['value'][first.nodes['is_leaf'].astype(bool)] += stages._baseline_prediction[0, 0]
+    estimator._predictors = estimator._predictors + stages._predictors  # n_iter_ is len(_predictors)
+
+
+def add_trees(model, X, Y, trees=TREES, learning_rate=LEARNING_RATE):
+    """Copy of a MultiOutputRegressor with `trees` more stages per item, fitted on (X, Y)."""
+    model = copy.deepcopy(model)
+    for estimator, item in zip(model.estimators_, Y.columns):
+        if isinstance(estimator, GradientBoostingRegressor):
+            min_samples_leaf = estimator.min_samples_leaf
+            estimator.set_params(warm_start=True, n_estimators=len(estimator.estimators_) + trees,
+                                 min_samples_leaf=MIN_SAMPLES_LEAF)
+            estimator.fit(X, Y[item])
+            estimator.set_params(warm_start=False, min_samples_leaf=min_samples_leaf)
+        else:
+            _add_hist_stages(estimator, X, Y[item], trees, learning_rate)
+    return model
+
+
+def item_mae(model, X, Y):
+    pred = model.predict(X)
+    return {item: mean_absolute_error(Y[item], pred[:, i]) for i, item in enumerate(ITEMS)}
+
+
+def print_guard(previous, candidate, n_rows):
+    print("\n" + "=" * 44)
+    print(f"ACCURACY GUARD (MAE on {n_rows} held-out rows)")
+    print("=" * 44)
+    print(f'{"Item":<10} {"Current":>10} {"Updated":>10} {"Change":>10}')
+    print('-' * 44)
+    for item in ITEMS:
+        print(f'{item:<10} {previous[item]:>10.3f} {candidate[item]:>10.3f} '
+              f'{candidate[item] - previous[item]:>+10.3f}')
+    prev_avg, cand_avg = np.mean(list(previous.values())), np.mean(list(candidate.values()))
+    print('-' * 44)
+    print(f'{"AVERAGE":<10} {prev_avg:>10.3f} {cand_avg:>10.3f} {cand_avg - prev_avg:>+10.3f}')
+    return prev_avg, cand_avg
+
+
+def update_model(path=MODEL_PATH, stores=STORES_TO_USE, since=None, trees=TREES, learning_rate=LEARNING_RATE,
+                 holdout=HOLDOUT, tolerance=TOLERANCE, guard=True, dry_run=False, use_store=True):
+    """
+    Add stages for the rows after `since`. Returns True if the update passed
+    the guard (and was published unless dry_run), False if it was rejected
+    and None if there were no new rows.
+    """
+    start = time.perf_counter()
+    model_data = joblib.load(path)
+    if model_data.get('model_version') != 'v2' or not hasattr(model_data['model'], 'estimators_'):
+        raise SystemExit('Incremental updates need a v2 gradient-boosted model (train_model_v2.py)')
+    since = since or model_data.get('trained_through')
+    if since is None:
+        raise SystemExit(f'{path} has no trained_through date; pass --since YYYY-MM-DD')
+
+    pivot_df = build_features(stores, use_store)
+    X, Y, feature_cols = split_xy(pivot_df)
+    if feature_cols != list(model_data['features']):
+        raise SystemExit('Feature columns differ from the model; retrain with train_model_v2.py')
+    dates = pivot_df['date']
+    window = (dates > pd.Timestamp(since)).to_numpy()
+    window_dates = pd.DatetimeIndex(np.sort(dates[window].unique()))
+    if not len(window_dates):
+        print(f"No rows after {since}; the model is up to date.")
+        return None
+    print(f"\nNew window: {window.sum()} rows, {len(window_dates)} days "
+          f"({window_dates[0]:%Y-%m-%d} to {window_dates[-1]:%Y-%m-%d})")
+
+    previous_mae = candidate_mae = None
+    if guard:
+        n_holdout = max(1, int(round(len(window_dates) * holdout)))
+        if n_holdout >= len(window_dates):
+            raise SystemExit('The accuracy guard needs at least 2 new days (or --no-guard)')
+        held = (dates >= window_dates[-n_holdout]).to_numpy()
+        fit = window & ~held
+        candidate = add_trees(model_data['model'], X[fit], Y[fit], trees, learning_rate)
+        previous_mae = item_mae(model_data['model'], X[held], Y[held])
+        candidate_mae = item_mae(candidate, X[held], Y[held])
+        prev_avg, cand_avg = print_guard(previous_mae, candidate_mae, int(held.sum()))
+        if cand_avg > prev_avg * (1 + tolerance):
+            print(f"\nRejected: the update is less accurate than the current model "
+                  f"(tolerance {tolerance:.1%}). Nothing published.")
+            return False
+        pred = candidate.predict(X[held])
+        r2s = [r2_score(Y[held][item], pred[:, i]) for i, item in enumerate(ITEMS)]
+
+    model = add_trees(model_data['model'], X[window], Y[window], trees, learning_rate)
+    recent = (dates > window_dates[-1] - pd.Timedelta(days=UNCERTAINTY_DAYS)).to_numpy()
+    uncertainty = residual_uncertainty(model, X[recent], Y[recent])
+
+    # The guard's numbers belong to the candidate (fitted without the holdout),
+    # so they go in the update's record; 'accuracy' keeps the trained model's
+    update = {
+        'since': str(since),
+        'through': f'{window_dates[-1]:%Y-%m-%d}',
+        'rows': int(window.sum()),
+        'trees_added': trees,
+        'holdout_mae': {item: round(v, 4) for item, v in candidate_mae.items()} if guard else None,
+        'previous_mae': {item: round(v, 4) for item, v in previous_mae.items()} if guard else None,
+        'holdout_r2': {item: round(r2s[i], 4) for i, item in enumerate(ITEMS)} if guard else None,
+    }
+    if not isinstance(model_data['model'].estimators_[0], GradientBoostingRegressor):
+        update['learning_rate'] = learning_rate  # gbr stages use the model's own rate
+    updates = list(model_data.get('updates', [])) + [update]
+    print(f"\nUpdated in {time.perf_counter() - start:.1f}s; uncertainty over the last {UNCERTAINTY_DAYS} days:")
+    for item in ITEMS:
+        print(f"  {item}: {model_data['uncertainty'][item]:.2f} -> {uncertainty[item]:.2f}")
+    if dry_run:
+        print("\nDry run: nothing published.")
+        return True
+
+    shutil.copy2(path, os.path.splitext(path)[0] + '.prev.pkl')
+    extra = {key: value for key, value in model_data.items()
+             if key not in ('model', 'features', 'items', 'uncertainty', 'daily_to_hourly_factors',
+                            'model_version', 'accuracy')}
+    extra.update(trained_through=f'{window_dates[-1]:%Y-%m-%d}', updates=updates)
+    save_model(model, feature_cols, uncertainty, model_data.get('accuracy'), path, **extra)
+    print(f"Published in {time.perf_counter() - start:.1f}s total")
+    return True
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Add boosting stages for newly observed sales.')
+    parser.add_argument('--append', metavar='CSV',
+                        help=f'append these observed rows to {DATA_PATH} first (same columns)')
+    parser.add_argument('--since', help='first new day is after this date (default: the model\'s trained_through)')
+    parser.add_argument('--trees', type=int, default=TREES, help='stages added per item (default: %(default)s)')
+    parser.add_argument('--learning-rate', type=float, default=LEARNING_RATE,
+                        help='learning rate of the added hist stages (default: %(default)s)')
+    parser.add_argument('--holdout', type=float, default=HOLDOUT,
+                        help='share of the new days held out for the guard (default: %(default)s)')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help='accept an update up to this relative MAE increase (default: %(default)s)')
+    parser.add_argument('--no-guard', action='store_true', help='publish without the accuracy check')
+    parser.add_argument('--dry-run', action='store_true', help='report the guard result, publish nothing')
+    parser.add_argument('--stores', type=int, default=len(STORES_TO_USE),
+                        help='use stores store_1..store_N, as in training (0 = all stores, default: %(default)s)')
+    parser.add_argument('--model', default=MODEL_PATH, help='model to update (default: %(default)s)')
+    parser.add_argument('--no-feature-store', action='store_true',
+                        help='engineer features from the raw CSV instead of the feature store')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    if args.append:
+        print(f"Appended {append_rows(args.append)} rows from {args.append} to {DATA_PATH}")
+    stores = [f'store_{i}' for i in range(1, args.stores + 1)] if args.stores else None
+    published = update_model(args.model, stores, args.since, args.trees, args.learning_rate, args.holdout,
+                             args.tolerance, not args.no_guard, args.dry_run, not args.no_feature_store)
+    sys.exit(1 if published is False else 0)